@@ -5,6 +5,7 @@ Usage:
   Command-Line Format:
     python indexes2.py compare <key> <dbname> <collection>    <-- <key> is a key in your verify.json file
     python indexes2.py compare_captured <key> <dbname> <collection> --infile <previous-capture-file>
+    python indexes2.py compare <key> <dbname> <collection> --async --concurrency 32
 
   Examples:
     python indexes2.py compare brown all all          <--- all databases, all collections
@@ -14,22 +15,33 @@ Usage:
     python indexes2.py compare brown NFA requesters   <--- just the requesters collection in the NFA database
 
     python indexes2.py compare_captured brown NFA all --infile tmp/indexes_brown_all_all_20230517-1915.json
+    python indexes2.py compare_captured brown NFA all --infile tmp/indexes_brown_all_all_20230517-1915.jsonl
 
   Notes:
     1) <key> is a key in the verify.json dictionary
+    2) the index differences are written to tmp/index_diffs_<key>_<db>_<coll>_<timestamp>.json
+       and .csv files.  Indexes are compared by fingerprint, which ignores the v, ns,
+       and background attributes; see pysrc/index_fingerprint.py
+    3) --async captures the source and target indexes at the same time, with up to
+       --concurrency (default 16) requests in flight per cluster, and writes the
+       capture incrementally to a tmp/indexes_<key>_<db>_<coll>_<timestamp>.jsonl file
 """
 
-import copy
+import asyncio
 import json
 import os.path
 import sys
 import traceback
 
+from concurrent.futures import ThreadPoolExecutor
+
 import arrow
 from docopt import docopt
 
 from pysrc.constants import Colors
+from pysrc.env import Env
 from pysrc.fs import FS
+from pysrc.index_comparison import IndexComparison
 from pysrc.mongo import Mongo, MongoDBInstance, MongoDBDatabase, MongoDBCollection
 
 def print_options(msg):
@@ -67,15 +79,23 @@ def capture_source_target_index_info():
                     print('  source conn_str: {}'.format(source_conn_string))
                     print('  target conn_str: {}'.format(target_conn_string))
 
-                combined_dict = dict()
-                combined_dict['source'] = collect_indexes(
-                    config_key, 'source', source_conn_string, cli_dbname, cli_cname)
-                combined_dict['target'] = collect_indexes(
-                    config_key, 'target', target_conn_string, cli_dbname, cli_cname)
-
-                outfile = 'tmp/indexes_{}_{}_{}_{}.json'.format(
-                    config_key, cli_dbname, cli_cname, curr_timestamp())
-                FS.write_json(combined_dict, outfile)
+                if '--async' in sys.argv:
+                    outfile = 'tmp/indexes_{}_{}_{}_{}.jsonl'.format(
+                        config_key, cli_dbname, cli_cname, curr_timestamp())
+                    concurrency = max(1, Env.int_arg('--concurrency', 16))
+                    combined_dict = asyncio.run(capture_source_target_async(
+                        source_conn_string, target_conn_string, cli_dbname, cli_cname, outfile, concurrency))
+                    print('file written: {}'.format(outfile))
+                else:
+                    combined_dict = dict()
+                    combined_dict['source'] = collect_indexes(
+                        config_key, 'source', source_conn_string, cli_dbname, cli_cname)
+                    combined_dict['target'] = collect_indexes(
+                        config_key, 'target', target_conn_string, cli_dbname, cli_cname)
+
+                    outfile = 'tmp/indexes_{}_{}_{}_{}.json'.format(
+                        config_key, cli_dbname, cli_cname, curr_timestamp())
+                    FS.write_json(combined_dict, outfile)
             else:
                 print_options('error: {} is not a key in JSON file {}'.format(config_key, config_file))
         else:
@@ -86,7 +106,8 @@ def capture_source_target_index_info():
 
 def compare_captured(combined_dict=None):
     try:
-        if len(sys.argv) > 3:
+        config_key, cli_dbname, cli_cname = 'none', 'all', 'all'
+        if len(sys.argv) > 4:
             config_key, cli_dbname, cli_cname = sys.argv[2], sys.argv[3], sys.argv[4]
             if verbose():
                 print('  config_key: {}'.format(config_key))
@@ -95,185 +116,39 @@ def compare_captured(combined_dict=None):
         for idx, arg in enumerate(sys.argv):
             if arg == '--infile':
                 infile = sys.argv[idx + 1]
-                combined_dict = FS.read_json(infile)
-
-        # print('source keys count: {}'.format(len(combined_dict['source'])))
-        # print('target keys count: {}'.format(len(combined_dict['target'])))
-
-        print('filtering input to just the databases and containers specified on the command-line ...')
-        filtered_db_coll_dict = dict()
-        filtered_db_coll_dict['source'] = filtered_captured(combined_dict, 'source', cli_dbname, cli_cname)
-        filtered_db_coll_dict['target'] = filtered_captured(combined_dict, 'target', cli_dbname, cli_cname)
+                combined_dict = read_captured_file(infile)
 
+        print('indexing the source and target indexes for the databases and containers specified on the command-line ...')
+        comparison = IndexComparison(combined_dict, cli_dbname, cli_cname)
         if verbose():
-            print('filtered_db_coll_dict source key count:  {}'.format(len(filtered_db_coll_dict['source'])))
-            print('filtered_db_coll_dict source key values: {}'.format(sorted(filtered_db_coll_dict['source'].keys())))
-        if verbose():
-            print('filtered_db_coll_dict target key count:  {}'.format(len(filtered_db_coll_dict['target'])))
-            print('filtered_db_coll_dict target key values: {}'.format(sorted(filtered_db_coll_dict['target'].keys())))
-
-        print('collecting the aggregated set of db/coll names ...')
-        agg_db_coll_names = dict()
-        for db_coll_key in filtered_db_coll_dict['source']:
-            agg_db_coll_names[db_coll_key] = ''
-        for db_coll_key in filtered_db_coll_dict['target']:
-            agg_db_coll_names[db_coll_key] = ''
-        sorted_agg_db_coll_names = sorted(agg_db_coll_names.keys())
-        if very_verbose():
-            print('sorted_agg_db_coll_names: {}'.format(sorted_agg_db_coll_names))
-
-        for db_coll_key in sorted_agg_db_coll_names:
-            compare_db_coll_indexes(cli_dbname, cli_cname, filtered_db_coll_dict, db_coll_key)
-
-        # outfile = 'tmp/indexes_filtered_db_coll_dict.json'
-        # FS.write_json(filtered_db_coll_dict, outfile)
+            print('source db/coll key count: {}'.format(len(comparison.source)))
+            print('target db/coll key count: {}'.format(len(comparison.target)))
+
+        diffs = comparison.compare()
+        for diff in diffs:
+            print(f'{Colors.YELLOW}    db: {diff["db"]} coll: {diff["coll"]} index: {diff["index_name"]} - {diff["status"]} {Colors.ENDC}')
+            if very_verbose():
+                for side in ['source', 'target']:
+                    fp = diff['{}_fingerprint'.format(side)]
+                    if fp != '':
+                        print('    {}:  {}'.format(side, json.dumps(comparison.definitions[fp], sort_keys=True)))
+
+        summary = comparison.summary()
+        if len(diffs) == 0:
+            print(f'{Colors.OKGREEN}matched: {summary["matched_indexes"]} indexes, no differences {Colors.ENDC}')
+        else:
+            print(f'{Colors.FAIL}matched: {summary["matched_indexes"]} indexes, {len(diffs)} differences {Colors.ENDC}')
+        print(json.dumps(summary, sort_keys=False, indent=2))
+
+        basename = 'tmp/index_diffs_{}_{}_{}_{}'.format(config_key, cli_dbname, cli_cname, curr_timestamp())
+        FS.write_json(comparison.diffs_report(), basename + '.json')
+        FS.write_csv_rows(IndexComparison.CSV_HEADER, comparison.csv_rows(), basename + '.csv')
     except Exception as e2:
         print(str(e2))
         print(traceback.format_exc())
 
-def filtered_captured(combined_dict, source_or_target, cli_dbname, cli_cname):
-    # Filter the input combined_dict to just the databases and containers specified on the command-line
-    filtered_dict = dict()
-    source_or_target_dict = combined_dict[source_or_target]
-    dbnames = sorted(source_or_target_dict.keys())
-    for dbname in dbnames:
-        if names_match(cli_dbname, dbname):
-            db_colls_dict = source_or_target_dict[dbname]
-            for cname in sorted(db_colls_dict.keys()):
-                if names_match(cli_cname, cname):
-                    key2 = '{}|{}'.format(dbname, cname)
-                    key3 = '{}|{}|{}'.format(source_or_target, dbname, cname)
-                    coll_data = dict()
-                    coll_data['source'] = source_or_target
-                    coll_data['source_db_coll_key'] = key3
-                    coll_data['db_coll_key'] = key2
-                    coll_data['indexes'] = copy.deepcopy(db_colls_dict[cname])
-                    filtered_dict[key2] = coll_data
-    return filtered_dict
-
-def compare_db_coll_indexes(cli_dbname, cli_cname, filtered_db_coll_dict, db_coll_key):
-    source_db_colls = filtered_db_coll_dict['source']
-    target_db_colls = filtered_db_coll_dict['target']
-    source_coll_indexes, target_coll_indexes = None, None
-    db_key = db_coll_key.split('|')[0]
-    coll_key = db_coll_key.split('|')[1]
-
-    if db_coll_key in source_db_colls.keys():
-        source_coll_indexes = source_db_colls[db_coll_key]
-    if db_coll_key in target_db_colls.keys():
-        target_coll_indexes = target_db_colls[db_coll_key]
-
-    # Exit if this isn't a database or collection name of interest
-    if names_match(cli_dbname, db_key):
-        pass
-    else:
-        print("bypassing db: {}".format(db_key), end='\r')
-
-    print(f'{Colors.WHITE}=== comparing db: {db_key} coll: {coll_key} {Colors.ENDC}')
-
-    if source_coll_indexes == None:
-        if target_coll_indexes == None:
-            #print('db_coll_key {} is in neither source nor target'.format(db_coll_key))
-            print(f'{Colors.YELLOW}    db: {db_key} coll: {coll_key} - is in neither source nor target {Colors.ENDC}')
-            return
-
-    if source_coll_indexes != None:
-        if target_coll_indexes == None:
-            #print('db_coll_key {} is in the source but not the target'.format(db_coll_key))
-            print(f'{Colors.YELLOW}    db: {db_key} coll: {coll_key} - is in the source but not the target {Colors.ENDC}')
-            return
-
-    if source_coll_indexes == None:
-        if target_coll_indexes != None:
-            #print('db_coll_key {} is in the target but not the source'.format(db_coll_key))
-            print(f'{Colors.YELLOW}    db: {db_key} coll: {coll_key} - is in the target but not the source {Colors.ENDC}')
-            return
-
-    # At this point the db/collection combo is in both source and target; compare their indexes.
-    # Collect the aggregated set of their index names for the db/collection.
-
-    agg_index_names = dict()
-    source_coll_indexes = source_coll_indexes['indexes']
-    target_coll_indexes = target_coll_indexes['indexes']
-    for idx_name in source_coll_indexes.keys():
-        agg_index_names[idx_name] = ''
-    for idx_name in target_coll_indexes.keys():
-        agg_index_names[idx_name] = ''
-    sorted_index_names = sorted(agg_index_names.keys())
-    print('aggregated index names in source and target coll: {}'.format(sorted_index_names))
-
-    if very_verbose():
-        print('--- source indexes for {}'.format(db_coll_key))
-        print(json.dumps(source_coll_indexes, sort_keys=False, indent=2))
-        print('--- target indexes for {}'.format(db_coll_key))
-        print(json.dumps(target_coll_indexes, sort_keys=False, indent=2))
-        print('--- combined index names: {}'.format(sorted_index_names))
-
-    for idx_name in sorted_index_names:
-        source_idx, target_idx = None, None
-        if idx_name in source_coll_indexes.keys():
-            source_idx = source_coll_indexes[idx_name]
-        if idx_name in target_coll_indexes.keys():
-            target_idx = target_coll_indexes[idx_name]
-
-        if source_idx == None:
-            print('source index {} not present for db/coll {}'.format(idx_name, db_coll_key))
-        elif target_idx == None:
-            print('target index {} not present for db/coll {}'.format(idx_name, db_coll_key))
-        else:
-            # normalize the v: attribute by removing it
-            if 'v' in source_idx.keys():
-                source_idx['v'] = 'normalized for compare'
-            if 'v' in target_idx.keys():
-                target_idx['v'] = 'normalized for compare'
-
-            if 'expireAfterSeconds' in source_idx.keys():
-                source_idx['expireAfterSeconds'] = int(source_idx['expireAfterSeconds'])
-            if 'expireAfterSeconds' in target_idx.keys():
-                target_idx['expireAfterSeconds'] = int(target_idx['expireAfterSeconds'])
-
-                # example:
-                # "TTL_expiresAt": {
-                #     "v": 2,
-                #     "key": [
-                #         [
-                #             "expiresAt",
-                #             1
-                #         ]
-                #     ],
-                #     "background": true,
-                #     "expireAfterSeconds": 0
-                # }
-
-            source_json = json.dumps(source_idx, sort_keys=True)
-            target_json = json.dumps(target_idx, sort_keys=True)
-            print('source:  {}'.format(source_json))
-            print('target:  {}'.format(target_json))
-
-            matched = (source_json == target_json)
-            if matched:
-                print(f'{Colors.OKGREEN}matched: {matched} {Colors.ENDC}')
-            else:
-                print(f'{Colors.FAIL}matched: {matched} {Colors.ENDC}')
-            print('---')
-
-def collect_index_names(source_target_indexes, target_coll_indexes):
-    # return a sorted list of strings - the names of all source and target indexes
-    agg_index_names = dict()
-    for idx_name in source_target_indexes['indexes'].keys():
-        agg_index_names[idx_name] = ''
-    for idx_name in target_coll_indexes['indexes'].keys():
-        agg_index_names[idx_name] = ''
-    return sorted(agg_index_names.keys())
-
 def names_match(cli_name, found_name):
-    if cli_name.lower() == 'all':
-        return True
-    if '@' in cli_name:
-        cli_fuzzy = cli_name.replace('@', '')
-        return cli_fuzzy in found_name
-    else:
-        return cli_name == found_name
+    return IndexComparison.names_match(cli_name, found_name)
 
 def collect_indexes(config_key, source_or_target, conn_string, cli_dbname, cli_cname):
     raw_data_dict = dict()  # return object
@@ -304,6 +179,82 @@ def collect_indexes(config_key, source_or_target, conn_string, cli_dbname, cli_c
         print(traceback.format_exc())
     return raw_data_dict
 
+async def capture_source_target_async(
+        source_conn_string, target_conn_string, cli_dbname, cli_cname, outfile, concurrency):
+    """
+    Capture the source and target indexes at the same time, with at most
+    concurrency requests in flight per cluster.  The blocking pymongo calls
+    run in worker threads.  Each collection's indexes are appended to the
+    line-delimited outfile as soon as they are read; the combined dict, in
+    the same format as the synchronous capture, is returned.
+    """
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency * 2))
+    combined_dict = dict()
+    combined_dict['source'] = dict()
+    combined_dict['target'] = dict()
+    with open(outfile, 'wt', encoding='utf-8') as f:
+        await asyncio.gather(
+            collect_indexes_async('source', source_conn_string, cli_dbname, cli_cname,
+                combined_dict['source'], asyncio.Semaphore(concurrency), f),
+            collect_indexes_async('target', target_conn_string, cli_dbname, cli_cname,
+                combined_dict['target'], asyncio.Semaphore(concurrency), f))
+    return combined_dict
+
+async def collect_indexes_async(source_or_target, conn_string, cli_dbname, cli_cname, raw_data_dict, semaphore, f):
+    async def call(func, *args):
+        async with semaphore:
+            return await asyncio.to_thread(func, *args)
+
+    async def collect_coll_indexes(dbname, cname):
+        indexes = await call(m.get_db_coll_indexes, dbname, cname)
+        raw_data_dict[dbname][cname] = indexes
+        # the event loop is single-threaded, so the lines are never interleaved
+        line = dict()
+        line['side'] = source_or_target
+        line['db'] = dbname
+        line['coll'] = cname
+        line['indexes'] = indexes
+        f.write(json.dumps(line) + '\n')
+        if verbose():
+            print('{} dbname/coll captured: {} {}'.format(source_or_target, dbname, cname))
+
+    try:
+        opts = dict()
+        opts['conn_string'] = conn_string
+        opts['verbose'] = False
+        m = Mongo(opts)
+
+        dbnames = [dbname for dbname in sorted(filter_dbnames(await call(m.list_databases)))
+                   if names_match(cli_dbname, dbname)]
+        db_cnames = await asyncio.gather(*[call(m.list_db_collections, dbname) for dbname in dbnames])
+
+        tasks = list()
+        for dbname, cnames in zip(dbnames, db_cnames):
+            raw_data_dict[dbname] = dict()
+            f.write(json.dumps({'side': source_or_target, 'db': dbname}) + '\n')
+            for cname in cnames:
+                if names_match(cli_cname, cname):
+                    raw_data_dict[dbname][cname] = None  # keeps the listing order
+                    tasks.append(collect_coll_indexes(dbname, cname))
+        await asyncio.gather(*tasks)
+    except Exception as e:
+        print(str(e))
+        print(traceback.format_exc())
+
+def read_captured_file(infile):
+    # the capture file is either a combined dict .json file, or a .jsonl file
+    # written by the --async capture
+    if not infile.endswith('.jsonl'):
+        return FS.read_json(infile)
+    combined_dict = dict()
+    combined_dict['source'] = dict()
+    combined_dict['target'] = dict()
+    for line in FS.read_jsonl(infile):
+        db_dict = combined_dict[line['side']].setdefault(line['db'], dict())
+        if 'coll' in line.keys():
+            db_dict[line['coll']] = line['indexes']
+    return combined_dict
+
 def filter_dbnames(dbnames):
     for exclude_dbname in 'admin,local,config'.split(','):
         if exclude_dbname in dbnames:
@@ -335,7 +286,7 @@ if __name__ == "__main__":
         for idx, arg in enumerate(sys.argv):
             if arg == '--infile':
                 infile = sys.argv[idx + 1]
-                combined_dict = FS.read_json(infile)
+                combined_dict = read_captured_file(infile)
 
         if func == 'compare':
             compare()
@@ -7,20 +7,34 @@ Usage:
   Command-Line Format:
     python indexesx.py extract <txt-infile-with-connection-strings>
     python indexesx.py analyze
+    python indexesx.py where <index-fingerprint>
   Examples:
     python indexesx.py extract tmp/conn_strings.txt > tmp/indexesx.log
+    python indexesx.py extract tmp/conn_strings.txt --cluster-workers 8 --coll-workers 4 --max-connections 24 --resume
+    python indexesx.py where 3f2a9c1e     <-- list the collections which use the index; prefix match
+  Options:
+    --cluster-workers <n>   number of clusters extracted concurrently, default 1
+    --coll-workers <n>      number of concurrent index queries within each cluster, default 1
+    --max-connections <n>   global limit on concurrent server requests, across all clusters
+    --resume                skip clusters whose tmp/indexes/<host>.json file already exists
 """
 
 import json
+import os
 import sys
+import threading
 import traceback
 
+from concurrent.futures import ThreadPoolExecutor
+
 import arrow
 
 from docopt import docopt
 
 from pysrc.counter import Counter
+from pysrc.env import Env
 from pysrc.fs import FS
+from pysrc.index_fingerprint import IndexFingerprintRegistry
 from pysrc.mongo import Mongo
 
 
@@ -40,26 +54,45 @@ def extract(infile):
         stripped = line.strip()
         if len(stripped) > 20:
             conn_strings.append(stripped)
-    for idx, conn_string in enumerate(sorted(conn_strings)):
-        try:
-            extract_indexes_in_cluster(idx, conn_string)
-        except Exception as e:
-            print('Exception on cluster {} {}'.format(idx, conn_string))
-            print(str(e))
-            print(traceback.format_exc())
+
+    cluster_workers = max(1, Env.int_arg('--cluster-workers', 1))
+    coll_workers = max(1, Env.int_arg('--coll-workers', 1))
+    max_connections = max(1, Env.int_arg('--max-connections', cluster_workers * coll_workers))
+    print('cluster_workers: {} coll_workers: {} max_connections: {} resume: {}'.format(
+        cluster_workers, coll_workers, max_connections, Env.boolean_arg('--resume')))
+    connection_budget = threading.BoundedSemaphore(max_connections)
+
+    with ThreadPoolExecutor(max_workers=cluster_workers) as pool:
+        futures = list()
+        for idx, conn_string in enumerate(sorted(conn_strings)):
+            futures.append((idx, conn_string, pool.submit(
+                extract_indexes_in_cluster, idx, conn_string, coll_workers, connection_budget)))
+        for idx, conn_string, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print('Exception on cluster {} {}'.format(idx, conn_string))
+                print(str(e))
+                print(traceback.format_exc())
     print('done')
 
-def extract_indexes_in_cluster(idx, conn_string):
+def extract_indexes_in_cluster(idx, conn_string, coll_workers=1, connection_budget=None):
     if idx > 999999:
         return
+    host = conn_string.split('@')[1]
+    cluster_outfile = cluster_indexes_file(host)
+    if Env.boolean_arg('--resume') and os.path.isfile(cluster_outfile):
+        print('resume; skipping cluster idx: {} file exists: {}'.format(idx, cluster_outfile))
+        return
+    if connection_budget == None:
+        connection_budget = threading.BoundedSemaphore(coll_workers)
+
     print('===')
     print('processing cluster idx: {} url: {}'.format(idx, conn_string))
     cluster_dict, cluster_indexes = dict(), dict()
-    host = conn_string.split('@')[1] 
-    cluster_dict['idx']  = idx 
+    cluster_dict['idx']  = idx
     cluster_dict['host'] = host
     cluster_dict['indexes']  = cluster_indexes
-    cluster_outfile = 'tmp/indexes/{}.json'.format(host.replace('.','-'))
 
     if True:
         opts = dict()
@@ -67,19 +100,41 @@ def extract_indexes_in_cluster(idx, conn_string):
         opts['verbose'] = False
         m = Mongo(opts)
 
-        for dbname in sorted(filter_dbnames(m.list_databases())):
-            m.set_db(dbname)
-            for cname in m.list_collections():
+        db_colls = list()
+        with connection_budget:
+            dbnames = sorted(filter_dbnames(m.list_databases()))
+        for dbname in dbnames:
+            with connection_budget:
+                cnames = m.list_db_collections(dbname)
+            for cname in cnames:
+                db_coll_key = '{}|{}'.format(dbname, cname)
+                cluster_indexes[db_coll_key] = {'pending': True}
+                db_colls.append((dbname, cname, db_coll_key))
+
+        with ThreadPoolExecutor(max_workers=coll_workers) as pool:
+            futures = list()
+            for dbname, cname, db_coll_key in db_colls:
                 print('db: {} cname: {} conn_string: {}'.format(dbname, cname, conn_string))
+                futures.append((db_coll_key, pool.submit(
+                    get_db_coll_indexes, m, dbname, cname, connection_budget)))
+            for db_coll_key, future in futures:
                 try:
-                    db_coll_key = '{}|{}'.format(dbname, cname)
-                    cluster_indexes[db_coll_key] = {'pending': True}
-                    cluster_indexes[db_coll_key] = m.get_coll_indexes(cname)
+                    cluster_indexes[db_coll_key] = future.result()
                 except Exception as e:
                     print(str(e))
                     print(traceback.format_exc())
 
-    FS.write_json(cluster_dict, cluster_outfile)
+    # write then rename, so that --resume never sees a partially written file
+    FS.write_json(cluster_dict, cluster_outfile + '.tmp', verbose=False)
+    os.replace(cluster_outfile + '.tmp', cluster_outfile)
+    print('file written: {}'.format(cluster_outfile))
+
+def get_db_coll_indexes(m, dbname, cname, connection_budget):
+    with connection_budget:
+        return m.get_db_coll_indexes(dbname, cname)
+
+def cluster_indexes_file(host):
+    return 'tmp/indexes/{}.json'.format(host.replace('.','-'))
 
 def filter_dbnames(dbnames):
     for exclude_dbname in 'admin,local,config'.split(','):
@@ -100,9 +155,13 @@ def analyze():
             for db_cname_key in db_cname_keys:
                 # db_cname_key is in 'dbname|cname' format
                 coll_index_data = cluster_indexes[db_cname_key]
+                if not isinstance(coll_index_data, dict):
+                    continue  # the indexes could not be read during the extract
                 coll_index_names = coll_index_data.keys()
                 for coll_index_name in sorted(coll_index_names):
                     index = coll_index_data[coll_index_name]
+                    if not isinstance(index, dict):
+                        continue  # {'pending': True}
                     index['v'] = '0'
                     index['ns'] = 'normalized'
                     del index['v']
@@ -117,6 +176,33 @@ def analyze():
         lines.append('{}|{}'.format(count, key))
     FS.write_lines(lines, 'tmp/unique_indexes.txt')
 
+    registry = refresh_fingerprint_registry()
+    lines, counts = list(), registry.counts()
+    for fingerprint in sorted(counts.keys(), key=lambda fp: (-counts[fp], fp)):
+        definition = json.dumps(registry.definitions[fingerprint], sort_keys=True)
+        lines.append('{}|{}|{}'.format(counts[fingerprint], fingerprint, definition))
+    FS.write_lines(lines, 'tmp/index_fingerprints.txt')
+
+def where(fingerprint):
+    registry = refresh_fingerprint_registry()
+    fingerprints = registry.resolve(fingerprint)
+    for fp in fingerprints:
+        print('fingerprint: {} {}'.format(fp, json.dumps(registry.definitions[fp], sort_keys=True)))
+        for occurrence in registry.occurrences[fp]:
+            print('  {} {} {}'.format(occurrence['host'], occurrence['db_cname'], occurrence['index_name']))
+    print('{} matching fingerprints, {} occurrences'.format(
+        len(fingerprints), len(registry.where(fingerprint))))
+
+def refresh_fingerprint_registry():
+    # only the new or modified tmp/indexes/ files are read
+    registry_file = 'tmp/index_fingerprints.json'
+    registry = IndexFingerprintRegistry.load(registry_file)
+    read_count = registry.refresh('tmp/indexes')
+    print('fingerprint registry refreshed; files read: {}, fingerprints: {}'.format(
+        read_count, len(registry.definitions)))
+    registry.save(registry_file)
+    return registry
+
 def curr_timestamp():
     return arrow.utcnow().format('YYYYMMDD-HHmm')
 
@@ -146,5 +232,7 @@ if __name__ == "__main__":
             extract(sys.argv[2])
         elif func == 'analyze':
             analyze()
+        elif func == 'where':
+            where(sys.argv[2])
         else:
             print_options('Error: invalid command-line function: {}'.format(func))
@@ -3,17 +3,34 @@ Usage:
   python main.py <func> <args...>
   python main.py check_env
   python main.py read_parse_clusters_info_excel_file
+  python main.py read_parse_clusters_info_excel_file --no-cache
+  python main.py docscan <cluster-name>
+  python main.py docscan <cluster-name> <conn-str> --workers 8 --batch-size 1000 --top 10 --db <dbname>
+  python main.py docscan <cluster-name> --sample 10000
+  python main.py docscan <cluster-name> --sample 10000 --find-oversize
+  python main.py docscan <cluster-name> --server-side
   python main.py docscan_doc_capture
+  python main.py docscan_doc_capture --batched --workers 8
   python main.py docscan_results_report
+  python main.py docscan_results_report --parallel --workers 8 --top 1000
   python main.py gen_mma_execution_scripts
   python main.py gen_pymongo_connect_script
   python main.py pymongo_connect <cluster-name> <conn-str>
+  python main.py probe_clusters
+  python main.py probe_clusters --workers 64 --timeout 10
   python main.py aggregate_mma_execution_output
+  python main.py aggregate_mma_execution_output --parallel --workers 8
+  python main.py aggregate_mma_execution_output --format jsonl.gz
+  python main.py aggregate_mma_execution_output --parallel --cache
   python main.py gather_cluster_db_collection_info
   python main.py gather_shard_info
   python main.py gather_index_info
+  python main.py gather_all
   python main.py capture_mma_logs
   python main.py clusters_report
+  python main.py migration_wave_report
+  python main.py migration_wave_report --xlsx
+  python main.py load_postgresql       <-- requires env var AZURE_MONGO_UTILS_PG_CONN
   python main.py scan_mmaout_results
   python main.py scan_mmaout_results_report
   python main.py despace_file tmp/Results.csv tmp/despaced.csv
@@ -33,6 +50,7 @@ import sys
 from docopt import docopt
 
 from pysrc.datasets import Datasets
+from pysrc.env import Env
 from pysrc.fs import FS
 from pysrc.task import Tasks
 
@@ -53,6 +71,11 @@ def read_parse_clusters_info_excel_file():
     tr.display()
     return tr.get_resp_obj()
 
+def docscan(cluster_name, conn_str):
+    Datasets.reset()
+    tr = Tasks.docscan(cluster_name, conn_str)
+    tr.display()
+
 def docscan_doc_capture():
     Datasets.reset()
     tr = Tasks.docscan_doc_capture()
@@ -80,6 +103,13 @@ def pymongo_connect(cluster_name, conn_str):
     tr = Tasks.pymongo_connect(cluster_name, conn_str)
     tr.display()
 
+def probe_clusters():
+    Datasets.reset()
+    workers = Env.int_arg('--workers', 32)
+    timeout_secs = Env.int_arg('--timeout', 10)
+    tr = Tasks.probe_clusters(workers, timeout_secs)
+    tr.display()
+
 def aggregate_mma_execution_output():
     Datasets.reset()
     tr = Tasks.aggregate_mma_execution_output()
@@ -104,6 +134,12 @@ def gather_index_info():
     tr.display()
     Datasets.display()
 
+def gather_all():
+    Datasets.reset()
+    tr = Tasks.gather_all()
+    tr.display()
+    Datasets.display()
+
 def capture_mma_logs():
     Datasets.reset()
     tr = Tasks.capture_mma_logs()
@@ -116,6 +152,11 @@ def migration_wave_report():
     tr.display()
     Datasets.display()
 
+def load_postgresql():
+    Datasets.reset()
+    tr = Tasks.load_postgresql()
+    tr.display()
+
 def scan_mmaout_results():
     Datasets.reset()
     tr = Tasks.scan_mmaout_results()
@@ -160,6 +201,11 @@ if __name__ == "__main__":
             check_env()
         elif func == 'read_parse_clusters_info_excel_file':
             read_parse_clusters_info_excel_file()
+        elif func == 'docscan':
+            cluster_name, conn_str = sys.argv[2], None
+            if len(sys.argv) > 3 and not sys.argv[3].startswith('--'):
+                conn_str = sys.argv[3]
+            docscan(cluster_name, conn_str)
         elif func == 'docscan_doc_capture':
             docscan_doc_capture()
         elif func == 'docscan_results_report':
@@ -168,6 +214,8 @@ if __name__ == "__main__":
             gen_mma_execution_scripts()
         elif func == 'gen_pymongo_connect_script':
             gen_pymongo_connect_script()
+        elif func == 'probe_clusters':
+            probe_clusters()
         elif func == 'pymongo_connect':
             cluster_name, conn_str = sys.argv[2], sys.argv[3]
             pymongo_connect(cluster_name, conn_str)
@@ -179,10 +227,14 @@ if __name__ == "__main__":
             gather_shard_info()
         elif func == 'gather_index_info':
             gather_index_info()
+        elif func == 'gather_all':
+            gather_all()
         elif func == 'capture_mma_logs':
             capture_mma_logs()
         elif func == 'migration_wave_report':
             migration_wave_report()
+        elif func == 'load_postgresql':
+            load_postgresql()
         elif func == 'scan_mmaout_results':
             scan_mmaout_results()
         elif func == 'scan_mmaout_results_report':
@@ -4,6 +4,7 @@ from pysrc.env import Env
 
 from pysrc.container import Container
 from pysrc.containers import Containers
+from pysrc.mma_files import MmaFiles
 
 # This class is used aggregate the MMA outputs into an instance of 
 # class Containers which has instances of class Container.
@@ -12,48 +13,56 @@ from pysrc.containers import Containers
 # Chris Joakim, Microsoft, 2023
 
 class ContainersAggregator(object):
-    def __init__(self, aggregated_mma_outputs):
+    def __init__(self, aggregated_mma_outputs=None):
+        # aggregated_mma_outputs may be None when this instance is registered
+        # with an MmaDispatcher, which calls process_mma_obj for each MMA object.
         self.aggregated_mma_outputs = aggregated_mma_outputs
         self.containers_obj = Containers()
 
-        for mma_obj in aggregated_mma_outputs:
-            filename = mma_obj['_file_name'].strip()
-            if 'Collector' in filename:
-                if 'collection_metadata' in filename:
-                    if filename.endswith('.json'):
-                        if Env.verbose():
-                            print('processing filename: {}'.format(filename))
-                        if Env.very_verbose():
-                            print(json.dumps(mma_obj, sort_keys=False, indent=2))
-                        try:
-                            cluster, dbname, cname = None, None, None
-                            if '_cluster' in mma_obj.keys():
-                                cluster = mma_obj['_cluster']
-                            if 'data' in mma_obj.keys():
-                                data = mma_obj['data']
-                                if 'db_name' in data.keys():
-                                    dbname = data['db_name']
-                                    if 'collection_metadata' in data.keys():
-                                        cm = data['collection_metadata']
-                                        if 'name' in cm.keys():
-                                            cname = cm['name']
-                                            c = Container(cluster, dbname, cname)
-                                            if 'stats' in cm.keys():
-                                                c.set_stats(cm['stats'])
-                                            if 'options' in cm.keys():
-                                                c.set_options(cm['options'])
-                                            c.calculate()
-                                            self.containers_obj.add(c)
-                        except Exception as e:
-                            print(e)
+        if aggregated_mma_outputs is not None:
+            for mma_obj in aggregated_mma_outputs:
+                file_type = MmaFiles.classify(mma_obj['_file_name'])
+                if file_type == MmaFiles.COLLECTION_METADATA:
+                    self.process_mma_obj(file_type, mma_obj)
+
+    def mma_file_types(self):
+        return [MmaFiles.COLLECTION_METADATA]
+
+    def process_mma_obj(self, file_type, mma_obj):
+        filename = mma_obj['_file_name'].strip()
+        if Env.verbose():
+            print('processing filename: {}'.format(filename))
+        if Env.very_verbose():
+            print(json.dumps(mma_obj, sort_keys=False, indent=2))
+        try:
+            cluster, dbname, cname = None, None, None
+            if '_cluster' in mma_obj.keys():
+                cluster = mma_obj['_cluster']
+            if 'data' in mma_obj.keys():
+                data = mma_obj['data']
+                if 'db_name' in data.keys():
+                    dbname = data['db_name']
+                    if 'collection_metadata' in data.keys():
+                        cm = data['collection_metadata']
+                        if 'name' in cm.keys():
+                            cname = cm['name']
+                            c = Container(cluster, dbname, cname)
+                            if 'stats' in cm.keys():
+                                c.set_stats(cm['stats'])
+                            if 'options' in cm.keys():
+                                c.set_options(cm['options'])
+                            c.calculate()
+                            self.containers_obj.add(c)
+        except Exception as e:
+            print(e)
 
     def get_containers_obj(self):
         return self.containers_obj
 
     def get_containers_in_cluster_names(self, cluster_names):
-        containers_list = list()
+        containers_list, cluster_names_set = list(), set(cluster_names)
         for c in self.containers_obj.get_containers_list():
-            if c.cluster() in cluster_names:
+            if c.cluster() in cluster_names_set:
                 containers_list.append(c)
         return containers_list
 
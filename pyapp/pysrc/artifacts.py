@@ -4,6 +4,7 @@ import os
 import arrow
 import jinja2
 
+from pysrc.aggregators import ContainersAggregator
 from pysrc.env import Env
 from pysrc.fs import FS
 from pysrc.mapping import Mapping
@@ -23,10 +24,10 @@ class ArtifactGenerator(object):
 
     def __init__(self):
         # These are the two inputs to the artifact generator:
-        # 1) aggregated_mma_outputs is the MMA info
+        # 1) the aggregated MMA outputs, streamed into a ContainersAggregator
         # 2) mappings is a user-edited file, but was generated from MMA info
 
-        self.aggregated_mma_outputs = Datasets.read_aggregated_mma_output_file()
+        self.agg = ContainersAggregator(Datasets.iterate_aggregated_mma_outputs())
         self.mappings = Datasets.read_user_mappings_file()
         self.mapping = Mapping(self.mappings)
 
@@ -0,0 +1,99 @@
+import os
+
+from pysrc.fs import FS
+
+# Instances of this class are an index of the cluster aliases in the Customer
+# Master Excel file; i.e. - the cluster keys which share the same source URL.
+# The index, cluster -> canonical url -> sibling clusters, is built once when
+# the spreadsheet is parsed and persisted to current/excel_cluster_aliases.json,
+# so that the Reporter can look up the siblings of a cluster directly.
+#
+# Chris Joakim, Microsoft, 2023
+
+class ClusterAliases(object):
+
+    ALIASES_FILE = 'current/excel_cluster_aliases.json'
+
+    def __init__(self, url_by_cluster=None, clusters_by_url=None):
+        self.url_by_cluster = url_by_cluster if url_by_cluster != None else dict()
+        self.clusters_by_url = clusters_by_url if clusters_by_url != None else dict()
+
+    @classmethod
+    def build(cls, excel_clusters):
+        # excel_clusters is the dict of cluster key to source/target mapping
+        aliases = ClusterAliases()
+        for cluster_key, mapping in excel_clusters.items():
+            aliases.add(cluster_key, mapping['source'])
+        return aliases
+
+    @classmethod
+    def from_unique_urls(cls, unique_cluster_urls):
+        # build the index from the url -> [cluster keys] excel_unique_cluster_urls.json file
+        aliases = ClusterAliases()
+        for url, cluster_keys in unique_cluster_urls.items():
+            for cluster_key in cluster_keys:
+                aliases.add(cluster_key, url)
+        return aliases
+
+    @classmethod
+    def load(cls, infile=None, unique_urls_file='current/excel_unique_cluster_urls.json'):
+        # read the persisted index, or build it from the unique urls file if it doesn't exist
+        if infile == None:
+            infile = cls.ALIASES_FILE
+        if os.path.isfile(infile):
+            data = FS.read_json(infile)
+            return ClusterAliases(data['url_by_cluster'], data['clusters_by_url'])
+        print('file {} not found; building the cluster aliases from {}'.format(infile, unique_urls_file))
+        return cls.from_unique_urls(FS.read_json(unique_urls_file))
+
+    @classmethod
+    def canonical_url(cls, url):
+        # the scheme and host names are case-insensitive; the credentials, path, and options are not
+        url = str(url).strip()
+        if '://' not in url:
+            return url
+        scheme, rest = url.split('://', 1)
+        userinfo, hosts = '', rest
+        at_idx = rest.rfind('@', 0, cls.hosts_end(rest))
+        if at_idx >= 0:
+            userinfo, hosts = rest[:at_idx + 1], rest[at_idx + 1:]
+        end_idx = cls.hosts_end(hosts)
+        hosts, suffix = hosts[:end_idx], hosts[end_idx:]
+        if suffix == '/':
+            suffix = ''
+        return '{}://{}{}{}'.format(scheme.lower(), userinfo, hosts.lower(), suffix)
+
+    @classmethod
+    def hosts_end(cls, s):
+        for idx, c in enumerate(s):
+            if c == '/' or c == '?':
+                return idx
+        return len(s)
+
+    def add(self, cluster_key, url):
+        canonical = self.canonical_url(url)
+        self.url_by_cluster[cluster_key] = canonical
+        if canonical not in self.clusters_by_url.keys():
+            self.clusters_by_url[canonical] = list()
+        self.clusters_by_url[canonical].append(cluster_key)
+
+    def url(self, cluster_key):
+        return self.url_by_cluster.get(cluster_key)
+
+    def siblings(self, cluster_key):
+        # the list of clusters with the same url, including the given cluster
+        url = self.url_by_cluster.get(cluster_key)
+        if url == None:
+            return list()
+        return self.clusters_by_url[url]
+
+    def duplicate_count(self):
+        return len(self.url_by_cluster) - len(self.clusters_by_url)
+
+    def save(self, outfile=None):
+        if outfile == None:
+            outfile = self.ALIASES_FILE
+        data = dict()
+        data['url_by_cluster'] = self.url_by_cluster
+        data['clusters_by_url'] = self.clusters_by_url
+        FS.write_json(data, outfile)
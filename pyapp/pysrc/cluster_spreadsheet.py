@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import warnings
+
+from openpyxl import load_workbook
+from openpyxl.utils.cell import column_index_from_string
+
+from pysrc.fs import FS
+
+# Instances of this class read the customer source/destination spreadsheet
+# in openpyxl read-only mode, one row at a time with iter_rows(values_only=True),
+# rather than loading the whole workbook and addressing each cell.  The
+# spreadsheet columns are configurable; the defaults may be overridden by
+# the optional file current/excel_column_map.json, for example:
+# {"cname": "G", "url": "M"}
+#
+# The parsed result is cached in tmp/, keyed by the hash of the workbook
+# bytes and the parse options, so an unchanged workbook isn't re-read.
+#
+# Chris Joakim, Microsoft, 2023
+
+class ClusterSpreadsheet(object):
+
+    DEFAULT_COLUMN_MAP = {
+        'prty':   'C',
+        'bar':    'D',
+        'env':    'E',
+        'cname':  'F',
+        'url':    'L',
+        'cosmos': 'AB',
+        'vcore':  'AC'}
+
+    COLUMN_MAP_FILE = 'current/excel_column_map.json'
+    CACHE_FILE = 'tmp/excel_clusters_cache.json'
+
+    def __init__(self, infile, wsname='Sheet1', column_map=None):
+        self.infile = infile
+        self.wsname = wsname
+        self.column_map = dict(self.DEFAULT_COLUMN_MAP)
+        if column_map != None:
+            self.column_map.update(column_map)
+        # zero-based positions within each row tuple
+        self.positions = dict()
+        for field, letter in self.column_map.items():
+            self.positions[field] = column_index_from_string(letter.strip().upper()) - 1
+        self.max_col = max(self.positions.values()) + 1
+        self.sheetnames, self.row_count = list(), None
+
+    @classmethod
+    def load_column_map(cls, infile=None):
+        if infile == None:
+            infile = cls.COLUMN_MAP_FILE
+        if os.path.isfile(infile):
+            print('using excel column map file: {}'.format(infile))
+            return FS.read_json(infile)
+        return None
+
+    def rows(self):
+        # A generator of dicts, one per worksheet row, of field name to the
+        # de-spaced string value.  As before, rows 2 through max_row - 1 are read.
+        # The stored dimension record is ignored, as many tools write a stale one
+        # (e.g. A1:A1), so max_row is the last non-empty row actually read.
+        warnings.filterwarnings('ignore', category=UserWarning, module='openpyxl')
+        wb = load_workbook(filename=self.infile, read_only=True)
+        try:
+            self.sheetnames = wb.sheetnames
+            ws = wb[self.wsname]
+            ws.reset_dimensions()
+            self.row_count = None
+            for values in self.all_but_last(ws.iter_rows(min_row=1, values_only=True)):
+                yield self.parse_row(values)
+        finally:
+            wb.close()
+
+    def all_but_last(self, iterator):
+        # yield the rows after the header up to, but excluding, the last non-empty
+        # row; row_count is set to the number of the last non-empty row
+        previous, blanks = None, list()
+        for idx, values in enumerate(iterator):
+            empty = all(value == None for value in values)
+            if not empty:
+                self.row_count = idx + 1
+            if idx == 0:
+                continue  # the header row
+            if empty:
+                blanks.append(values)
+                continue
+            if previous != None:
+                yield previous
+            for blank in blanks:
+                yield blank
+            previous, blanks = values, list()
+
+    def parse_row(self, values):
+        row = dict()
+        for field, pos in self.positions.items():
+            value = values[pos] if pos < len(values) else None
+            row[field] = str(value).replace(' ', '').strip()
+        return row
+
+    def workbook_hash(self):
+        sha = hashlib.sha256()
+        with open(self.infile, 'rb') as f:
+            while True:
+                data = f.read(1024 * 1024)
+                if not data:
+                    break
+                sha.update(data)
+        return sha.hexdigest()
+
+    def cache_key(self, mdb_cred):
+        # the credentials are part of the parsed connection strings, so are part of the key
+        options = dict()
+        options['workbook'] = self.workbook_hash()
+        options['wsname'] = self.wsname
+        options['column_map'] = self.column_map
+        options['cred'] = hashlib.sha256(mdb_cred.encode('utf-8')).hexdigest()
+        return hashlib.sha256(json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def read_cache(self, key, infile=None):
+        if infile == None:
+            infile = self.CACHE_FILE
+        if os.path.isfile(infile):
+            try:
+                data = FS.read_json(infile)
+                if data.get('key') == key:
+                    return data
+            except:
+                print('unable to read cache file {}; ignoring it'.format(infile))
+        return None
+
+    def write_cache(self, key, clusters, raw_urls, outfile=None):
+        if outfile == None:
+            outfile = self.CACHE_FILE
+        data = dict()
+        data['key'] = key
+        data['infile'] = self.infile
+        data['clusters'] = clusters
+        data['raw_urls'] = raw_urls
+        FS.write_json(data, outfile, pretty=False, verbose=False)
@@ -1,3 +1,5 @@
+import os
+
 from pysrc.env import Env
 from pysrc.fs import FS
 
@@ -48,6 +50,17 @@ class Datasets(object):
     def aggregated_mma_output_file(cls):
         return 'current/aggregated_mma_outputs.json'
 
+    @classmethod
+    def aggregated_mma_output_jsonl_file(cls, compression=None):
+        # compression is None, 'gz', or 'zst'
+        if compression is None:
+            return 'current/aggregated_mma_outputs.jsonl'
+        return 'current/aggregated_mma_outputs.jsonl.{}'.format(compression)
+
+    @classmethod
+    def mma_record_cache_file(cls):
+        return 'tmp/mma_record_cache.db'
+
     @classmethod
     def mma_logs_dir(cls):
         return '/Users/{}/AppData/Local/Temp/.dmamongo/logs'.format(cls.username())
@@ -175,6 +188,42 @@ class Datasets(object):
         cls.add_output_file(filename)
         FS.write_json(aggregated_json_files, filename)
 
+    @classmethod
+    def write_aggregated_mma_output_stream(cls, mma_objects):
+        # mma_objects is an iterable, such as a generator, of parsed MMA output files
+        filename = cls.aggregated_mma_output_file()
+        cls.add_output_file(filename)
+        return FS.write_json_list_stream(mma_objects, filename)
+
+    @classmethod
+    def write_aggregated_mma_output_jsonl_stream(cls, mma_objects, compression=None):
+        filename = cls.aggregated_mma_output_jsonl_file(compression)
+        cls.add_output_file(filename)
+        return FS.write_jsonl_stream(mma_objects, filename)
+
+    @classmethod
+    def iterate_aggregated_mma_outputs(cls):
+        # Return a generator of the aggregated MMA output objects, one at a time.
+        # The most recently written of the JSONL (optionally compressed) and
+        # JSON formats is read.  Both formats are decoded one object at a time.
+        candidates = list()
+        for compression in [None, 'gz', 'zst']:
+            candidates.append(cls.aggregated_mma_output_jsonl_file(compression))
+        candidates.append(cls.aggregated_mma_output_file())
+        filename, newest_mtime = cls.aggregated_mma_output_file(), -1
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                mtime = os.path.getmtime(candidate)
+                if mtime > newest_mtime:
+                    filename, newest_mtime = candidate, mtime
+        cls.add_input_file(filename)
+        if filename.endswith('.json'):
+            for mma_obj in FS.read_json_list_stream(filename):
+                yield mma_obj
+        else:
+            for mma_obj in FS.read_jsonl(filename):
+                yield mma_obj
+
     @classmethod
     def write_mma_output_dir_walk_list(cls, file_info_list):
         filename = cls.mma_output_dir_walk_list_file()
@@ -0,0 +1,42 @@
+from pysrc.counter import Counter
+from pysrc.mma_files import MmaFiles
+
+# This class is used to process the aggregated MMA outputs in a single pass.
+# Each MMA output object is classified once by file type, then passed to
+# each registered extractor for that type, such as instances of classes
+# ContainersAggregator, Shards, and Indices.
+#
+# An extractor implements these two methods:
+#   mma_file_types()                    <-- returns a list of MmaFiles file types
+#   process_mma_obj(file_type, mma_obj)
+#
+# Chris Joakim, Microsoft, 2023
+
+class MmaDispatcher(object):
+
+    def __init__(self):
+        self.extractors = dict()  # key is file type, value is a list of extractors
+        self.file_type_counter = Counter()
+
+    def register(self, extractor):
+        for file_type in extractor.mma_file_types():
+            if file_type not in self.extractors.keys():
+                self.extractors[file_type] = list()
+            self.extractors[file_type].append(extractor)
+
+    def dispatch(self, mma_objects):
+        all_files_extractors = self.extractors.get(MmaFiles.ALL_FILES, list())
+        count = 0
+        for mma_obj in mma_objects:
+            count = count + 1
+            file_type = MmaFiles.classify(mma_obj['_file_name'])
+            self.file_type_counter.increment(file_type)
+            for extractor in self.extractors.get(file_type, list()):
+                extractor.process_mma_obj(file_type, mma_obj)
+            for extractor in all_files_extractors:
+                if extractor not in self.extractors.get(file_type, list()):
+                    extractor.process_mma_obj(file_type, mma_obj)
+        return count
+
+    def get_file_type_counts(self):
+        return self.file_type_counter.get_data()
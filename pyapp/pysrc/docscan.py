@@ -50,6 +50,7 @@ class DocscanContainer(object):
         self.doc_count = -1
         self.largest_doc_size = -1
         self.largest_doc_prefix = ''
+        self.complete = True
         self.exception = None
 
         try:
@@ -59,20 +60,32 @@ class DocscanContainer(object):
             self.largest_doc_size  = data['largestSize']
             self.largest_doc_prefix = data['largestDocJsonPrefix'].replace(',',' ')
             self.key = '{}|{}|{}'.format(self.cluster_name, self.dbname, self.cname)
+            # a scan which failed partway, see DocScanner; the sizes are partial
+            self.complete = data.get('complete', True)
+            if 'sampleSize' in data.keys():
+                # the sizes were sampled, see DocScanner; report the collection document count
+                self.doc_count = data.get('estimatedDocumentCount', self.doc_count)
         except Exception as e:
             self.exception = e
 
     def get_data(self):
         return self.data
 
+    @classmethod
+    def csv_header(cls):
+        return 'cluster,database,collection,doc_count,largest_size,over_2mb,id,complete'
+
     def as_csv_header(self):
-        return 'cluster,database,collection,doc_count,largest_size,over_2mb,id'
+        return self.csv_header()
 
-    def as_csv(self):
+    def over_2mb(self):
         two_mb = Bytes.megabyte() * 2.0
-        over_2mb = 'no'
         if self.largest_doc_size > two_mb:
-            over_2mb = 'yes'
+            return 'yes'
+        return 'no'
+
+    def as_csv(self):
+        over_2mb = self.over_2mb()
 
         values = list()
         values.append(self.cluster_name)
@@ -82,6 +95,7 @@ class DocscanContainer(object):
         values.append(str(self.largest_doc_size))
         values.append(over_2mb)
         values.append(str(self.parse_id()))
+        values.append('yes' if self.complete else 'no')
         return ','.join(values)
 
     def parse_id(self):
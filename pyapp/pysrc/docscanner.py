@@ -0,0 +1,346 @@
+import heapq
+import json
+import math
+import time
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import arrow
+from bson import encode, json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import OperationFailure
+
+from pysrc.bytes import Bytes
+from pysrc.mongo import MongoClients
+
+# Instances of this class are a native python "large document scanner",
+# an alternative to the external https://github.com/cjoakim/mongodb-docscan
+# program.  Each collection of a cluster is iterated with pymongo, in
+# parallel, as RawBSONDocuments, so each document size is the length of
+# its raw BSON buffer and the documents aren't decoded.  The bounded top-N
+# heap of each collection holds the raw documents, and only its final
+# entries are decoded, after the scan, for their JSON prefix.  A collection
+# whose scan fails partway has 'complete' false and the exception message.
+#
+# For huge collections, the sampling mode instead estimates the size
+# distribution from a $sample of the documents, sized on the server with
+# $bsonSize, and estimates the number of documents over 2MB with a Wilson
+# score interval.  It can optionally be followed by a server-side $bsonSize
+# $match for the actual oversize documents, which returns only their ids.
+#
+# The server-side mode finds the largest and the oversize documents of each
+# collection exactly, with a single $bsonSize aggregation which returns only
+# ids and sizes, and falls back to the full client-side scan only where the
+# server doesn't support $bsonSize; other errors are recorded as exceptions.
+#
+# The output is in the clusterName/containerInfo format that class
+# DocscanClusterResult, in docscan.py, parses.
+#
+# Chris Joakim, Microsoft, 2023
+
+class DocScanner(object):
+
+    BYPASS_DBNAMES = ['admin', 'config', 'local']
+    JSON_PREFIX_LENGTH = 60
+    OVERSIZE_BYTES = int(Bytes.megabyte() * 2)
+    OVERSIZE_ID_LIMIT = 10000
+
+    # the OperationFailure codes and messages of a server without $bsonSize;
+    # 168 InvalidPipelineOperator, 31325 unknown expression, 40324 unrecognized stage
+    UNSUPPORTED_OPERATOR_CODES = [168, 31325, 40324]
+    UNSUPPORTED_OPERATOR_MESSAGES = ['unrecognized expression', 'unknown expression', 'unrecognized pipeline stage']
+    Z_95 = 1.96
+
+    def __init__(self, cluster_name, conn_str, workers=4, batch_size=1000, top_n=10, dbname=None,
+                 sample_size=0, find_oversize=False, server_side=False):
+        self.cluster_name = cluster_name
+        self.conn_str = conn_str
+        self.workers = workers
+        self.batch_size = batch_size
+        self.top_n = top_n
+        self.dbname = dbname
+        self.sample_size = sample_size  # 0 is a full scan of each collection
+        self.find_oversize = find_oversize
+        self.server_side = server_side
+        if sample_size > 0 and server_side:
+            raise ValueError('the sampling (--sample) and server-side (--server-side) modes are exclusive')
+        self.client = MongoClients.get(conn_str)
+        self.codec_options = CodecOptions(document_class=RawBSONDocument)
+
+    def scan(self):
+        result = dict()
+        result['clusterName'] = self.cluster_name
+        result['scanStart'] = arrow.utcnow().format('YYYY-MM-DD HH:mm:ss ZZ')
+        result['batchSize'] = self.batch_size
+        result['sampleSize'] = self.sample_size
+        result['containerInfo'] = dict()
+        db_collections = self.db_collections()
+        print('docscan cluster: {} collections: {} workers: {}'.format(
+            self.cluster_name, len(db_collections), self.workers))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = list()
+            scan_function = self.scan_collection
+            if self.sample_size > 0:
+                scan_function = self.sample_collection
+            elif self.server_side:
+                scan_function = self.server_side_collection
+            for dbname, cname in db_collections:
+                futures.append(pool.submit(scan_function, dbname, cname))
+            for future in as_completed(futures):
+                container_info = future.result()
+                key = '{}|{}'.format(container_info['dbName'], container_info['cName'])
+                print('docscan collection: {} documents: {} largest: {} ms: {}'.format(
+                    key, container_info['iteratedDocumentCount'],
+                    container_info['largestSize'], container_info['elapsedMs']))
+                result['containerInfo'][key] = container_info
+        result['containerInfo'] = dict(sorted(result['containerInfo'].items()))
+        result['scanEnd'] = arrow.utcnow().format('YYYY-MM-DD HH:mm:ss ZZ')
+        return result
+
+    def db_collections(self):
+        # return a list of (dbname, cname) tuples for the non-system collections
+        db_collections = list()
+        if self.dbname != None:
+            dbnames = [self.dbname]
+        else:
+            dbnames = sorted(self.client.list_database_names())
+        for dbname in dbnames:
+            if dbname not in self.BYPASS_DBNAMES:
+                cnames = self.client[dbname].list_collection_names(filter={'type': 'collection'})
+                for cname in sorted(cnames):
+                    if not cname.startswith('system.'):
+                        db_collections.append((dbname, cname))
+        return db_collections
+
+    def new_info(self, dbname, cname):
+        info = dict()
+        info['dbName'] = dbname
+        info['cName'] = cname
+        info['iteratedDocumentCount'] = 0
+        info['estimatedDocumentCount'] = -1
+        info['largestSize'] = 0
+        info['largestDocJsonPrefix'] = ''
+        info['largestDocuments'] = list()
+        info['exceptions'] = list()
+        info['complete'] = True
+        return info
+
+    def add_exception(self, info, e):
+        # the collection's results are partial, if present at all
+        info['exceptions'].append(str(e))
+        info['complete'] = False
+        print(traceback.format_exc())
+
+    def scan_collection(self, dbname, cname):
+        t1 = time.time()
+        info = self.new_info(dbname, cname)
+        heap, count = list(), 0  # the heap entries are (size, seq, RawBSONDocument)
+        try:
+            coll = self.client[dbname].get_collection(cname, codec_options=self.codec_options)
+            info['estimatedDocumentCount'] = coll.estimated_document_count()
+            for doc in coll.find({}, batch_size=self.batch_size):
+                size = len(doc.raw)
+                count = count + 1
+                if len(heap) < self.top_n:
+                    heapq.heappush(heap, (size, count, doc))
+                elif size > heap[0][0]:
+                    heapq.heapreplace(heap, (size, count, doc))
+        except Exception as e:
+            self.add_exception(info, e)
+        info['iteratedDocumentCount'] = count
+        for size, seq, doc in sorted(heap, key=lambda entry: (-entry[0], entry[1])):
+            largest = dict()
+            largest['size'] = size
+            largest['jsonPrefix'] = self.json_prefix(doc)
+            info['largestDocuments'].append(largest)
+        if len(info['largestDocuments']) > 0:
+            info['largestSize'] = info['largestDocuments'][0]['size']
+            info['largestDocJsonPrefix'] = info['largestDocuments'][0]['jsonPrefix']
+        info['elapsedMs'] = int((time.time() - t1) * 1000)
+        return info
+
+    def server_side_collection(self, dbname, cname):
+        # Size every document on the server, in one pass, and return only the counts
+        # and the ids and sizes of the largest and oversize documents.  If $bsonSize
+        # isn't supported, fall back to the client-side scan of the raw documents.
+        t1 = time.time()
+        try:
+            coll = self.client[dbname].get_collection(cname)
+            estimated_count = coll.estimated_document_count()
+            results = list(coll.aggregate(self.server_side_pipeline()))
+        except Exception as e:
+            if self.is_unsupported_operator(e):
+                print('$bsonSize unsupported for {}.{}, scanning client-side: {}'.format(dbname, cname, str(e)))
+                info = self.scan_collection(dbname, cname)
+                info['detection'] = 'client'
+                return info
+            info = self.new_info(dbname, cname)
+            info['detection'] = 'server'
+            self.add_exception(info, e)
+            info['elapsedMs'] = int((time.time() - t1) * 1000)
+            return info
+
+        facets = results[0] if len(results) > 0 else dict()
+        stats = facets.get('stats', list())
+        stats = stats[0] if len(stats) > 0 else {'n': 0, 'over': 0}
+        info = self.new_info(dbname, cname)
+        info['detection'] = 'server'
+        info['iteratedDocumentCount'] = stats['n']
+        info['estimatedDocumentCount'] = estimated_count
+        for doc in facets.get('largest', list()):
+            info['largestDocuments'].append({'size': doc['s'], 'jsonPrefix': self.id_json_prefix(doc['_id'])})
+        if len(info['largestDocuments']) > 0:
+            info['largestSize'] = info['largestDocuments'][0]['size']
+            info['largestDocJsonPrefix'] = info['largestDocuments'][0]['jsonPrefix']
+        info['oversizeDocumentCount'] = stats['over']
+        info['oversizeDocuments'] = list()
+        for doc in facets.get('oversize', list()):
+            info['oversizeDocuments'].append({'size': doc['s'], 'jsonPrefix': self.id_json_prefix(doc['_id'])})
+        info['elapsedMs'] = int((time.time() - t1) * 1000)
+        return info
+
+    def server_side_pipeline(self):
+        # the oversize ids are limited so that the single $facet result stays well under 16MB
+        oversize = {'$gt': ['$s', self.OVERSIZE_BYTES]}
+        return [
+            {'$project': {'s': {'$bsonSize': '$$ROOT'}}},
+            {'$facet': {
+                'stats': [{'$group': {
+                    '_id': None,
+                    'n': {'$sum': 1},
+                    'over': {'$sum': {'$cond': [oversize, 1, 0]}}}}],
+                'largest': [{'$sort': {'s': -1}}, {'$limit': self.top_n}],
+                'oversize': [
+                    {'$match': {'s': {'$gt': self.OVERSIZE_BYTES}}},
+                    {'$limit': self.OVERSIZE_ID_LIMIT}]}}]
+
+    def sample_collection(self, dbname, cname):
+        # estimate the document sizes from a sample rather than a full scan
+        t1 = time.time()
+        info = self.new_info(dbname, cname)
+        info['sampleSize'] = self.sample_size
+        sizes, largest = list(), dict()  # key is the encoded _id, value is the (_id, size)
+        try:
+            coll = self.client[dbname].get_collection(cname, codec_options=self.codec_options)
+            info['estimatedDocumentCount'] = coll.estimated_document_count()
+            for doc_id, size in self.sampled_sizes(coll):
+                sizes.append(size)
+                largest[self.id_key(doc_id)] = (doc_id, size)
+            if self.find_oversize:
+                oversize_count = 0
+                for doc_id, size in self.oversize_documents(coll):
+                    oversize_count = oversize_count + 1
+                    largest[self.id_key(doc_id)] = (doc_id, size)
+                info['oversizeDocumentCount'] = oversize_count
+        except Exception as e:
+            self.add_exception(info, e)
+
+        sizes.sort()
+        info['iteratedDocumentCount'] = len(sizes)
+        info['sizePercentiles'] = {
+            'p50': self.percentile(sizes, 50),
+            'p95': self.percentile(sizes, 95),
+            'p99': self.percentile(sizes, 99),
+            'max': sizes[-1] if len(sizes) > 0 else 0}
+        over_count = len([size for size in sizes if size > self.OVERSIZE_BYTES])
+        low, high = self.wilson_interval(over_count, len(sizes), self.Z_95)
+        doc_count = max(info['estimatedDocumentCount'], len(sizes))
+        info['over2mbSampleCount'] = over_count
+        info['over2mbEstimatedCount'] = int(round(doc_count * over_count / len(sizes))) if len(sizes) > 0 else 0
+        info['over2mbEstimatedCountLow'] = int(math.floor(doc_count * low))
+        info['over2mbEstimatedCountHigh'] = int(math.ceil(doc_count * high))
+        info['confidence'] = 0.95
+
+        entries = [(size, seq, doc_id) for seq, (doc_id, size) in enumerate(largest.values())]
+        for size, seq, doc_id in heapq.nsmallest(self.top_n, entries, key=lambda entry: (-entry[0], entry[1])):
+            info['largestDocuments'].append({'size': size, 'jsonPrefix': self.id_json_prefix(doc_id)})
+        if len(info['largestDocuments']) > 0:
+            info['largestSize'] = info['largestDocuments'][0]['size']
+            info['largestDocJsonPrefix'] = info['largestDocuments'][0]['jsonPrefix']
+        info['elapsedMs'] = int((time.time() - t1) * 1000)
+        return info
+
+    def sampled_sizes(self, coll):
+        # return a list of (_id, bson size) tuples of a $sample of the collection; the
+        # sizes are computed on the server with $bsonSize (MongoDB 4.4+), else from
+        # the raw sampled documents
+        pipeline = [
+            {'$sample': {'size': self.sample_size}},
+            {'$project': {'_id': 1, 'size': {'$bsonSize': '$$ROOT'}}}]
+        try:
+            docs = list(coll.aggregate(pipeline, batchSize=self.batch_size))
+            return [(doc['_id'], doc['size']) for doc in docs]
+        except OperationFailure as e:
+            if not self.is_unsupported_operator(e):
+                raise
+            print('$bsonSize unsupported for {}, sizing the sampled documents client-side: {}'.format(
+                coll.full_name, str(e)))
+        pipeline = [{'$sample': {'size': self.sample_size}}]
+        return [(doc['_id'], len(doc.raw)) for doc in coll.aggregate(pipeline, batchSize=self.batch_size)]
+
+    @classmethod
+    def is_unsupported_operator(cls, e):
+        # only these errors fall back to a client-side alternative; others, such as
+        # authorization failures, timeouts, and memory limits, are not retried that way
+        if not isinstance(e, OperationFailure):
+            return False
+        if e.code in cls.UNSUPPORTED_OPERATOR_CODES:
+            return True
+        message = str(e).lower()
+        for pattern in cls.UNSUPPORTED_OPERATOR_MESSAGES:
+            if pattern in message:
+                return True
+        return False
+
+    def oversize_documents(self, coll):
+        # a generator of (_id, bson size) tuples of the documents over the oversize threshold;
+        # the documents are filtered on the server and only their ids and sizes are returned
+        pipeline = [
+            {'$match': {'$expr': {'$gt': [{'$bsonSize': '$$ROOT'}, self.OVERSIZE_BYTES]}}},
+            {'$project': {'_id': 1, 'size': {'$bsonSize': '$$ROOT'}}}]
+        for doc in coll.aggregate(pipeline, batchSize=self.batch_size):
+            yield doc['_id'], doc['size']
+
+    def id_key(self, doc_id):
+        # a hashable, exact key for any _id value, such as a long string or a document
+        return encode({'_id': doc_id})
+
+    def id_json_prefix(self, doc_id):
+        return ('{"_id": ' + json_util.dumps(doc_id) + '}')[:self.JSON_PREFIX_LENGTH]
+
+    @classmethod
+    def percentile(cls, sorted_values, pct):
+        # the nearest-rank percentile of the given sorted list
+        if len(sorted_values) == 0:
+            return 0
+        rank = int(math.ceil((pct / 100.0) * len(sorted_values)))
+        return sorted_values[max(rank, 1) - 1]
+
+    @classmethod
+    def wilson_interval(cls, successes, n, z):
+        # the Wilson score interval of a binomial proportion; it remains meaningful
+        # when no, or all, of the sampled documents are oversize
+        if n == 0:
+            return 0.0, 1.0
+        p = float(successes) / n
+        denominator = 1.0 + (z * z) / n
+        center = (p + (z * z) / (2.0 * n)) / denominator
+        margin = (z * math.sqrt((p * (1.0 - p) / n) + (z * z) / (4.0 * n * n))) / denominator
+        return max(0.0, center - margin), min(1.0, center + margin)
+
+    def json_prefix(self, doc):
+        # the extended JSON of the leading top-level fields, such as _id, of the document;
+        # long strings are truncated before serialization as only the prefix is kept
+        parts, length, suffix = list(), 0, '}'
+        for name, value in doc.items():
+            if isinstance(value, str) and len(value) > self.JSON_PREFIX_LENGTH:
+                value = value[:self.JSON_PREFIX_LENGTH]
+            part = '{}: {}'.format(json.dumps(name), json_util.dumps(value))
+            parts.append(part)
+            length = length + len(part) + 2
+            if length > self.JSON_PREFIX_LENGTH:
+                suffix = ''
+                break
+        return ('{' + ', '.join(parts) + suffix)[:self.JSON_PREFIX_LENGTH]
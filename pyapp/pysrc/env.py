@@ -58,3 +58,23 @@ class Env(object):
             if arg == flag:
                 return True
         return False
+
+    @classmethod
+    def int_arg(cls, flag, default):
+        # return the integer value following the given flag, such as '--workers 8'
+        for idx, arg in enumerate(sys.argv):
+            if arg == flag:
+                try:
+                    return int(sys.argv[idx + 1])
+                except (ValueError, IndexError):
+                    return default
+        return default
+
+    @classmethod
+    def str_arg(cls, flag, default):
+        # return the string value following the given flag, such as '--format jsonl'
+        for idx, arg in enumerate(sys.argv):
+            if arg == flag:
+                if idx + 1 < len(sys.argv):
+                    return sys.argv[idx + 1]
+        return default
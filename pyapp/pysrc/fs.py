@@ -1,6 +1,9 @@
 import csv
+import gzip
+import io
 import json
 import os
+import re
 
 # This class is used to do IO operations vs the local File System.
 #
@@ -8,6 +11,11 @@ import os
 
 class FS(object):
 
+    # the characters which may end an array element, outside and inside of strings
+    JSON_NESTED_SPECIAL = re.compile(r'["\[\]{}]')
+    JSON_TOP_SPECIAL = re.compile(r'["\[\]{},\s]')
+    JSON_STRING_SPECIAL = re.compile(r'["\\]')
+
     @classmethod
     def as_unix_filename(cls, filename):
         if filename.upper().startswith("C:"):
@@ -98,6 +106,185 @@ class FS(object):
             if verbose == True:
                 print('file written: {}'.format(outfile))
 
+    @classmethod
+    def write_json_list_stream(cls, objects, outfile, pretty=True, verbose=True):
+        # write the given iterable of objects as a JSON array, one object at a time,
+        # so that the complete list is never held in memory.  returns the object count.
+        count = 0
+        with open(outfile, 'w') as f:
+            f.write('[')
+            for obj in objects:
+                if count > 0:
+                    f.write(',')
+                if pretty == True:
+                    f.write('\n')
+                    f.write(json.dumps(obj, sort_keys=False, indent=2))
+                else:
+                    f.write(json.dumps(obj))
+                count = count + 1
+            f.write('\n]')
+            if verbose == True:
+                print('file written: {} with {} objects'.format(outfile, count))
+        return count
+
+    @classmethod
+    def read_json_list_stream(cls, infile, chunk_size=1024 * 1024):
+        # return a generator of the objects in the given JSON array file, such as
+        # one written by write_json_list_stream.  the file is read in chunks, the
+        # end of each array element is found by tracking its nesting depth and
+        # string state, and the element is then decoded once, so only one element
+        # (plus one chunk) is held in memory at a time.  the read size grows
+        # geometrically while an element is incomplete, so large elements are
+        # read in linear time.
+        decoder = json.JSONDecoder()
+        with open(infile, 'rt') as f:
+            buf, pos, eof, started, scan = '', 0, False, False, None
+            while True:
+                if scan == None:
+                    while pos < len(buf) and buf[pos] in ' \t\r\n':
+                        pos = pos + 1
+                    if pos >= len(buf):
+                        if eof:
+                            raise ValueError('unterminated JSON array in {}'.format(infile))
+                        buf, pos = f.read(chunk_size), 0
+                        eof = len(buf) == 0
+                        continue
+                    c = buf[pos]
+                    if not started:
+                        if c != '[':
+                            raise ValueError('{} does not contain a JSON array'.format(infile))
+                        started, pos = True, pos + 1
+                        continue
+                    if c == ']':
+                        return
+                    if c == ',':
+                        pos = pos + 1
+                        continue
+                    scan = [pos, 0, False]  # the scan index, nesting depth, and in-string state
+                end = cls.json_element_end(buf, scan)
+                if end < 0 and eof:
+                    end = len(buf)  # a trailing scalar; raw_decode reports any error
+                if end < 0:
+                    data = f.read(max(chunk_size, len(buf) - pos))
+                    eof = len(data) == 0
+                    scan[0] = scan[0] - pos
+                    buf, pos = buf[pos:] + data, 0
+                    continue
+                obj, obj_end = decoder.raw_decode(buf, pos)
+                scan = None
+                yield obj
+                pos = obj_end
+
+    @classmethod
+    def json_element_end(cls, buf, scan):
+        # return the end index of the JSON element which starts in buf at the initial
+        # scan index, or -1 if it is incomplete; scan is updated to resume the search
+        idx, depth, in_string = scan
+        while True:
+            if in_string:
+                m = cls.JSON_STRING_SPECIAL.search(buf, idx)
+                if m == None:
+                    idx = len(buf)
+                    break
+                idx = m.start()
+                if buf[idx] == '\\':
+                    if idx + 1 >= len(buf):
+                        break  # resume at the backslash when more data is read
+                    idx = idx + 2
+                    continue
+                in_string, idx = False, idx + 1
+                if depth == 0:
+                    return idx
+                continue
+            if depth == 0:
+                m = cls.JSON_TOP_SPECIAL.search(buf, idx)
+            else:
+                m = cls.JSON_NESTED_SPECIAL.search(buf, idx)
+            if m == None:
+                idx = len(buf)
+                break
+            idx = m.start()
+            c = buf[idx]
+            if c == '"':
+                in_string, idx = True, idx + 1
+            elif c == '[' or c == '{':
+                depth, idx = depth + 1, idx + 1
+            elif c == ']' or c == '}':
+                if depth == 0:
+                    return idx  # the array close after a scalar element
+                depth, idx = depth - 1, idx + 1
+                if depth == 0:
+                    return idx
+            else:
+                return idx  # a comma or whitespace after a scalar element
+        scan[0], scan[1], scan[2] = idx, depth, in_string
+        return -1
+
+    @classmethod
+    def write_json_dict_stream(cls, items, outfile, pretty=True, verbose=True):
+        # write the given iterable of (key, value) tuples as a JSON object, one entry
+        # at a time, in the same format as write_json.  returns the entry count.
+        count = 0
+        with open(outfile, 'w') as f:
+            f.write('{')
+            for key, value in items:
+                if count > 0:
+                    f.write(',' if pretty == True else ', ')
+                if pretty == True:
+                    f.write('\n  ')
+                    f.write(json.dumps(key))
+                    f.write(': ')
+                    f.write(json.dumps(value, sort_keys=False, indent=2).replace('\n', '\n  '))
+                else:
+                    f.write('{}: {}'.format(json.dumps(key), json.dumps(value)))
+                count = count + 1
+            if pretty == True and count > 0:
+                f.write('\n')
+            f.write('}')
+            if verbose == True:
+                print('file written: {} with {} entries'.format(outfile, count))
+        return count
+
+    @classmethod
+    def open_text(cls, filename, mode='rt'):
+        # open a text file, transparently compressed based on its suffix:
+        # .gz uses the gzip standard library, .zst requires the optional zstandard library
+        if filename.endswith('.gz'):
+            return gzip.open(filename, mode, encoding='utf-8')
+        if filename.endswith('.zst'):
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError('the zstandard library is required for file: {}'.format(filename))
+            if mode.startswith('w'):
+                stream = zstandard.ZstdCompressor().stream_writer(open(filename, 'wb'))
+            else:
+                stream = zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'))
+            return io.TextIOWrapper(stream, encoding='utf-8')
+        return open(filename, mode, encoding='utf-8')
+
+    @classmethod
+    def write_jsonl_stream(cls, objects, outfile, verbose=True):
+        # write the given iterable of objects as line-delimited JSON; returns the object count
+        count = 0
+        with cls.open_text(outfile, 'wt') as f:
+            for obj in objects:
+                f.write(json.dumps(obj))
+                f.write('\n')
+                count = count + 1
+        if verbose == True:
+            print('file written: {} with {} objects'.format(outfile, count))
+        return count
+
+    @classmethod
+    def read_jsonl(cls, infile):
+        # return a generator of the objects in the given line-delimited JSON file
+        with cls.open_text(infile, 'rt') as f:
+            for line in f:
+                stripped = line.strip()
+                if len(stripped) > 0:
+                    yield json.loads(stripped)
+
     @classmethod
     def write_lines(cls, lines, outfile, verbose=True):
         with open(outfile, 'w', encoding="utf-8") as f:
@@ -155,6 +342,16 @@ class FS(object):
                 files.append(entry)
         return files
 
+    @classmethod
+    def write_csv_rows(cls, header, rows, outfile, verbose=True):
+        with open(outfile, 'w', newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if header != None:
+                writer.writerow(header)
+            writer.writerows(rows)
+        if verbose == True:
+            print('file written: {}'.format(outfile))
+
     @classmethod
     def read_csvfile_into_rows(cls, infile, delim=','):
         rows = list()  # return a list of csv rows
@@ -0,0 +1,139 @@
+from pysrc.index_fingerprint import IndexFingerprint
+
+# Instances of this class compare the source and target index captures
+# produced by indexes2.py, which are dicts of db -> coll -> index name -> index.
+# Each side is indexed once as 'db|coll' -> {index name: fingerprint}, then the
+# missing, extra, and mismatched indexes are computed with set operations in a
+# single pass over the collections.
+#
+# Chris Joakim, Microsoft, 2023
+
+class IndexComparison(object):
+
+    # diff status values
+    COLL_NOT_IN_TARGET = 'collection_not_in_target'
+    COLL_NOT_IN_SOURCE = 'collection_not_in_source'
+    INDEXES_UNAVAILABLE = 'indexes_unavailable'
+    INDEX_NOT_IN_TARGET = 'index_not_in_target'
+    INDEX_NOT_IN_SOURCE = 'index_not_in_source'
+    NAME_MISMATCH = 'name_mismatch'  # same definition, different index name
+    DEFINITION_MISMATCH = 'definition_mismatch'
+
+    CSV_HEADER = ['db', 'coll', 'index_name', 'status', 'source_fingerprint', 'target_fingerprint']
+
+    def __init__(self, combined_dict, cli_dbname='all', cli_cname='all'):
+        self.definitions = dict()  # key is fingerprint, value is the normalized index
+        self.source = self.build_index(combined_dict.get('source', dict()), cli_dbname, cli_cname)
+        self.target = self.build_index(combined_dict.get('target', dict()), cli_dbname, cli_cname)
+        self.diffs = list()
+        self.matched_count = 0
+
+    @classmethod
+    def names_match(cls, cli_name, found_name):
+        if cli_name.lower() == 'all':
+            return True
+        if '@' in cli_name:
+            cli_fuzzy = cli_name.replace('@', '')
+            return cli_fuzzy in found_name
+        else:
+            return cli_name == found_name
+
+    def build_index(self, db_colls_dict, cli_dbname, cli_cname):
+        # returns a dict of 'db|coll' -> {index name: fingerprint}, or None if the
+        # indexes of the collection could not be captured
+        index = dict()
+        for dbname in db_colls_dict.keys():
+            if self.names_match(cli_dbname, dbname):
+                colls_dict = db_colls_dict[dbname]
+                for cname in colls_dict.keys():
+                    if self.names_match(cli_cname, cname):
+                        db_coll_key = '{}|{}'.format(dbname, cname)
+                        coll_indexes = colls_dict[cname]
+                        if isinstance(coll_indexes, dict):
+                            index[db_coll_key] = self.fingerprint_indexes(coll_indexes)
+                        else:
+                            index[db_coll_key] = None
+        return index
+
+    def fingerprint_indexes(self, coll_indexes):
+        fingerprints = dict()
+        for index_name in coll_indexes.keys():
+            fingerprint = IndexFingerprint.fingerprint(coll_indexes[index_name])
+            if fingerprint not in self.definitions.keys():
+                self.definitions[fingerprint] = IndexFingerprint.normalize(coll_indexes[index_name])
+            fingerprints[index_name] = fingerprint
+        return fingerprints
+
+    def compare(self):
+        self.diffs, self.matched_count = list(), 0
+        source_keys, target_keys = set(self.source.keys()), set(self.target.keys())
+        for db_coll_key in sorted(source_keys.union(target_keys)):
+            if db_coll_key not in target_keys:
+                self.add_diff(db_coll_key, '', self.COLL_NOT_IN_TARGET)
+            elif db_coll_key not in source_keys:
+                self.add_diff(db_coll_key, '', self.COLL_NOT_IN_SOURCE)
+            else:
+                self.compare_collection(db_coll_key, self.source[db_coll_key], self.target[db_coll_key])
+        return self.diffs
+
+    def compare_collection(self, db_coll_key, source_fps, target_fps):
+        if source_fps == None or target_fps == None:
+            self.add_diff(db_coll_key, '', self.INDEXES_UNAVAILABLE)
+            return
+        source_names, target_names = set(source_fps.keys()), set(target_fps.keys())
+        source_defs, target_defs = set(source_fps.values()), set(target_fps.values())
+
+        for name in sorted(source_names.difference(target_names)):
+            fp = source_fps[name]
+            if fp in target_defs:
+                self.add_diff(db_coll_key, name, self.NAME_MISMATCH, fp, fp)
+            else:
+                self.add_diff(db_coll_key, name, self.INDEX_NOT_IN_TARGET, fp, '')
+        for name in sorted(target_names.difference(source_names)):
+            fp = target_fps[name]
+            if fp not in source_defs:
+                self.add_diff(db_coll_key, name, self.INDEX_NOT_IN_SOURCE, '', fp)
+        for name in sorted(source_names.intersection(target_names)):
+            if source_fps[name] == target_fps[name]:
+                self.matched_count = self.matched_count + 1
+            else:
+                self.add_diff(db_coll_key, name, self.DEFINITION_MISMATCH, source_fps[name], target_fps[name])
+
+    def add_diff(self, db_coll_key, index_name, status, source_fp='', target_fp=''):
+        tokens = db_coll_key.split('|')
+        diff = dict()
+        diff['db'] = tokens[0]
+        diff['coll'] = tokens[1]
+        diff['index_name'] = index_name
+        diff['status'] = status
+        diff['source_fingerprint'] = source_fp
+        diff['target_fingerprint'] = target_fp
+        self.diffs.append(diff)
+
+    def summary(self):
+        summary = dict()
+        summary['source_collections'] = len(self.source)
+        summary['target_collections'] = len(self.target)
+        summary['matched_indexes'] = self.matched_count
+        summary['diff_count'] = len(self.diffs)
+        for diff in self.diffs:
+            status = diff['status']
+            summary[status] = summary.get(status, 0) + 1
+        return summary
+
+    def diffs_report(self):
+        report = dict()
+        report['summary'] = self.summary()
+        report['diffs'] = self.diffs
+        fingerprints = set()
+        for diff in self.diffs:
+            fingerprints.add(diff['source_fingerprint'])
+            fingerprints.add(diff['target_fingerprint'])
+        report['definitions'] = {fp: self.definitions[fp] for fp in sorted(fingerprints) if fp != ''}
+        return report
+
+    def csv_rows(self):
+        rows = list()
+        for diff in self.diffs:
+            rows.append([diff[attr] for attr in self.CSV_HEADER])
+        return rows
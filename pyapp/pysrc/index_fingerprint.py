@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+
+from pysrc.fs import FS
+
+# This module is used to compute a canonical fingerprint for a MongoDB index,
+# which is a stable hash of its key pattern and options, and to maintain an
+# index of fingerprint to the collections which use it.  The index is built
+# incrementally from the tmp/indexes/<host>.json files created by indexesx.py,
+# so only new or modified cluster files need to be read on subsequent runs.
+#
+# Chris Joakim, Microsoft, 2023
+
+class IndexFingerprint(object):
+
+    # these attributes don't affect the behavior of the index
+    IGNORED_ATTRIBUTES = ['v', 'ns', 'name', 'background']
+
+    @classmethod
+    def normalize(cls, index):
+        normalized = dict()
+        for attr_name in index.keys():
+            if attr_name not in cls.IGNORED_ATTRIBUTES:
+                normalized[attr_name] = cls.normalize_value(index[attr_name])
+        return normalized
+
+    @classmethod
+    def normalize_value(cls, value):
+        # 1.0 and 1, as returned by different servers and drivers, are the same
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, (list, tuple)):
+            return [cls.normalize_value(v) for v in value]
+        if isinstance(value, dict):
+            return {k: cls.normalize_value(v) for k, v in value.items()}
+        return value
+
+    @classmethod
+    def canonical_json(cls, index):
+        # the key pattern is a list of [field, direction] pairs; its order is significant
+        return json.dumps(cls.normalize(index), sort_keys=True, separators=(',', ':'))
+
+    @classmethod
+    def fingerprint(cls, index):
+        return hashlib.sha1(cls.canonical_json(index).encode('utf-8')).hexdigest()
+
+
+class IndexFingerprintRegistry(object):
+
+    def __init__(self):
+        self.definitions = dict()  # key is fingerprint, value is the normalized index
+        self.occurrences = dict()  # key is fingerprint, value is a list of occurrence dicts
+        self.files = dict()        # key is cluster filename, value is its mtime and fingerprints
+
+    @classmethod
+    def load(cls, infile):
+        registry = IndexFingerprintRegistry()
+        if os.path.isfile(infile):
+            data = FS.read_json(infile)
+            registry.definitions = data['definitions']
+            registry.occurrences = data['occurrences']
+            registry.files = data['files']
+        return registry
+
+    def save(self, outfile):
+        data = dict()
+        data['definitions'] = self.definitions
+        data['occurrences'] = self.occurrences
+        data['files'] = self.files
+        FS.write_json(data, outfile, pretty=False)
+
+    def refresh(self, directory):
+        # add the new and modified cluster files in the directory, and remove the deleted ones;
+        # returns the number of files read
+        current_files, read_count = set(), 0
+        for file in FS.walk(directory):
+            infile = file['full']
+            if infile.endswith('.json'):
+                current_files.add(infile)
+                if self.add_cluster_file(infile):
+                    read_count = read_count + 1
+        for infile in list(self.files.keys()):
+            if infile not in current_files:
+                self.remove_cluster_file(infile)
+        return read_count
+
+    def add_cluster_file(self, infile):
+        # returns True if the file was read, False if it is unchanged since it was last added
+        mtime = os.path.getmtime(infile)
+        if infile in self.files.keys():
+            if self.files[infile]['mtime'] == mtime:
+                return False
+            self.remove_cluster_file(infile)
+        cluster_data = FS.read_json(infile)
+        self.add_cluster_data(infile, mtime, cluster_data)
+        return True
+
+    def add_cluster_data(self, infile, mtime, cluster_data):
+        host = cluster_data.get('host', infile)
+        fingerprints = set()
+        cluster_indexes = cluster_data.get('indexes', dict())
+        for db_cname_key in sorted(cluster_indexes.keys()):
+            # db_cname_key is in 'dbname|cname' format
+            coll_index_data = cluster_indexes[db_cname_key]
+            if not isinstance(coll_index_data, dict):
+                continue
+            for index_name in sorted(coll_index_data.keys()):
+                index = coll_index_data[index_name]
+                if isinstance(index, dict):
+                    fingerprints.add(self.add_index(infile, host, db_cname_key, index_name, index))
+        self.files[infile] = {'mtime': mtime, 'fingerprints': sorted(fingerprints)}
+
+    def add_index(self, infile, host, db_cname_key, index_name, index):
+        fingerprint = IndexFingerprint.fingerprint(index)
+        if fingerprint not in self.definitions.keys():
+            self.definitions[fingerprint] = IndexFingerprint.normalize(index)
+            self.occurrences[fingerprint] = list()
+        occurrence = dict()
+        occurrence['file'] = infile
+        occurrence['host'] = host
+        occurrence['db_cname'] = db_cname_key
+        occurrence['index_name'] = index_name
+        self.occurrences[fingerprint].append(occurrence)
+        return fingerprint
+
+    def remove_cluster_file(self, infile):
+        if infile in self.files.keys():
+            for fingerprint in self.files[infile]['fingerprints']:
+                remaining = [o for o in self.occurrences[fingerprint] if o['file'] != infile]
+                if len(remaining) > 0:
+                    self.occurrences[fingerprint] = remaining
+                else:
+                    del self.occurrences[fingerprint]
+                    del self.definitions[fingerprint]
+            del self.files[infile]
+
+    def resolve(self, fingerprint_prefix):
+        # return the fingerprints which start with the given, possibly abbreviated, value
+        return sorted([fp for fp in self.occurrences.keys() if fp.startswith(fingerprint_prefix)])
+
+    def where(self, fingerprint_prefix):
+        # return the occurrences, in all clusters, of the given fingerprint
+        results = list()
+        for fingerprint in self.resolve(fingerprint_prefix):
+            results.extend(self.occurrences[fingerprint])
+        return results
+
+    def counts(self):
+        counts = dict()
+        for fingerprint in self.occurrences.keys():
+            counts[fingerprint] = len(self.occurrences[fingerprint])
+        return counts
@@ -3,6 +3,7 @@ import json
 from pysrc.counter import Counter
 from pysrc.datasets import Datasets
 from pysrc.env import Env
+from pysrc.mma_files import MmaFiles
 
 # This class is used to extact the MongoDB index information from the
 # MMA outputs.
@@ -11,26 +12,33 @@ from pysrc.env import Env
 
 class Indices(object):
 
-    def __init__(self, aggregated_mma_outputs):
+    def __init__(self, aggregated_mma_outputs=None):
         self.aggregated_mma_outputs = aggregated_mma_outputs
         self.aggregated_index_info = dict()
         self.aggregated_index_advice = dict()
         self.index_issue_counter = Counter()
 
     def extract_info_and_advice(self):
-        identifier = 'AppData'
         for mma_obj in self.aggregated_mma_outputs:
             filename = mma_obj['_file_name'].strip()
             if 'index' in filename:
                 if Env.verbose():
                     print(filename)
-            if identifier in filename:
-                if 'index_metadata' in filename:
-                    if filename.endswith('.json'):
-                        self.parse_index_metadata(mma_obj)
-                elif filename.endswith('index_advisor_report.json'):
-                    self.parse_index_advisor_report(mma_obj)
+            file_type = MmaFiles.classify(filename)
+            if file_type in self.mma_file_types():
+                self.process_mma_obj(file_type, mma_obj)
+        self.write_info_and_advice()
 
+    def mma_file_types(self):
+        return [MmaFiles.INDEX_METADATA, MmaFiles.INDEX_ADVISOR_REPORT]
+
+    def process_mma_obj(self, file_type, mma_obj):
+        if file_type == MmaFiles.INDEX_METADATA:
+            self.parse_index_metadata(mma_obj)
+        elif file_type == MmaFiles.INDEX_ADVISOR_REPORT:
+            self.parse_index_advisor_report(mma_obj)
+
+    def write_info_and_advice(self):
         Datasets.write_aggregated_index_info_file(self.aggregated_index_info)
         Datasets.write_aggregated_index_advice_file(self.aggregated_index_advice)
         Datasets.write_aggregated_index_advice_unique_file(self.index_issue_counter.get_data())
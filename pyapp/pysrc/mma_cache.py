@@ -0,0 +1,78 @@
+import hashlib
+import json
+import sqlite3
+
+# Instances of this class are a persistent cache of parsed MMA output json
+# files, stored in a SQLite database.  Each cached entry is keyed by the
+# filename, and is valid only while the file mtime and size are unchanged,
+# so that re-aggregating the MMA output directory only parses new or
+# modified files.
+#
+# The parsed data is stored as JSON text with its sha256 hash; an entry
+# whose text doesn't match its hash is treated as a miss.  Stores are
+# committed every COMMIT_INTERVAL entries so that an interrupted run
+# retains most of its work.
+#
+# Chris Joakim, Microsoft, 2023
+
+class MmaRecordCache(object):
+
+    COMMIT_INTERVAL = 100
+
+    def __init__(self, db_filename):
+        self.db_filename = db_filename
+        self.hits = 0
+        self.misses = 0
+        self.uncommitted = 0
+        self.conn = sqlite3.connect(db_filename)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS mma_json_records ('
+            'file_name TEXT PRIMARY KEY, file_mtime REAL, file_size INTEGER, data_hash TEXT, data TEXT)')
+
+    @classmethod
+    def content_hash(cls, data_json):
+        return hashlib.sha256(data_json.encode('utf-8')).hexdigest()
+
+    def lookup(self, file_name, file_mtime, file_size):
+        # return the cached parsed data for the file, or None if absent, stale, or corrupt
+        row = self.conn.execute(
+            'SELECT file_mtime, file_size, data_hash, data FROM mma_json_records WHERE file_name = ?',
+            (file_name,)).fetchone()
+        if row is not None:
+            if row[0] == file_mtime and row[1] == file_size:
+                if row[2] == self.content_hash(row[3]):
+                    self.hits = self.hits + 1
+                    return json.loads(row[3])
+        self.misses = self.misses + 1
+        return None
+
+    def store(self, file_name, file_mtime, file_size, data):
+        data_json = json.dumps(data)
+        self.conn.execute(
+            'INSERT OR REPLACE INTO mma_json_records '
+            '(file_name, file_mtime, file_size, data_hash, data) VALUES (?, ?, ?, ?, ?)',
+            (file_name, file_mtime, file_size, self.content_hash(data_json), data_json))
+        self.uncommitted = self.uncommitted + 1
+        if self.uncommitted >= self.COMMIT_INTERVAL:
+            self.commit()
+
+    def prune(self, current_file_names):
+        # delete the entries for files which are no longer in the MMA output directory
+        current = set(current_file_names)
+        stale = list()
+        for row in self.conn.execute('SELECT file_name FROM mma_json_records'):
+            if row[0] not in current:
+                stale.append((row[0],))
+        self.conn.executemany('DELETE FROM mma_json_records WHERE file_name = ?', stale)
+        return len(stale)
+
+    def count(self):
+        return self.conn.execute('SELECT count(*) FROM mma_json_records').fetchone()[0]
+
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
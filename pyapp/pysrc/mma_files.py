@@ -8,6 +8,15 @@ from pysrc.fs import FS
 
 class MmaFiles(object):
 
+    # the file types of the MMA output files, as determined by method classify()
+    ALL_FILES                 = '*'
+    COLLECTION_METADATA       = 'collection_metadata'
+    SHARD_KEYS                = 'shard_keys'
+    SHARD_KEY_ADVISOR_REPORT  = 'shard_key_advisor_report'
+    INDEX_METADATA            = 'index_metadata'
+    INDEX_ADVISOR_REPORT      = 'index_advisor_report'
+    OTHER                     = 'other'
+
     def __init__(self, parent_dir):
         self.dir = parent_dir
         self.expected = dict()
@@ -55,3 +64,24 @@ class MmaFiles(object):
             if value == False:
                 return False
         return True
+
+    @classmethod
+    def classify(cls, filename):
+        # Return the file type of the given MMA output filename, so that the
+        # filename pattern matching is done once per file.
+        fn = filename.strip()
+        if fn.endswith('.json') == False:
+            return cls.OTHER
+        if 'Collector' in fn:
+            if 'collection_metadata' in fn:
+                return cls.COLLECTION_METADATA
+        if 'AppData' in fn:  # AppData matches all MMA output files
+            if fn.endswith('shard_keys.json'):
+                return cls.SHARD_KEYS
+            if fn.endswith('shard_key_advisor_report.json'):
+                return cls.SHARD_KEY_ADVISOR_REPORT
+            if 'index_metadata' in fn:
+                return cls.INDEX_METADATA
+            if fn.endswith('index_advisor_report.json'):
+                return cls.INDEX_ADVISOR_REPORT
+        return cls.OTHER
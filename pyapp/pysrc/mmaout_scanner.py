@@ -0,0 +1,111 @@
+import mmap
+import os
+
+from pysrc.fs import FS
+
+# Instances of this class scan the current/mmaout directory, which contains
+# the <cluster>-<idx>-mma.txt outputs of the MMA execution scripts and the
+# <cluster>-pymongo.txt outputs of pymongo_connect and probe_clusters.
+# The filenames are indexed by cluster name once, and each MMA output is
+# searched with mmap, from the end of the file, for its assessment status.
+#
+# Chris Joakim, Microsoft, 2023
+
+class MmaoutScanner(object):
+
+    MMA_SUFFIX = '-mma.txt'
+    PYMONGO_SUFFIX = '-pymongo.txt'
+
+    # the MMA outputs may be redirected by PowerShell as utf-8 or utf-16le
+    SUCCEEDED_PATTERNS = ['Assessment Succeeded'.encode('utf-8'), 'Assessment Succeeded'.encode('utf-16le')]
+    FAILED_PATTERNS = ['Assessment Failed'.encode('utf-8'), 'Assessment Failed'.encode('utf-16le')]
+
+    def __init__(self, directory='current/mmaout'):
+        self.directory = directory
+        self.mma_files = dict()      # key is cluster name, value is filename
+        self.pymongo_files = dict()  # key is cluster name, value is filename
+        self.unindexed = list()      # filenames which don't follow the naming conventions
+        self.build_index()
+
+    def build_index(self):
+        mtimes = dict()
+        for file_obj in FS.walk(self.directory):
+            base = file_obj['base']
+            filename = '{}/{}'.format(self.directory, base)
+            if base.endswith(self.MMA_SUFFIX):
+                # <cluster>-<idx>-mma.txt
+                name = base[:-len(self.MMA_SUFFIX)]
+                tokens = name.rsplit('-', 1)
+                if len(tokens) == 2 and tokens[1].isdigit():
+                    name = tokens[0]
+                mtimes[filename] = os.path.getmtime(file_obj['full'])
+                self.add_file(self.mma_files, name, filename, mtimes)
+            elif base.endswith(self.PYMONGO_SUFFIX):
+                name = base[:-len(self.PYMONGO_SUFFIX)]
+                mtimes[filename] = os.path.getmtime(file_obj['full'])
+                self.add_file(self.pymongo_files, name, filename, mtimes)
+            else:
+                self.unindexed.append(filename)
+
+    def add_file(self, files_dict, cluster_name, filename, mtimes):
+        # retain the most recently modified file for a cluster, such as after a rerun
+        current = files_dict.get(cluster_name)
+        if current == None or mtimes[filename] > mtimes[current]:
+            files_dict[cluster_name] = filename
+
+    def mma_file(self, cluster_name):
+        if cluster_name in self.mma_files.keys():
+            return self.mma_files[cluster_name]
+        return self.find_unindexed_file(cluster_name, 'mma.txt')
+
+    def pymongo_file(self, cluster_name):
+        if cluster_name in self.pymongo_files.keys():
+            return self.pymongo_files[cluster_name]
+        return self.find_unindexed_file(cluster_name, 'pymongo.txt')
+
+    def find_unindexed_file(self, cluster_name, suffix):
+        for filename in self.unindexed:
+            if cluster_name in filename:
+                if suffix in filename:
+                    return filename
+        return None
+
+    def scan(self, cluster_name):
+        # return the structured result record for the given cluster
+        record = dict()
+        record['mma_present'] = self.mma_file(cluster_name)
+        record['mma_successful'] = 'unknown'
+        record['pymongo_present'] = self.pymongo_file(cluster_name)
+        record['pymongo_databases'] = None
+        record['pymongo_collections'] = None
+        if record['pymongo_present'] != None:
+            database_count, collection_count = self.pymongo_counts(record['pymongo_present'])
+            record['pymongo_databases'] = database_count
+            record['pymongo_collections'] = collection_count
+        if record['mma_present'] != None:
+            record['mma_successful'] = self.assessment_status(record['mma_present'])
+        return record
+
+    def pymongo_counts(self, pymongo_file):
+        database_count, collection_count = 0, 0
+        with open(pymongo_file, 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if 'database:' in line:
+                    database_count = database_count + 1
+                if 'collection:' in line:
+                    collection_count = collection_count + 1
+        return database_count, collection_count
+
+    def assessment_status(self, mma_file):
+        # the last 'Assessment Succeeded' or 'Assessment Failed' in the file determines the status
+        if os.path.getsize(mma_file) == 0:
+            return 'unknown'
+        with open(mma_file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                succeeded = max([mm.rfind(p) for p in self.SUCCEEDED_PATTERNS])
+                failed = max([mm.rfind(p) for p in self.FAILED_PATTERNS])
+        if succeeded < 0 and failed < 0:
+            return 'unknown'
+        if succeeded > failed:
+            return 'true'
+        return 'false'
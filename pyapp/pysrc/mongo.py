@@ -1,16 +1,88 @@
+import atexit
 import certifi
 import json
+import os
 import sys
+import threading
 import traceback
 
 from pymongo import MongoClient
 from bson.objectid import ObjectId
 
+from pysrc.env import Env
+
 # This class is used to access a MongoDB database, including the CosmosDB Mongo API.
 # Chris Joakim, Microsoft, 2023
 #
 # Importing:
-# from pysrc.mongo import Mongo, MongoDBInstance, MongoDBDatabase, MongoDBCollection
+# from pysrc.mongo import Mongo, MongoClients, MongoDBInstance, MongoDBDatabase, MongoDBCollection
+
+class MongoClients(object):
+
+    # A process-wide registry of MongoClient objects, keyed by connection string,
+    # so that repeated operations against the same cluster reuse the pooled
+    # connections and monitoring threads.  The pool sizes can be tuned with the
+    # AZURE_MONGO_UTILS_MAX_POOL_SIZE and AZURE_MONGO_UTILS_MIN_POOL_SIZE
+    # environment variables.  All clients are closed at process exit.
+
+    clients = dict()
+    lock = threading.Lock()
+    pid = None
+
+    @classmethod
+    def get(cls, conn_str, port=None):
+        key = conn_str
+        if port != None:
+            key = '{}:{}'.format(conn_str, port)
+        with cls.lock:
+            if cls.pid != os.getpid():
+                # MongoClient isn't fork-safe; never share clients with a parent process
+                if cls.pid == None:
+                    atexit.register(cls.close_all)
+                cls.clients = dict()
+                cls.pid = os.getpid()
+            if key not in cls.clients.keys():
+                if port != None:
+                    cls.clients[key] = MongoClient(conn_str, port, **cls.client_kwargs())
+                else:
+                    cls.clients[key] = MongoClient(conn_str, **cls.client_kwargs())
+            return cls.clients[key]
+
+    @classmethod
+    def client_kwargs(cls):
+        kwargs = dict()
+        kwargs['tlsCAFile'] = certifi.where()
+        max_pool_size = Env.var('AZURE_MONGO_UTILS_MAX_POOL_SIZE')
+        if max_pool_size != None:
+            kwargs['maxPoolSize'] = int(max_pool_size)
+        min_pool_size = Env.var('AZURE_MONGO_UTILS_MIN_POOL_SIZE')
+        if min_pool_size != None:
+            kwargs['minPoolSize'] = int(min_pool_size)
+        return kwargs
+
+    @classmethod
+    def new_client(cls, conn_str, **kwargs):
+        # an unregistered client, for one-shot use, with the given MongoClient option overrides;
+        # the caller is responsible for closing it
+        client_kwargs = cls.client_kwargs()
+        client_kwargs.update(kwargs)
+        return MongoClient(conn_str, **client_kwargs)
+
+    @classmethod
+    def count(cls):
+        return len(cls.clients)
+
+    @classmethod
+    def close_all(cls):
+        with cls.lock:
+            if cls.pid == os.getpid():
+                for client in cls.clients.values():
+                    try:
+                        client.close()
+                    except:
+                        pass
+            cls.clients = dict()
+
 
 class Mongo(object):
 
@@ -23,13 +95,13 @@ class Mongo(object):
                 self._env = 'cosmos'
             else:
                 self._env = 'mongo'
-            self._client = MongoClient(opts['conn_string'], tlsCAFile=certifi.where())
+            self._client = MongoClients.get(opts['conn_string'])
         else:
             if 'cosmos.azure.com' in opts['host']:
                 self._env = 'cosmos'
             else:
                 self._env = 'mongo'
-            self._client = MongoClient(opts['host'], opts['port'], tlsCAFile=certifi.where())
+            self._client = MongoClients.get(opts['host'], opts['port'])
 
         if self.is_verbose():
             print(json.dumps(self._opts, sort_keys=False, indent=2))
@@ -122,6 +194,18 @@ class Mongo(object):
             error_data['coll'] = collname
             error_data['msg'] = str(e)
 
+    def list_db_collections(self, dbname):
+        # thread-safe; doesn't change the current db of this object
+        return self._client[dbname].list_collection_names(filter={'type': 'collection'})
+
+    def get_db_coll_indexes(self, dbname, collname):
+        # thread-safe; doesn't change the current db and collection of this object
+        try:
+            return self._client[dbname][collname].index_information()
+        except Exception as e:
+            print(str(e))
+            print(traceback.format_exc())
+
     # crud below, meta above
 
     def insert_doc(self, doc):
@@ -172,25 +256,24 @@ class Mongo(object):
 
 class MongoDBInstance:
 
-    def __init__(self, uri: str):
+    # Databases and collections are discovered lazily, on first access, and
+    # memoized per database.  The optional database_names and collection_names
+    # lists are pushed down to the server as listDatabases/listCollections
+    # filters, so a tool which needs only one collection doesn't have to
+    # enumerate the whole cluster.
+
+    def __init__(self, uri: str, database_names=None, collection_names=None):
         self.uri = uri
         if 'cosmos.azure.com' in self.uri:
             self._env = 'cosmos'
         else:
             self._env = 'mongo'
-        
-        self.client = MongoClient(uri, tlsCAFile=certifi.where())
-
-        self.databases = self.client.list_database_names()
-        if "admin" in self.databases:
-            self.databases.remove("admin")
-        if "local" in self.databases:
-            self.databases.remove("local")
-        if "config" in self.databases:
-            self.databases.remove("config")
-        self.collections = {}
-        for database in self.databases:
-            self.collections[database] = self.client[database].list_collection_names(filter={'type': 'collection'})
+
+        self.client = MongoClients.get(uri)
+        self._database_names_filter = database_names
+        self._collection_names_filter = collection_names
+        self._databases = None
+        self._database_objects = dict()
 
         # optionally display and capture the list of databases and their collections
         # if the --list-dbs-and-colls command-line arg is provided
@@ -203,21 +286,56 @@ class MongoDBInstance:
                         print('env: {} db: {} coll: {}'.format(self._env, db_name, cname))
                         key = '{}|{}|{}'.format(self._env, db_name, cname)
 
+    @property
+    def databases(self):
+        if self._databases == None:
+            if self._database_names_filter:
+                filter = {'name': {'$in': list(self._database_names_filter)}}
+                names = [db['name'] for db in self.client.list_databases(filter=filter)]
+            else:
+                names = self.client.list_database_names()
+            for system_db in ['admin', 'local', 'config']:
+                if system_db in names:
+                    names.remove(system_db)
+            self._databases = names
+        return self._databases
+
+    @property
+    def collections(self):
+        # a dict of database name to collection names, for all of the databases
+        collections = dict()
+        for database_name in self.databases:
+            collections[database_name] = self.get_database(database_name).collections
+        return collections
+
     def list_databases_and_collections(self):
         for arg in sys.argv:
             if arg == '--list-dbs-and-colls':
                 return True
         return False
-        
+
     def get_database(self, database_name: str):
-        return MongoDBDatabase(self.client[database_name])
+        if database_name not in self._database_objects.keys():
+            self._database_objects[database_name] = MongoDBDatabase(
+                self.client[database_name], self._collection_names_filter)
+        return self._database_objects[database_name]
 
 
 class MongoDBDatabase:
 
-    def __init__(self, database):
+    def __init__(self, database, collection_names=None):
         self.database = database
-        self.collections = self.database.list_collection_names(filter={'type': 'collection'})
+        self._collection_names_filter = collection_names
+        self._collections = None
+
+    @property
+    def collections(self):
+        if self._collections == None:
+            filter = {'type': 'collection'}
+            if self._collection_names_filter:
+                filter['name'] = {'$in': list(self._collection_names_filter)}
+            self._collections = self.database.list_collection_names(filter=filter)
+        return self._collections
 
     def get_collection(self, collection_name: str):
         return MongoDBCollection(self.database, collection_name)
@@ -0,0 +1,243 @@
+from pysrc.env import Env
+
+# Instances of this class bulk-load the migration wave report into typed
+# PostgreSQL tables, as the report lines are generated by the Reporter.  The
+# lines are streamed with COPY FROM STDIN into a temporary staging table, then
+# upserted into the target tables by their keys, and the rows no longer in the
+# report are deleted, in one transaction, so the report can be reloaded repeatedly.
+#
+# The psycopg (version 3) or psycopg2 library is required for this class,
+# but is not otherwise a dependency of this project.  The connection string
+# is read from environment variable AZURE_MONGO_UTILS_PG_CONN, for example:
+# "host=localhost port=5432 dbname=dev user=<user> password=<pass>"
+#
+# Chris Joakim, Microsoft, 2023
+
+class PgLoader(object):
+
+    CONN_ENV_VAR = 'AZURE_MONGO_UTILS_PG_CONN'
+
+    # (csv column name, PostgreSQL column name, type) in the csv column order
+    REPORT_COLUMNS = [
+        ('cluster', 'cluster', 'TEXT'),
+        ('mma_sibling_cluster', 'mma_sibling_cluster', 'TEXT'),
+        ('database', 'database', 'TEXT'),
+        ('container', 'container', 'TEXT'),
+        ('container_count', 'container_count', 'INTEGER'),
+        ('sharded', 'sharded', 'TEXT'),
+        ('shard_key', 'shard_key', 'TEXT'),
+        ('size_in_bytes', 'size_in_bytes', 'BIGINT'),
+        ('doc_count', 'doc_count', 'BIGINT'),
+        ('avg_doc_size', 'avg_doc_size', 'NUMERIC'),
+        ('largest', 'largest', 'BIGINT'),
+        ('size_in_gb', 'size_in_gb', 'NUMERIC'),
+        ('pp_equiv', 'pp_equiv', 'INTEGER'),
+        ('mpp', 'mpp', 'TEXT'),
+        ('est_migration_ru', 'est_migration_ru', 'INTEGER'),
+        ('est_post_migration_ru', 'est_post_migration_ru', 'INTEGER'),
+        ('.', 'spacer', 'TEXT'),
+        ('notes', 'notes', 'TEXT'),
+        ('features', 'features', 'TEXT'),
+        ('index_advice', 'index_advice', 'TEXT'),
+        ('idx_warning', 'idx_warning', 'TEXT'),
+        ('idx_critical', 'idx_critical', 'TEXT'),
+        ('idx_score', 'idx_score', 'TEXT'),
+        ('source_host', 'source_host', 'TEXT'),
+        ('cosmos_acct', 'cosmos_acct', 'TEXT')]
+
+    RU_COLUMNS = [
+        ('cluster', 'cluster', 'TEXT'),
+        ('mma_sibling_cluster', 'mma_sibling_cluster', 'TEXT'),
+        ('database', 'database', 'TEXT'),
+        ('container', 'container', 'TEXT'),
+        ('est_migration_ru', 'est_migration_ru', 'INTEGER'),
+        ('est_post_migration_ru', 'est_post_migration_ru', 'INTEGER'),
+        ('source_host', 'source_host', 'TEXT'),
+        ('cosmos_acct', 'cosmos_acct', 'TEXT')]
+
+    UUID_COLUMNS = [
+        ('uuid', 'uuid', 'TEXT'),
+        ('cname', 'cname', 'TEXT'),
+        ('tname', 'tname', 'TEXT')]
+
+    # COPY reads the empty csv values as NULL
+    CONTAINER_KEY = "COALESCE(cluster, '') || '|' || COALESCE(database, '') || '|' || COALESCE(container, '')"
+
+    # (table name, columns, key expression, lookup indexes, staging row filter)
+    REPORT_TABLE = ('mma_report', REPORT_COLUMNS, CONTAINER_KEY,
+        [['cluster'], ['cluster', 'database'], ['database', 'container']], "is_pg = 't'")
+    RU_TABLE = ('mma_collection_ru', RU_COLUMNS, CONTAINER_KEY,
+        [['cluster'], ['cluster', 'database'], ['database', 'container']], "is_ru = 't'")
+    UUID_TABLE = ('mma_uuid_to_cluster', UUID_COLUMNS, 'uuid', [['cname']], None)
+
+    # the report lines are staged once, with a flag per target table
+    REPORT_FLAG_COLUMNS = [('is_pg', 'is_pg', 'TEXT'), ('is_ru', 'is_ru', 'TEXT')]
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    @classmethod
+    def connect(cls, conn_str=None):
+        if conn_str == None:
+            conn_str = Env.var(cls.CONN_ENV_VAR)
+        if conn_str == None:
+            raise ValueError('environment variable {} is not set'.format(cls.CONN_ENV_VAR))
+        try:
+            import psycopg
+            return PgLoader(psycopg.connect(conn_str))
+        except ImportError:
+            pass
+        try:
+            import psycopg2
+            return PgLoader(psycopg2.connect(conn_str))
+        except ImportError:
+            raise ValueError('the psycopg or psycopg2 library is required; pip install "psycopg[binary]"')
+
+    @classmethod
+    def create_table_sql(cls, table, columns, indexes):
+        statements = list()
+        col_defs = ['    row_key TEXT PRIMARY KEY']
+        for csv_name, pg_name, pg_type in columns:
+            col_defs.append('    {} {}'.format(pg_name, pg_type))
+        statements.append('CREATE TABLE IF NOT EXISTS {} (\n{}\n)'.format(table, ',\n'.join(col_defs)))
+        for index_cols in indexes:
+            statements.append('CREATE INDEX IF NOT EXISTS {}_{}_idx ON {} ({})'.format(
+                table, '_'.join(index_cols), table, ', '.join(index_cols)))
+        return statements
+
+    @classmethod
+    def staging_table_sql(cls, staging_table, columns):
+        # all staging columns are text; the values are converted in the upsert
+        col_defs = ['{} TEXT'.format(pg_name) for csv_name, pg_name, pg_type in columns]
+        return 'CREATE TEMP TABLE {} ({}) ON COMMIT DROP'.format(staging_table, ', '.join(col_defs))
+
+    @classmethod
+    def copy_sql(cls, staging_table, columns):
+        pg_names = ', '.join([pg_name for csv_name, pg_name, pg_type in columns])
+        return 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(staging_table, pg_names)
+
+    @classmethod
+    def upsert_sql(cls, table, columns, key_expr, staging_table, where=None):
+        pg_names = [pg_name for csv_name, pg_name, pg_type in columns]
+        select_exprs = list()
+        for csv_name, pg_name, pg_type in columns:
+            if pg_type == 'TEXT':
+                select_exprs.append(pg_name)
+            elif pg_type == 'NUMERIC':
+                select_exprs.append("NULLIF({}, '')::NUMERIC".format(pg_name))
+            else:
+                # tolerate values such as '12.0' in the integer columns
+                select_exprs.append("ROUND(NULLIF({}, '')::NUMERIC)::{}".format(pg_name, pg_type))
+        updates = ['{} = EXCLUDED.{}'.format(name, name) for name in pg_names]
+        return (
+            'INSERT INTO {} (row_key, {}) '
+            'SELECT DISTINCT ON (row_key) * FROM (SELECT {} AS row_key, {} FROM {}{}) s ORDER BY row_key '
+            'ON CONFLICT (row_key) DO UPDATE SET {}').format(
+                table, ', '.join(pg_names),
+                key_expr, ', '.join(select_exprs), staging_table, cls.where_clause(where),
+                ', '.join(updates))
+
+    @classmethod
+    def delete_stale_sql(cls, table, key_expr, staging_table, where=None):
+        # delete the rows, such as dropped containers, which are not in the reloaded data
+        return (
+            'DELETE FROM {} t WHERE NOT EXISTS '
+            '(SELECT 1 FROM {}{} AND {} = t.row_key)').format(
+                table, staging_table, cls.where_clause(where, 'TRUE'), key_expr)
+
+    @classmethod
+    def where_clause(cls, where, default=None):
+        if where == None:
+            where = default
+        if where == None:
+            return ''
+        return ' WHERE {}'.format(where)
+
+    def load_report(self, header_line, classified_lines):
+        # Load the mma_report and mma_collection_ru tables, in one transaction,
+        # from the given header line and generator of (line, is_pg, is_ru) tuples,
+        # such as ReportWriter#classified_lines.  The lines are streamed with COPY
+        # into one staging table.  Returns a dict of table name to upserted row count.
+        header = header_line.split(',')
+        expected = [csv_name for csv_name, pg_name, pg_type in self.REPORT_COLUMNS]
+        if header != expected:
+            raise ValueError('unexpected report csv header: {}'.format(header))
+        staging_columns = self.REPORT_FLAG_COLUMNS + self.REPORT_COLUMNS
+        copy_lines = self.flagged_lines(classified_lines)
+        return self.load_tables(
+            'mma_report_staging', staging_columns, copy_lines, [self.REPORT_TABLE, self.RU_TABLE])
+
+    def load_uuid_to_cluster(self, lines):
+        # lines is an iterable of the uuid,cname,tname csv lines, without a header
+        return self.load_tables('mma_uuid_to_cluster_staging', self.UUID_COLUMNS, lines, [self.UUID_TABLE])
+
+    def flagged_lines(self, classified_lines):
+        for line, is_pg, is_ru in classified_lines:
+            if is_pg or is_ru:
+                yield '{},{},{}'.format('t' if is_pg else 'f', 't' if is_ru else 'f', line)
+
+    def load_tables(self, staging_table, staging_columns, lines, tables):
+        counts = dict()
+        with self.conn.cursor() as cur:
+            for table, columns, key_expr, indexes, where in tables:
+                for sql in self.create_table_sql(table, columns, indexes):
+                    cur.execute(sql)
+            cur.execute(self.staging_table_sql(staging_table, staging_columns))
+            self.copy_lines(cur, self.copy_sql(staging_table, staging_columns), lines)
+            for table, columns, key_expr, indexes, where in tables:
+                cur.execute(self.delete_stale_sql(table, key_expr, staging_table, where))
+                deleted = cur.rowcount
+                cur.execute(self.upsert_sql(table, columns, key_expr, staging_table, where))
+                counts[table] = cur.rowcount
+                print('table {} loaded, rows upserted: {}, stale rows deleted: {}'.format(
+                    table, counts[table], deleted))
+        self.conn.commit()
+        return counts
+
+    def copy_lines(self, cur, sql, lines):
+        # stream the lines to COPY FROM STDIN in chunks of about one megabyte
+        chunks = self.chunked(lines)
+        if hasattr(cur, 'copy'):
+            # psycopg 3
+            with cur.copy(sql) as copy:
+                for chunk in chunks:
+                    copy.write(chunk)
+        else:
+            # psycopg2
+            cur.copy_expert(sql, ChunkReader(chunks))
+
+    def chunked(self, lines, chunk_size=1024 * 1024):
+        buffer, size = list(), 0
+        for line in lines:
+            buffer.append(line + '\n')
+            size = size + len(line) + 1
+            if size >= chunk_size:
+                yield ''.join(buffer)
+                buffer, size = list(), 0
+        if len(buffer) > 0:
+            yield ''.join(buffer)
+
+    def close(self):
+        self.conn.close()
+
+
+class ChunkReader(object):
+    # a minimal file-like object over a generator of text chunks, for psycopg2 copy_expert
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            chunk = next(self.chunks, None)
+            if chunk == None:
+                break
+            self.pending = self.pending + chunk
+        if size < 0:
+            size = len(self.pending)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
@@ -0,0 +1,119 @@
+import math
+import re
+
+# Instances of this class write the lines of the migration wave report as
+# they are produced, in one pass, to the main report CSV file, the two
+# PostgreSQL load CSV files, and optionally an Excel xlsx file.  No list of
+# report lines is held in memory.
+#
+# The caller should call close(completed) in a finally block; the xlsx file
+# is saved only when the report completed.
+#
+# Chris Joakim, Microsoft, 2023
+
+class ReportWriter(object):
+
+    # the columns of the mma_collection_ru.csv PostgreSQL file
+    RU_FIELDS = [
+        'cluster', 'mma_sibling_cluster', 'database', 'container',
+        'est_migration_ru', 'est_post_migration_ru', 'source_host', 'cosmos_acct']
+
+    # finite decimal literals only; not 'nan', 'inf', '1_000', etc.
+    INT_PATTERN = re.compile(r'[+-]?\d+', re.ASCII)
+    FLOAT_PATTERN = re.compile(r'[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?', re.ASCII)
+
+    def __init__(self, header_line, report_outfile, pg_outfile, ru_outfile, xlsx_outfile=None):
+        self.fields = header_line.split(',')
+        self.report_outfile = report_outfile
+        self.pg_outfile = pg_outfile
+        self.ru_outfile = ru_outfile
+        self.xlsx_outfile = xlsx_outfile
+        self.line_count = 0
+
+        # dynamically determine the field indices based on the current csv header
+        self.ru_indices = [self.fields.index(name) if name in self.fields else 0 for name in self.RU_FIELDS]
+        self.container_idx = self.fields.index('container')
+
+        self.report_file, self.pg_file, self.ru_file = None, None, None
+        self.workbook, self.worksheet = None, None
+        try:
+            self.report_file = open(report_outfile, 'w', encoding='utf-8')
+            self.pg_file = open(pg_outfile, 'w', encoding='utf-8')
+            self.ru_file = open(ru_outfile, 'w', encoding='utf-8')
+            if xlsx_outfile != None:
+                from openpyxl import Workbook
+                self.workbook = Workbook(write_only=True)
+                self.worksheet = self.workbook.create_sheet('migration_wave_report')
+            self.write_line(header_line)
+        except:
+            self.close(completed=False)
+            raise
+
+    def write_lines(self, lines):
+        for line in lines:
+            self.write_line(line)
+
+    def classified_lines(self, lines):
+        # a generator which writes each line, then yields it with its is_pg and
+        # is_ru flags, so that the lines may also be streamed to PostgreSQL
+        for line in lines:
+            is_pg, is_ru = self.write_line(line)
+            yield line, is_pg, is_ru
+
+    def write_line(self, line):
+        # returns the flags for the PostgreSQL report and RU files
+        self.line_count = self.line_count + 1
+        self.report_file.write(line + '\n')
+        is_pg, is_ru = self.is_pg_line(line), False
+        if is_pg:
+            self.pg_file.write(line + '\n')
+        tokens = line.split(',')
+        if len(tokens) == len(self.fields):
+            if 'Database Total' not in tokens[self.container_idx]:
+                self.ru_file.write(','.join([tokens[idx] for idx in self.ru_indices]) + '\n')
+                is_ru = True
+        if self.worksheet != None:
+            if line == '':
+                self.worksheet.append([])
+            else:
+                self.worksheet.append([self.cell_value(token) for token in tokens])
+        return is_pg, is_ru
+
+    def is_pg_line(self, line):
+        # exclude the blank separator lines and the clusters with no MMA output
+        if len(line) < 20:
+            return False
+        if ' Excel ' in line:
+            return False
+        return True
+
+    def cell_value(self, token):
+        if self.INT_PATTERN.fullmatch(token):
+            return int(token)
+        if self.FLOAT_PATTERN.fullmatch(token):
+            value = float(token)
+            if math.isfinite(value):
+                return value
+        return token
+
+    def close(self, completed=True):
+        # close the open csv files; the xlsx file is saved only for a completed report
+        try:
+            for outfile, f in [(self.report_outfile, self.report_file),
+                               (self.pg_outfile, self.pg_file),
+                               (self.ru_outfile, self.ru_file)]:
+                if f != None and not f.closed:
+                    f.close()
+                    if completed:
+                        print('file written: {}'.format(outfile))
+                    else:
+                        print('file incomplete: {}'.format(outfile))
+        finally:
+            if self.workbook != None:
+                if completed:
+                    self.workbook.save(self.xlsx_outfile)
+                    print('file written: {}'.format(self.xlsx_outfile))
+                else:
+                    self.worksheet.close()  # close the worksheet's temporary file
+                    print('file not written, the report is incomplete: {}'.format(self.xlsx_outfile))
+                self.workbook, self.worksheet = None, None
@@ -1,9 +1,13 @@
 import math
 
 from pysrc.aggregators import ContainersAggregator
+from pysrc.cluster_aliases import ClusterAliases
 from pysrc.datasets import Datasets
+from pysrc.dispatcher import MmaDispatcher
 from pysrc.env import Env
 from pysrc.fs import FS
+from pysrc.mma_files import MmaFiles
+from pysrc.report_writer import ReportWriter
 
 # This class is used to produce CSV/Excel reports based on the MMA data
 # and other data.  For example, the "wave" and "all clusters" report.
@@ -14,55 +18,95 @@ class Reporter(object):
 
     def __init__(self):
         self.cluster_uuid_mappings = Datasets.read_cluster_uuid_mappings_file()
-        self.aggregated_mma_outputs = Datasets.read_aggregated_mma_output_file()
-        self.agg = ContainersAggregator(self.aggregated_mma_outputs)
+
+        # one pass over the aggregated MMA outputs populates both the containers
+        # aggregator and the MMA cluster keys used in merge_clusters_status
+        self.agg = ContainersAggregator()
+        self.mma_clusters = dict()
+        dispatcher = MmaDispatcher()
+        dispatcher.register(self.agg)
+        dispatcher.register(self)
+        dispatcher.dispatch(Datasets.iterate_aggregated_mma_outputs())
+
         self.agg_index_advice = Datasets.read_aggregated_index_advice_file()
         self.agg_shard_keys   = Datasets.read_aggregated_shard_keys_file()
         self.agg_shard_advice = Datasets.read_aggregated_shard_advice_file()
 
         self.excel_clusters = FS.read_json('current/excel_clusters.json')
-        self.unique_cluster_urls = FS.read_json('current/excel_unique_cluster_urls.json')
         self.docscan_collections = FS.read_json('current/docscan_merged_collections_dict.json')
 
+        # lookup indexes, built once, to avoid linear scans of the above dicts
+        self.uuid_by_cluster = self.index_uuid_by_cluster()
+        self.cluster_aliases = ClusterAliases.load()
+        self.cluster_db_keys_by_cluster = dict()  # populated in migration_wave_report
+        self.db_totals_by_cluster_db = dict()    # populated in migration_wave_report
+        self._csv_line_template = None
+
         self.clusters_status = self.merge_clusters_status()
 
+    def mma_file_types(self):
+        return [MmaFiles.ALL_FILES]
+
+    def process_mma_obj(self, file_type, mma_obj):
+        # Collect the MMA cluster keys in the sequence of their last occurrence
+        # in the MMA outputs; processing each cluster once in this sequence gives
+        # the same result as processing every MMA file object.
+        try:
+            mma_cluster_key = mma_obj['_cluster']
+            if mma_cluster_key in self.mma_clusters.keys():
+                del self.mma_clusters[mma_cluster_key]
+            self.mma_clusters[mma_cluster_key] = ''
+        except:
+            pass
+
+    def index_uuid_by_cluster(self):
+        # the reverse of cluster_uuid_mappings; the first uuid for a cluster is retained
+        uuid_by_cluster = dict()
+        for uuid_key, cluster_key in self.cluster_uuid_mappings.items():
+            if cluster_key not in uuid_by_cluster.keys():
+                uuid_by_cluster[cluster_key] = uuid_key
+        return uuid_by_cluster
+
+    def index_cluster_db_keys(self, grouped_by_cluster_db_dict):
+        # key is a cluster key, value is the sorted list of its 'cluster|db' keys
+        cluster_db_keys_by_cluster = dict()
+        for cluster_db_key in grouped_by_cluster_db_dict.keys():
+            cluster_key = cluster_db_key.split('|')[0]
+            if cluster_key not in cluster_db_keys_by_cluster.keys():
+                cluster_db_keys_by_cluster[cluster_key] = list()
+            cluster_db_keys_by_cluster[cluster_key].append(cluster_db_key)
+        for cluster_key in cluster_db_keys_by_cluster.keys():
+            cluster_db_keys_by_cluster[cluster_key].sort()
+        return cluster_db_keys_by_cluster
+
     def merge_clusters_status(self):
         # Merge the cluster definition names in the Customer Master Excel file
         # with the actual set of cluster names from actual MMA outputs.
-        merged_clusters, mma_clusters = dict(), dict()
+        merged_clusters = dict()
 
         for cluster_key in self.excel_clusters.keys():
             merged_clusters[cluster_key] = 'defined_in_excel'
 
-        for file_obj in self.aggregated_mma_outputs:
-            try:
-                mma_cluster_key = file_obj['_cluster']
-                mma_clusters[mma_cluster_key] = ''
-                merged_clusters[mma_cluster_key] = 'has_explicit_mma_output'
-
-                for conn_str in self.unique_cluster_urls.keys():
-                    associated_clusters_list = self.unique_cluster_urls[conn_str]
-                    if mma_cluster_key in associated_clusters_list:
-                        for assoc_cluster_key in associated_clusters_list:
-                            if assoc_cluster_key != mma_cluster_key:
-                                assoc_value = merged_clusters[assoc_cluster_key]
-                                if assoc_value != 'has_explicit_mma_output':
-                                    new_value = 'has_associated_mma_output_from|{}'.format(mma_cluster_key)
-                                    merged_clusters[assoc_cluster_key] = new_value
-            except:
-                pass
+        for mma_cluster_key in self.mma_clusters.keys():
+            merged_clusters[mma_cluster_key] = 'has_explicit_mma_output'
+            for assoc_cluster_key in self.cluster_aliases.siblings(mma_cluster_key):
+                if assoc_cluster_key != mma_cluster_key:
+                    assoc_value = merged_clusters.get(assoc_cluster_key)
+                    if assoc_value != 'has_explicit_mma_output':
+                        new_value = 'has_associated_mma_output_from|{}'.format(mma_cluster_key)
+                        merged_clusters[assoc_cluster_key] = new_value
 
         FS.write_json(merged_clusters, 'current/merged_clusters_status.json')
         return merged_clusters
 
     def lookup_uuid_value(self, cluster_key):
-        for uuid_key, value in self.cluster_uuid_mappings.items():
-            if value == cluster_key:
-                return uuid_key
-        return 'none'
+        return self.uuid_by_cluster.get(cluster_key, 'none')
 
-    def migration_wave_report(self):
+    def migration_wave_report(self, loader=None):
+        # the optional loader is a PgLoader; the report lines are then also streamed
+        # to PostgreSQL as they are written.  returns the loaded table row counts.
         print('migration_wave_report')
+        counts = dict()
 
         # first, display the cluster_uuid_mappings and clusters_status
         for idx, key in enumerate(sorted(self.cluster_uuid_mappings.keys())):
@@ -75,9 +119,7 @@ class Reporter(object):
 
         report_outfile = 'current/migration_wave_report.csv'
 
-        # initialize the list of csv_lines, produce the CSV Header line, display columns
-        csv_lines = list()
-        csv_lines.append(self.csv_header_line())
+        # display the CSV Header line columns
         csv_cols = self.csv_header_line().split(',')
         print('csv_cols_count: {}'.format(len(csv_cols)))
         if Env.verbose():
@@ -98,11 +140,42 @@ class Reporter(object):
         print('containers_for_wave count: {}'.format(len(self.containers_for_wave)))
 
         self.grouped_by_cluster_db_dict = self.agg.group_by_cluster_db_keys(self.containers_for_wave)
+        self.cluster_db_keys_by_cluster = self.index_cluster_db_keys(self.grouped_by_cluster_db_dict)
+
+        # calculate the database totals for all of the wave containers in one pass
+        self.db_totals_by_cluster_db = self.calculate_db_totals(self.containers_for_wave)
         print('grouped_by_cluster_db_dict len: {}'.format(len(self.grouped_by_cluster_db_dict)))
         for key in self.grouped_by_cluster_db_dict.keys():
             print('grouped_by_cluster_db_dict key: {}'.format(key))
             # grouped_by_cluster_db_dict key: 9-DTC-PROD---VIENNA|Order
 
+        # stream the report lines, in one pass, to the report and PostgreSQL csv files
+        xlsx_outfile = None
+        if Env.boolean_arg('--xlsx'):
+            xlsx_outfile = 'current/migration_wave_report.xlsx'
+        writer = ReportWriter(
+            self.csv_header_line(),
+            report_outfile,
+            'current/psql/mma_report.csv',
+            'current/psql/mma_collection_ru.csv',
+            xlsx_outfile)
+        completed = False
+        try:
+            if loader == None:
+                writer.write_lines(self.migration_wave_report_lines())
+            else:
+                counts.update(loader.load_report(
+                    self.csv_header_line(), writer.classified_lines(self.migration_wave_report_lines())))
+            completed = True
+        finally:
+            writer.close(completed)
+        self.write_uuid_to_cluster_file()
+        if loader != None:
+            counts.update(loader.load_uuid_to_cluster(self.uuid_to_cluster_lines()))
+        return counts
+
+    def migration_wave_report_lines(self):
+        # a generator of the report csv lines, after the header line
         prev_cluster_db_key = ''
         for wave_cluster_idx, wave_cluster_key in enumerate(sorted(self.wave_clusters)):
             status = self.clusters_status[wave_cluster_key]
@@ -112,7 +185,7 @@ class Reporter(object):
                 pass
             elif status.startswith('has_associated_mma_output'):
                 assoc_cluster = status.split('|')[1]
-                csv_lines.append('')
+                yield ''
                 cluster = self.cluster_as_trello(wave_cluster_key)
                 notes   = 'see sibling cluster {}'.format(assoc_cluster)
                 source_host = self.lookup_source_host(wave_cluster_key)
@@ -143,10 +216,10 @@ class Reporter(object):
                     '.',
                     source_host,
                     cosmos_acct)
-                csv_lines.append(csv_line)
+                yield csv_line
                 continue
             elif status == 'defined_in_excel':
-                csv_lines.append('')
+                yield ''
                 cluster = self.cluster_as_trello(wave_cluster_key)
                 source_host = self.lookup_source_host(wave_cluster_key)
                 cosmos_acct = self.lookup_cosmos_acct(wave_cluster_key)
@@ -178,7 +251,7 @@ class Reporter(object):
                     '.',
                     source_host,
                     cosmos_acct)
-                csv_lines.append(csv_line)
+                yield csv_line
                 continue
 
             cluster_db_keys = self.collect_cluster_db_keys(wave_cluster_key)
@@ -186,13 +259,13 @@ class Reporter(object):
                 print('wave_cluster_key: {} cluster_db_key: {}'.format(wave_cluster_key, cluster_db_key))
                 if cluster_db_key != prev_cluster_db_key:
                     prev_cluster_db_key = cluster_db_key
-                    csv_lines.append('')
+                    yield ''
                 tokens  = cluster_db_key.split('|')
                 cluster = tokens[0]
                 dbname  = tokens[1]
                 print('cluster: {}  dbname: {}'.format(cluster, dbname))
                 cluster_db_containers = self.grouped_by_cluster_db_dict[cluster_db_key]
-                db_totals = self.calculate_db_totals(cluster_db_containers)
+                db_totals = self.db_totals_by_cluster_db[cluster_db_key]
                 bytes = db_totals['bytes']
                 gb = format(db_totals['gb'], ".6f")
                 pp = db_totals['pp']
@@ -235,12 +308,12 @@ class Reporter(object):
                     's',
                     source_host,
                     cosmos_acct)
-                csv_lines.append(csv_line)
+                yield csv_line
 
                 # Display the container level details next
                 for c in cluster_db_containers:
                     ckey = c.key()
-                    if key in self.docscan_collections.keys():
+                    if ckey in self.docscan_collections.keys():
                         print('container key is in docscan: {}'.format(ckey))
 
                     notes = ''
@@ -275,7 +348,7 @@ class Reporter(object):
                             '',
                             source_host,
                             cosmos_acct)
-                        csv_lines.append(csv_line)
+                        yield csv_line
                     else:
                         csv_line = self.csv_line_template().format(
                             self.cluster_as_trello(c.cluster()),
@@ -303,17 +376,11 @@ class Reporter(object):
                             '0',
                             source_host,
                             cosmos_acct)
-                        csv_lines.append(csv_line)
+                        yield csv_line
 
-        FS.write_lines(csv_lines, report_outfile)
-        self.write_postgresql_files(csv_lines)
 
     def collect_cluster_db_keys(self, wave_cluster_key):
-        cluster_db_keys = list()
-        for key in self.grouped_by_cluster_db_dict.keys():
-            if key.startswith(wave_cluster_key):
-                cluster_db_keys.append(key)
-        return sorted(cluster_db_keys)
+        return self.cluster_db_keys_by_cluster.get(wave_cluster_key, list())
 
     def lookup_cosmos_acct(self, cluster_key):
         acct = ''
@@ -333,80 +400,28 @@ class Reporter(object):
         return host
 
     def csv_line_template(self):
-        lines = list()
-        for field in self.csv_header_line().split(','):
-            lines.append('{}')
-        return ','.join(lines)
+        if self._csv_line_template == None:
+            lines = list()
+            for field in self.csv_header_line().split(','):
+                lines.append('{}')
+            self._csv_line_template = ','.join(lines)
+        return self._csv_line_template
 
     def csv_header_line(self):
         return 'cluster,mma_sibling_cluster,database,container,container_count,sharded,shard_key,size_in_bytes,doc_count,avg_doc_size,largest,size_in_gb,pp_equiv,mpp,est_migration_ru,est_post_migration_ru,.,notes,features,index_advice,idx_warning,idx_critical,idx_score,source_host,cosmos_acct'
 
-    def write_postgresql_files(self, csv_lines):
-        FS.write_lines(self.pg_lines(csv_lines), 'current/psql/mma_report.csv')
-        FS.write_lines(self.ru_lines(csv_lines), 'current/psql/mma_collection_ru.csv')
-
+    def write_uuid_to_cluster_file(self):
         lines = list()
         lines.append("uuid,cname,tname")
+        lines.extend(self.uuid_to_cluster_lines())
+        FS.write_lines(lines, 'current/psql/mma_uuid_to_cluster.csv')
+
+    def uuid_to_cluster_lines(self):
+        # a generator of the uuid_to_cluster csv lines, after the header line
         for idx, uuid_key in enumerate(sorted(self.cluster_uuid_mappings.keys())):
             cname = self.cluster_uuid_mappings[uuid_key]
             tname = self.cluster_as_trello(cname)
-            lines.append('{},{},{}'.format(uuid_key,cname,tname))
-        FS.write_lines(lines, 'current/psql/mma_uuid_to_cluster.csv')
-
-    def pg_lines(self, csv_lines):
-        lines = list()
-        for line in csv_lines:
-            include = True
-            if len(line) < 20:
-                include = False
-            if ' Excel ' in line:
-                include = False
-            # if ' sibling ' in line:
-            #     include = False
-            if include == True:
-                lines.append(line)
-        return lines
-
-    def ru_lines(self, csv_lines):
-        lines, fields = list(), self.csv_header_line().split(',')
-        # dynamically determine the field indices based on the current csv header
-        cluster_idx, mma_cluster_idx, db_idx, c_idx, ru1_idx, ru2_idx, source_idx, cosmos_idx = 0, 0, 0, 0, 0, 0, 0, 0
-        for field_idx, field_name in enumerate(fields):
-            if field_name == 'cluster':
-                cluster_idx = field_idx
-            if field_name == 'mma_sibling_cluster':
-                mma_cluster_idx = field_idx
-            if field_name == 'database':
-                db_idx = field_idx
-            if field_name == 'container':
-                c_idx = field_idx
-            if field_name == 'est_migration_ru':
-                ru1_idx = field_idx
-            if field_name == 'est_post_migration_ru':
-                ru2_idx = field_idx
-            if field_name == 'source_host':
-                source_idx = field_idx
-            if field_name == 'cosmos_acct':
-                cosmos_idx = field_idx
-
-        for line in csv_lines:
-            tokens = line.split(',')
-            if len(tokens) == len(fields):
-                cname = tokens[c_idx]
-                if 'Database Total' in cname:
-                    pass
-                else:
-                    ru_line = '{},{},{},{},{},{},{},{}'.format(
-                        tokens[cluster_idx],
-                        tokens[mma_cluster_idx],
-                        tokens[db_idx],
-                        tokens[c_idx],
-                        tokens[ru1_idx],
-                        tokens[ru2_idx],
-                        tokens[source_idx],
-                        tokens[cosmos_idx])
-                    lines.append(ru_line)
-        return lines
+            yield '{},{},{}'.format(uuid_key,cname,tname)
 
     def cluster_as_trello(self, c):
         tokens = c.split('---')
@@ -425,53 +440,6 @@ class Reporter(object):
         else:
             print('  unmatched csv_cols ({}) vs csv_line ({})'.format(len(names), len(values)))
 
-    def calculate_db_totals(self, cluster_db_containers):
-        #print('calculate_db_totals begin')
-        totals = dict()
-        totals['bytes'] = 0
-        totals['gb'] = 0
-        totals['db_level_migration_ru'] = 0
-        totals['db_level_post_migration_ru'] = 0
-        totals['container_count'] = len(cluster_db_containers)
-
-        use_db_level_throughput = False
-        # As of 2023/05/02 use container-level throughput in all cases; corresponds with migration tool.
-        # if len(cluster_db_containers) < 25:
-        #     use_db_level_throughput = True
-        totals['use_db_level_throughput'] = use_db_level_throughput
-        totals['db_level_post_migration_ru'] = 0
-        totals['db_level_migration_ru'] = 0
-        totals['gb'] = 0.0
-        totals['pp'] = 0
-
-        for c in cluster_db_containers:
-            c.set_db_level_throughput(use_db_level_throughput)
-            c.calculate()
-            #print('calculate_db_totals; c: {}'.format(c.key()))
-            totals['bytes'] = totals['bytes'] + c.size_in_bytes()
-            totals['gb'] = totals['gb'] + c.size_in_gb()
-            totals['pp'] = totals['pp'] + c.get_pp()
-
-            if use_db_level_throughput == True:
-                totals['db_level_post_migration_ru'] = \
-                    totals['db_level_post_migration_ru'] + c.get_post_migration_ru()
-                totals['db_level_migration_ru'] = \
-                    totals['db_level_migration_ru'] + c.get_migration_ru()
-
-        if use_db_level_throughput == True:
-            if totals['gb'] < 10:
-                totals['db_level_post_migration_ru'] = 4000
-                totals['db_level_migration_ru'] = 10000
-            else:
-                pp = self.pp_for_gb(totals['gb'])
-                totals['db_level_post_migration_ru'] = int(pp * 10000)
-                totals['db_level_migration_ru'] = int(pp * 4000)
-
-            if totals['db_level_migration_ru'] < totals['db_level_post_migration_ru']:
-                totals['db_level_migration_ru'] = totals['db_level_post_migration_ru']
-
-        return totals
-
     def lookup_shard_key_info(self, cluster_db_key, cname):
         result = ''  # dummy default result dict
         cluster_db_coll_key = '{}|{}'.format(cluster_db_key, cname)
@@ -510,6 +478,32 @@ class Reporter(object):
         else:
             return ''
 
+    def calculate_db_totals(self, containers):
+        # Return a dict keyed by 'cluster|db' of the database totals, grouped in a
+        # single pass.  The containers have already been calculated by the aggregator,
+        # so the pp values come from Container#calculate.
+        # As of 2023/05/02 use container-level throughput in all cases; corresponds
+        # with migration tool, so the db-level RU totals are always zero.
+        totals_dict = dict()
+        for c in containers:
+            key = c.cluster_db_key()
+            if key not in totals_dict.keys():
+                totals = dict()
+                totals['bytes'] = 0
+                totals['gb'] = 0.0
+                totals['db_level_migration_ru'] = 0
+                totals['db_level_post_migration_ru'] = 0
+                totals['container_count'] = 0
+                totals['use_db_level_throughput'] = False
+                totals['pp'] = 0
+                totals_dict[key] = totals
+            totals = totals_dict[key]
+            totals['container_count'] = totals['container_count'] + 1
+            totals['bytes'] = totals['bytes'] + c.size_in_bytes()
+            totals['gb'] = totals['gb'] + c.size_in_gb()
+            totals['pp'] = totals['pp'] + c.get_pp()
+        return totals_dict
+
     def pp_for_gb(self, gb):
         gb_uncompressed = gb * 4.0
         pp = int(math.ceil(gb_uncompressed / 50.0))
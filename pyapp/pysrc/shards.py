@@ -3,6 +3,7 @@ import json
 from pysrc.counter import Counter
 from pysrc.datasets import Datasets
 from pysrc.env import Env
+from pysrc.mma_files import MmaFiles
 
 # This class is used to extact the MongoDB sharding information from the
 # MMA outputs.
@@ -11,27 +12,32 @@ from pysrc.env import Env
 
 class Shards(object):
 
-    def __init__(self, aggregated_mma_outputs):
+    def __init__(self, aggregated_mma_outputs=None):
         self.aggregated_mma_outputs = aggregated_mma_outputs
         self.aggregated_shard_keys = dict()
         self.aggregated_shard_advice = dict()
+        self.cluster_file_counter = Counter()
 
     def extract_keys_and_advice(self):
         print('extract_keys_and_advice...')
-        ctr = Counter()
-        #filename_pattern = 'db0da162dfcef309aab0c847ea46d9b982308f85e2e7c0535b655c1d8c4bf890'
-        filename_pattern = 'AppData'  # AppData matches all MMA output files
-
         for mma_obj in self.aggregated_mma_outputs:
-            ctr.increment(mma_obj['_cluster'])
-            filename = mma_obj['_file_name'].strip()
-            if filename_pattern in filename:
-                if filename.endswith('shard_keys.json'):
-                    self.parse_shard_keys_data(mma_obj)
-                elif filename.endswith('shard_key_advisor_report.json'):
-                    self.parse_shard_key_advisor_report(mma_obj)
+            file_type = MmaFiles.classify(mma_obj['_file_name'])
+            self.process_mma_obj(file_type, mma_obj)
+        self.write_keys_and_advice()
+
+    def mma_file_types(self):
+        # ALL_FILES because every MMA output file is counted per cluster
+        return [MmaFiles.ALL_FILES]
+
+    def process_mma_obj(self, file_type, mma_obj):
+        self.cluster_file_counter.increment(mma_obj['_cluster'])
+        if file_type == MmaFiles.SHARD_KEYS:
+            self.parse_shard_keys_data(mma_obj)
+        elif file_type == MmaFiles.SHARD_KEY_ADVISOR_REPORT:
+            self.parse_shard_key_advisor_report(mma_obj)
 
-        Datasets.write_cluster_file_counts(ctr.get_data())
+    def write_keys_and_advice(self):
+        Datasets.write_cluster_file_counts(self.cluster_file_counter.get_data())
         Datasets.write_aggregated_shard_keys_file(self.aggregated_shard_keys)
         Datasets.write_aggregated_shard_advice_file(self.aggregated_shard_advice)
 
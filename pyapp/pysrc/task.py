@@ -1,26 +1,40 @@
+import heapq
 import json
+import multiprocessing
 import os
 import os.path
 import shutil
+import tempfile
 import time
 import traceback
-import warnings
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import arrow
 from bson import json_util
-from openpyxl import load_workbook
+from bson.codec_options import CodecOptions
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
 
 from pysrc.artifacts import ArtifactGenerator
 from pysrc.bytes import Bytes
+from pysrc.cluster_aliases import ClusterAliases
+from pysrc.cluster_spreadsheet import ClusterSpreadsheet
 from pysrc.aggregators import ContainersAggregator
 from pysrc.datasets import Datasets
+from pysrc.dispatcher import MmaDispatcher
 from pysrc.docscan import DocscanCluster
 from pysrc.docscan import DocscanClusterResult
+from pysrc.docscan import DocscanContainer
+from pysrc.docscanner import DocScanner
 from pysrc.env import Env
+from pysrc.mma_cache import MmaRecordCache
 from pysrc.mma_files import MmaFiles
+from pysrc.mmaout_scanner import MmaoutScanner
 from pysrc.fs import FS
 from pysrc.indices import Indices
-from pysrc.mongo import Mongo
+from pysrc.mongo import Mongo, MongoClients
+from pysrc.pg_loader import PgLoader
 from pysrc.reporter import Reporter
 from pysrc.shards import Shards
 from pysrc.system import System
@@ -110,6 +124,26 @@ class Tasks(object):
             tr.set_success(False)
         return tr
 
+    @classmethod
+    def load_postgresql(cls):
+        tr = TaskResult('load_postgresql')
+        loader = None
+        try:
+            loader = PgLoader.connect()
+            counts = Reporter().migration_wave_report(loader)
+            for table in counts.keys():
+                tr.log('table: {} rows upserted: {}'.format(table, counts[table]))
+            tr.set_resp_obj(counts)
+            tr.set_success(True)
+        except Exception as e:
+            tr.log(str(e))
+            tr.log(traceback.format_exc())
+            tr.set_success(False)
+        finally:
+            if loader != None:
+                loader.close()
+        return tr
+
     @classmethod
     def gen_mma_execution_scripts(cls, clusters):
         tr = TaskResult('gen_mma_execution_scripts')
@@ -232,7 +266,6 @@ class Tasks(object):
             Datasets.write_mma_output_dir_walk_filenames(mma_output_files)
             cls.validate_presence_of_expected_mma_files(dirs_dict, mma_output_files)
 
-            aggregated_json_files = list()
             tr.log("{} mma output files".format(len(mma_output_files)))
             cluster_mapping = dict()
 
@@ -260,22 +293,25 @@ class Tasks(object):
             else:
                 print('{} cluster names parsed from the mongo_migration_assessment_report.html file(s)'.format(len(cluster_mapping)))
 
-            # Next, iterate the JSON files and collect each
+            # Next, iterate the JSON files and collect each.  The parsed files are
+            # streamed to the aggregated output file rather than held in a list.
+            json_file_tasks = list()
             for file_idx, file_info in enumerate(mma_output_files):
-                fqname = file_info['full']
-                if fqname.endswith('.json'):
-                    obj = dict()
-                    obj['_file_idx'] = file_idx
-                    obj['_file_name'] = fqname
-                    obj['_file_basename'] = file_info['base']
-                    epoch = os.path.getmtime(fqname)
-                    obj['_file_mtime'] = epoch
-                    obj['_file_date'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch))
-                    if Env.verbose():
-                        tr.log('reading json file: {}'.format(fqname))
-                    obj['_cluster'] = cls.__lookup_cluster_name(cluster_mapping, file_info['abspath'])
-                    obj['data'] = FS.read_json(fqname)
-                    aggregated_json_files.append(obj)
+                if file_info['full'].endswith('.json'):
+                    cluster = cls.__lookup_cluster_name(cluster_mapping, file_info['abspath'])
+                    json_file_tasks.append((file_idx, file_info, cluster))
+
+            output_format = Env.str_arg('--format', 'json')  # json, jsonl, jsonl.gz, or jsonl.zst
+            cache = None
+            if Env.boolean_arg('--cache'):
+                cache = MmaRecordCache(Datasets.mma_record_cache_file())
+            mma_objects = cls._iterate_mma_json_files(tr, json_file_tasks, cache)
+            count = cls._write_aggregated_mma_objects(mma_objects, output_format)
+            tr.log('{} json files aggregated'.format(count))
+            if cache is not None:
+                tr.log('cache hits: {}, misses: {}, pruned: {}'.format(
+                    cache.hits, cache.misses, cache.prune([t[1]['full'] for t in json_file_tasks])))
+                cache.close()
 
             verification_dict = dict()
             for dir in dirs_dict.keys():
@@ -285,7 +321,6 @@ class Tasks(object):
                     verification_dict[dir] = 'absent'
                     cls.__verify_mongo_migration_assessment_report_html_file(dir, mma_output_files)
 
-            Datasets.write_aggregated_mma_output_file(aggregated_json_files)
             Datasets.write_cluster_uuid_mappings_file(cluster_mapping)
             Datasets.write_cluster_mappings_verification_file(verification_dict)
             Datasets.display()
@@ -296,6 +331,31 @@ class Tasks(object):
             tr.set_success(False)
         return tr
 
+    @classmethod
+    def read_mma_json_file(cls, json_file_task):
+        # json_file_task is a (file_idx, file_info, cluster) tuple.  This method
+        # may execute in a worker process, so it returns the parsed object
+        # rather than modifying any shared state.
+        file_idx, file_info, cluster = json_file_task
+        fqname = file_info['full']
+        if Env.verbose():
+            print('reading json file: {}'.format(fqname))
+        epoch = os.path.getmtime(fqname)
+        return cls.mma_json_file_object(json_file_task, epoch, FS.read_json(fqname))
+
+    @classmethod
+    def mma_json_file_object(cls, json_file_task, epoch, data):
+        file_idx, file_info, cluster = json_file_task
+        obj = dict()
+        obj['_file_idx'] = file_idx
+        obj['_file_name'] = file_info['full']
+        obj['_file_basename'] = file_info['base']
+        obj['_file_mtime'] = epoch
+        obj['_file_date'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch))
+        obj['_cluster'] = cluster
+        obj['data'] = data
+        return obj
+
     @classmethod
     def validate_presence_of_expected_mma_files(cls, dirs_dict, mma_output_files):
         for parent_dir in sorted(dirs_dict.keys()):
@@ -333,14 +393,8 @@ class Tasks(object):
     def gather_cluster_db_collection_info(cls):
         tr = TaskResult('gather_cluster_db_collection_info')
         try:
-            aggregated_mma_outputs = Datasets.read_aggregated_mma_output_file()
-            agg = ContainersAggregator(aggregated_mma_outputs)
-            containers_data_list = agg.containers_obj.get_data_list()
-            Datasets.write_aggregated_containers_info_file(containers_data_list)
-            tr.log('containers count: {}'.format(len(containers_data_list)))
-
-            overrides_data = agg.collect_overrides_data(containers_data_list)
-            Datasets.write_mappings_generated_config_file(overrides_data)
+            agg = ContainersAggregator(Datasets.iterate_aggregated_mma_outputs())
+            cls._write_containers_info(tr, agg)
             tr.set_success(True)
         except Exception as e:
             tr.log(str(e))
@@ -352,8 +406,7 @@ class Tasks(object):
     def gather_shard_info(cls):
         tr = TaskResult('gather_shard_info')
         try:
-            aggregated_mma_outputs = Datasets.read_aggregated_mma_output_file()
-            Shards(aggregated_mma_outputs).extract_keys_and_advice()
+            Shards(Datasets.iterate_aggregated_mma_outputs()).extract_keys_and_advice()
             tr.set_success(True)
         except Exception as e:
             tr.log(str(e))
@@ -365,8 +418,32 @@ class Tasks(object):
     def gather_index_info(cls):
         tr = TaskResult('gather_index_info')
         try:
-            aggregated_mma_outputs = Datasets.read_aggregated_mma_output_file()
-            Indices(aggregated_mma_outputs).extract_info_and_advice()
+            Indices(Datasets.iterate_aggregated_mma_outputs()).extract_info_and_advice()
+            tr.set_success(True)
+        except Exception as e:
+            tr.log(str(e))
+            tr.log(traceback.format_exc())
+            tr.set_success(False)
+        return tr
+
+    @classmethod
+    def gather_all(cls):
+        # Equivalent to gather_cluster_db_collection_info, gather_shard_info, and
+        # gather_index_info, but with a single pass of the aggregated MMA outputs.
+        tr = TaskResult('gather_all')
+        try:
+            agg, shards, indices = ContainersAggregator(), Shards(), Indices()
+            dispatcher = MmaDispatcher()
+            dispatcher.register(agg)
+            dispatcher.register(shards)
+            dispatcher.register(indices)
+            count = dispatcher.dispatch(Datasets.iterate_aggregated_mma_outputs())
+            tr.log('mma objects dispatched: {}'.format(count))
+            tr.log('mma file type counts: {}'.format(dispatcher.get_file_type_counts()))
+
+            cls._write_containers_info(tr, agg)
+            shards.write_keys_and_advice()
+            indices.write_info_and_advice()
             tr.set_success(True)
         except Exception as e:
             tr.log(str(e))
@@ -378,34 +455,13 @@ class Tasks(object):
     def pymongo_connect(cls, cluster_name, conn_str):
         tr = TaskResult('pymongo_connect')
         try:
-            lines = list()
             host = conn_str.split('@')[1]
-            lines.append('pymongo_connect, cluster: {} host: {}'.format(cluster_name, host))
             outfile = 'mmaout/{}-pymongo.txt'.format(cluster_name)
             opts = dict()
             opts['conn_string'] = conn_str
             opts['verbose'] = False
             m = Mongo(opts)
-            bypass_dbnames = ['admin', 'config', 'local']
-            dbs = m.list_databases()
-            lines.append('cluster_name: {} outfile: {}'.format(cluster_name, outfile))
-            if dbs is not None:
-                lines.append('cluster:    {} has {} databases: {}'.format(cluster_name, len(dbs), dbs))
-                for dbname in dbs:
-                    if dbname in bypass_dbnames:
-                        pass
-                    else:
-                        m.set_db(dbname)
-                        colls = m.list_collections()
-                        if colls is not None:
-                            lines.append('database:   {} has {} collections: {}'.format(dbname, len(colls), colls))
-                            for coll in colls:
-                                lines.append(
-                                    'collection: {}|{}|{}|{}'.format(cluster_name, host, dbname, coll))  # grep this
-                        else:
-                            lines.append('database:   {} has {} no collections'.format(dbname))
-            else:
-                lines.append('cluster:    {} has no databases'.format(cluster_name))
+            lines = cls.pymongo_connect_lines(cluster_name, host, outfile, m.client(), dict())
             FS.write_lines(lines, outfile)
             for line in lines:
                 tr.add_message(line)
@@ -417,6 +473,136 @@ class Tasks(object):
             tr.set_success(False)
         return tr
 
+    @classmethod
+    def pymongo_connect_lines(cls, cluster_name, host, outfile, client, inventory):
+        # Return the lines of the mmaout/<cluster>-pymongo.txt file, and populate
+        # the given inventory dict with the databases and their collections.
+        lines = list()
+        lines.append('pymongo_connect, cluster: {} host: {}'.format(cluster_name, host))
+        bypass_dbnames = ['admin', 'config', 'local']
+        dbs = None
+        try:
+            dbs = sorted(client.list_database_names())
+        except Exception as e:
+            print(str(e))
+            print(traceback.format_exc())
+            inventory['error'] = str(e)
+        lines.append('cluster_name: {} outfile: {}'.format(cluster_name, outfile))
+        if dbs is not None:
+            lines.append('cluster:    {} has {} databases: {}'.format(cluster_name, len(dbs), dbs))
+            inventory['databases'] = dict()
+            for dbname in dbs:
+                if dbname in bypass_dbnames:
+                    pass
+                else:
+                    try:
+                        colls = client[dbname].list_collection_names(filter={'type': 'collection'})
+                    except Exception as e:
+                        # keep the databases already listed, and record the error
+                        print(str(e))
+                        print(traceback.format_exc())
+                        inventory['error'] = str(e)
+                        lines.append('error:      database {} - {}'.format(dbname, str(e)))
+                        break
+                    inventory['databases'][dbname] = colls
+                    if colls is not None:
+                        lines.append('database:   {} has {} collections: {}'.format(dbname, len(colls), colls))
+                        for coll in colls:
+                            lines.append(
+                                'collection: {}|{}|{}|{}'.format(cluster_name, host, dbname, coll))  # grep this
+                    else:
+                        lines.append('database:   {} has no collections'.format(dbname))
+        else:
+            lines.append('cluster:    {} has no databases'.format(cluster_name))
+        return lines
+
+    @classmethod
+    def probe_clusters(cls, workers, timeout_secs):
+        # An in-process, concurrent alternative to the pymongo_connect.ps1 script
+        # generated by gen_pymongo_connect_script.  Each cluster is probed in a
+        # worker thread, with a one-shot client with the given timeouts.
+        tr = TaskResult('probe_clusters')
+        try:
+            clusters = FS.read_json('current/excel_clusters.json')
+            os.makedirs('mmaout', exist_ok=True)
+            cluster_names = sorted(clusters.keys())
+            tr.log('probing {} clusters with {} workers, timeout {}s'.format(
+                len(cluster_names), workers, timeout_secs))
+            t1 = time.time()
+            results = list()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = list()
+                for cluster_name in cluster_names:
+                    conn_str = clusters[cluster_name]['source']
+                    futures.append(pool.submit(cls.probe_cluster, cluster_name, conn_str, timeout_secs))
+                for future in as_completed(futures):
+                    result = future.result()
+                    print('probed cluster: {} status: {} elapsed_ms: {}'.format(
+                        result['cluster'], result['status'], result['elapsed_ms']))
+                    results.append(result)
+            results = sorted(results, key=lambda r: r['cluster'])
+
+            status_counts = dict()
+            for result in results:
+                status_counts[result['status']] = status_counts.get(result['status'], 0) + 1
+            probe = dict()
+            probe['utc'] = arrow.utcnow().format('YYYY-MM-DD HH:mm:ss ZZ')
+            probe['elapsed_secs'] = round(time.time() - t1, 3)
+            probe['status_counts'] = status_counts
+            probe['clusters'] = results
+            outfile = 'current/probe_clusters.json'
+            FS.write_json(probe, outfile)
+            tr.log('file written: {}'.format(outfile))
+            tr.log('status_counts: {}, elapsed_secs: {}'.format(status_counts, probe['elapsed_secs']))
+            tr.set_resp_obj(status_counts)
+            tr.set_success(True)
+        except Exception as e:
+            tr.log(str(e))
+            tr.log(traceback.format_exc())
+            tr.set_success(False)
+        return tr
+
+    @classmethod
+    def probe_cluster(cls, cluster_name, conn_str, timeout_secs):
+        # returns a result dict; the status is ok, unreachable, or error
+        result = dict()
+        result['cluster'] = cluster_name
+        result['host'] = conn_str.split('@')[-1]
+        result['outfile'] = 'mmaout/{}-pymongo.txt'.format(cluster_name)
+        result['status'] = 'ok'
+        t1 = time.time()
+        client = None
+        try:
+            timeout_ms = int(timeout_secs * 1000)
+            client = MongoClients.new_client(
+                conn_str,
+                serverSelectionTimeoutMS=timeout_ms,
+                connectTimeoutMS=timeout_ms,
+                socketTimeoutMS=timeout_ms)
+            inventory = dict()
+            lines = cls.pymongo_connect_lines(
+                cluster_name, result['host'], result['outfile'], client, inventory)
+            FS.write_lines(lines, result['outfile'])
+            if 'error' in inventory.keys():
+                # unreachable if the databases couldn't be listed, else a partial probe
+                if 'databases' in inventory.keys():
+                    result['status'] = 'error'
+                else:
+                    result['status'] = 'unreachable'
+                result['error'] = inventory['error']
+            databases = inventory.get('databases', dict())
+            result['database_count'] = len(databases)
+            result['collection_count'] = sum([len(colls) for colls in databases.values()])
+            result['databases'] = databases
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+        finally:
+            if client != None:
+                client.close()
+        result['elapsed_ms'] = int((time.time() - t1) * 1000)
+        return result
+
     @classmethod
     def read_parse_clusters_info_excel_file(cls):
         tr = TaskResult('read_parse_clusters_info_excel_file')
@@ -425,14 +611,6 @@ class Tasks(object):
             wsname = 'Sheet1'
             clusters = dict()
             raw_urls = list()
-            tr.set_resp_obj(clusters)
-            warnings.filterwarnings('ignore', category=UserWarning, module='openpyxl')
-            wb = load_workbook(filename=infile)
-            print('sheetnames: '.format(wb.sheetnames))
-            tr.log(wb.sheetnames)
-            ws = wb[wsname]
-            col_count = ws.max_column
-            row_count = ws.max_row
             mdb_cred  = 'user:pass'
             try:
                 mdb_cred = FS.read_single_line('current/cred/mdb-cred.txt')
@@ -440,41 +618,22 @@ class Tasks(object):
                 print('unable to read file "current/cred/mdb-cred.txt"; using defaults')
 
             print('mdb_cred: {}'.format(mdb_cred))
-            tr.log('worksheet: {}, cols: {}, rows: {}'.format(wsname, col_count, row_count))
-            for r in range(2, row_count):
-                # ugh, 'org' is now a calculated field in the spreadsheet
-                prty   = str(ws.cell(row=r, column=3).value).replace(' ', '').strip()  # column C
-                bar    = str(ws.cell(row=r, column=4).value).replace(' ', '').strip()  # column D
-                env    = str(ws.cell(row=r, column=5).value).replace(' ', '').strip()  # column E
-                cname  = str(ws.cell(row=r, column=6).value).replace(' ', '').strip()  # column F
-                cosmos = str(ws.cell(row=r, column=28).value).replace(' ', '').strip()  # column AB
-                vcore  = str(ws.cell(row=r, column=29).value).replace(' ', '').strip()  # column AC
-                #org   = '{}-{}-{}---{}'.format(prty, bar, env, cname).strip()
-                org    = '1-{}-{}---{}'.format(bar, env, cname).strip()  # use 1 for all waves
-                url    = str(ws.cell(row=r, column=12).value).replace(' ', '').strip()
-                raw_urls.append(url)
-
-                mapping = dict()
-                mapping['source'] = ''
-                mapping['target'] = cosmos
-
-                if cls.org_is_valid(org):
-                    print('ORD VALID - org: {}  url: {}'.format(org, url))
-                    if cls.url_is_valid(url):
-                        if mdb_cred in url:
-                            # the url from the spreadsheet already contains the credentials
-                            mapping['source'] = url
-                            clusters[org] = mapping
-                        else:
-                            # inject the read-only-credentials into the URL to form the connection string
-                            url_tokens = url.split('//')
-                            conn_str = '{}//{}@{}'.format(url_tokens[0], mdb_cred, url_tokens[1])
-                            mapping['source'] = conn_str
-                            clusters[org] = mapping
-                    else:
-                        print('URL INVALID: {}'.format(url))
-                else:
-                    print('ORD INVALID: {}'.format(org))
+            sheet = ClusterSpreadsheet(infile, wsname, ClusterSpreadsheet.load_column_map())
+            tr.log('column map: {}'.format(sheet.column_map))
+            cache_key = sheet.cache_key(mdb_cred)
+            cached = None
+            if not Env.boolean_arg('--no-cache'):
+                cached = sheet.read_cache(cache_key)
+            if cached != None:
+                clusters, raw_urls = cached['clusters'], cached['raw_urls']
+                tr.log('unchanged workbook {}; using cached {}'.format(infile, ClusterSpreadsheet.CACHE_FILE))
+            else:
+                for org, mapping in cls.excel_clusters(sheet, mdb_cred, raw_urls):
+                    clusters[org] = mapping
+                tr.log(sheet.sheetnames)
+                tr.log('worksheet: {}, cols: {}, rows: {}'.format(wsname, sheet.max_col, sheet.row_count))
+                sheet.write_cache(cache_key, clusters, raw_urls)
+            tr.set_resp_obj(clusters)
 
             outfile = 'current/excel_clusters.json'
             FS.write_json(clusters, outfile)
@@ -493,6 +652,12 @@ class Tasks(object):
                 print('CLUSTER {} -> {}'.format(key, value))
             print('CLUSTER_TOTALS - total: {}, duplicate_urls: {}'.format(total_count, duplicate_count))
             FS.write_json(unique_urls, 'current/excel_unique_cluster_urls.json')
+
+            # persist the cluster -> url -> siblings index used by the Reporter
+            aliases = ClusterAliases.build(clusters)
+            aliases.save()
+            tr.log('cluster aliases - clusters: {}, urls: {}, aliased: {}'.format(
+                len(aliases.url_by_cluster), len(aliases.clusters_by_url), aliases.duplicate_count()))
             tr.set_success(True)
         except Exception as e:
             tr.log(str(e))
@@ -500,6 +665,38 @@ class Tasks(object):
             tr.set_success(False)
         return tr
 
+    @classmethod
+    def excel_clusters(cls, sheet, mdb_cred, raw_urls):
+        # a generator of (org, mapping) tuples, as each spreadsheet row is read
+        for row in sheet.rows():
+            # ugh, 'org' is now a calculated field in the spreadsheet
+            #org   = '{}-{}-{}---{}'.format(row['prty'], row['bar'], row['env'], row['cname']).strip()
+            org    = '1-{}-{}---{}'.format(row['bar'], row['env'], row['cname']).strip()  # use 1 for all waves
+            url    = row['url']
+            raw_urls.append(url)
+
+            mapping = dict()
+            mapping['source'] = ''
+            mapping['target'] = row['cosmos']
+
+            if cls.org_is_valid(org):
+                print('ORD VALID - org: {}  url: {}'.format(org, url))
+                if cls.url_is_valid(url):
+                    if mdb_cred in url:
+                        # the url from the spreadsheet already contains the credentials
+                        mapping['source'] = url
+                        yield org, mapping
+                    else:
+                        # inject the read-only-credentials into the URL to form the connection string
+                        url_tokens = url.split('//')
+                        conn_str = '{}//{}@{}'.format(url_tokens[0], mdb_cred, url_tokens[1])
+                        mapping['source'] = conn_str
+                        yield org, mapping
+                else:
+                    print('URL INVALID: {}'.format(url))
+            else:
+                print('ORD INVALID: {}'.format(org))
+
     @classmethod
     def org_is_valid(cls, s):
         if s is None:
@@ -561,51 +758,23 @@ class Tasks(object):
     def scan_mmaout_results(cls):
         tr = TaskResult('scan_mmaout_results')
         try:
-            results = dict()
+            results = dict()  # key is cluster name, value is its result record
             tr.set_resp_obj(results)
             clusters = FS.read_json('current/excel_clusters.json')
-            filenames = list()
-            for file_obj in FS.walk('current/mmaout'):
-                filenames.append('current/mmaout/{}'.format(file_obj['base']))
+            scanner = MmaoutScanner('current/mmaout')
+            tr.log('mmaout files - mma: {}, pymongo: {}, other: {}'.format(
+                len(scanner.mma_files), len(scanner.pymongo_files), len(scanner.unindexed)))
 
             for cluster_name in sorted(clusters.keys()):
-                mma_file = cls._find_file_in_list(filenames, cluster_name, 'mma.txt')
-                pymongo_file = cls._find_file_in_list(filenames, cluster_name, 'pymongo.txt')
-                mma_file_key = '{} mma_present'.format(cluster_name)
-                mma_successful_key = '{} mma_successful'.format(cluster_name)
-                pymongo_file_key = '{} pymongo_present'.format(cluster_name)
-                database_count, collection_count = 0, 0
-                results[cluster_name] = 'cluster'
-                results[mma_file_key] = mma_file
-                results[mma_successful_key] = 'unknown'
-                results[pymongo_file_key] = str(pymongo_file)
-
-                if pymongo_file is not None:
-                    lines = FS.read_lines(pymongo_file)
-                    pymongo_databases_key = '{} pymongo_databases'.format(cluster_name)
-                    pymongo_collections_key = '{} pymongo_collections'.format(cluster_name)
-                    for line in lines:
-                        scrubbed = line.strip()
-                        if scrubbed.find('database:') >= 0:
-                            database_count = database_count + 1
-                        if 'collection:' in line:
-                            collection_count = collection_count + 1
-                    results[pymongo_databases_key] = database_count
-                    results[pymongo_collections_key] = collection_count
-
-                if mma_file is not None:
-                    lines = FS.read_lines(mma_file)
-                    # lines = FS.read_encoded_lines(mma_file, encoding='utf-16le')  # from PowerShell cmd | Out-File -FilePath
-                    for line in lines:
-                        if 'Assessment Succeeded' in line:
-                            results[mma_successful_key] = 'true'
-                            print('Assessment Succeeded for {}'.format(cluster_name))
-                        if 'Assessment Failed' in line:
-                            results[mma_successful_key] = 'false'
-                            print('Assessment Failed for {}'.format(cluster_name))
+                record = scanner.scan(cluster_name)
+                results[cluster_name] = record
+                if record['mma_successful'] == 'true':
+                    print('Assessment Succeeded for {}'.format(cluster_name))
+                elif record['mma_successful'] == 'false':
+                    print('Assessment Failed for {}'.format(cluster_name))
 
             FS.write_json(results, 'tmp/scan_mmaout_results.json')
-            #scan_mmaout_results_report(clusters, results)
+            tr.set_success(True)
         except Exception as e:
             tr.log(str(e))
             tr.log(traceback.format_exc())
@@ -624,11 +793,12 @@ class Tasks(object):
             csv_lines.append(
                 'cluster_name,mma_present,mma_successful,pymongo_present,pymongo_databases,pymongo_collections,note')
             for cluster_name in sorted(clusters.keys()):
-                mma_present = cls.result_matching_value(results, cluster_name, 'mma_present')
-                mma_successful = cls.result_matching_value(results, cluster_name, 'mma_successful').lower()
-                pymongo_present = cls.result_matching_value(results, cluster_name, 'pymongo_present')
-                pymongo_databases = cls.result_matching_value(results, cluster_name, 'pymongo_databases')
-                pymongo_collections = cls.result_matching_value(results, cluster_name, 'pymongo_collections')
+                record = cls.mmaout_result_record(results, cluster_name)
+                mma_present = str(record['mma_present'])
+                mma_successful = str(record['mma_successful']).lower()
+                pymongo_present = str(record['pymongo_present'])
+                pymongo_databases = cls.mmaout_result_count(record['pymongo_databases'])
+                pymongo_collections = cls.mmaout_result_count(record['pymongo_collections'])
                 note = ''
                 if mma_successful == 'false':
                     if pymongo_present != 'None':
@@ -676,61 +846,118 @@ class Tasks(object):
         return tr
 
     @classmethod
-    def result_matching_value(results, cluster_name, name):
-        for key in results.keys():
-            if key.startswith(cluster_name):
-                if name in key:
-                    return str(results[key])
-        return ''
+    def mmaout_result_record(cls, results, cluster_name):
+        # return the result record for the cluster; the flat '<cluster> <name>'
+        # keys of earlier tmp/scan_mmaout_results.json files are also supported
+        record = results.get(cluster_name)
+        if isinstance(record, dict):
+            return record
+        record = dict()
+        for name in ['mma_present', 'mma_successful', 'pymongo_present', 'pymongo_databases', 'pymongo_collections']:
+            record[name] = results.get('{} {}'.format(cluster_name, name))
+        if record['mma_successful'] == None:
+            record['mma_successful'] = 'unknown'
+        return record
+
+    @classmethod
+    def mmaout_result_count(cls, value):
+        if value == None:
+            return ''
+        return str(value)
+
+    @classmethod
+    def docscan(cls, cluster_name, conn_str=None):
+        tr = TaskResult('docscan')
+        try:
+            if conn_str == None:
+                clusters = FS.read_json('current/excel_clusters.json')
+                conn_str = clusters[cluster_name]['source']
+            scanner = DocScanner(
+                cluster_name, conn_str,
+                workers=Env.int_arg('--workers', 4),
+                batch_size=Env.int_arg('--batch-size', 1000),
+                top_n=Env.int_arg('--top', 10),
+                dbname=Env.str_arg('--db', None),
+                sample_size=Env.int_arg('--sample', 0),
+                find_oversize=Env.boolean_arg('--find-oversize'),
+                server_side=Env.boolean_arg('--server-side'))
+            result = scanner.scan()
+            os.makedirs('current/docscan', exist_ok=True)
+            outfile = 'current/docscan/{}-docscan.json'.format(cluster_name)
+            FS.write_json(result, outfile)
+            tr.log('file written: {} with {} collections'.format(outfile, len(result['containerInfo'])))
+            tr.set_success(True)
+        except Exception as e:
+            tr.log(str(e))
+            tr.log(traceback.format_exc())
+            tr.set_success(False)
+        return tr
+
     @classmethod
     def docscan_results_report(cls):
         tr = TaskResult('docscan_results_report')
         try:
-            docscan_file_ojects = FS.walk('current/docscan')
-            collections = list()
-            clusters_largest = dict()  # key = name, value = DocscanCluster
-            two_mb = Bytes.megabyte() * 2.0
-
-            tr.log('docscan_file count: {}'.format(len(docscan_file_ojects)))
-            for file_obj in docscan_file_ojects:
-                abspath = file_obj['abspath']
-                if abspath.endswith('.json'):
-                    cluster_data = FS.read_json_utf8(abspath)
-                    dcr = DocscanClusterResult(cluster_data)
-                    dcr.parse()
-                    cluster_name = dcr.cluster_name
-                    dc = DocscanCluster(cluster_name)
-                    clusters_largest[cluster_name] = dc
-                    dcr.parse()
-                    for dcoll in dcr.collections:
-                        collections.append(dcoll)
-                        dc.add_container(dcoll)
-            tr.add_message('{} total collections'.format(len(collections)))
-
-            collections.sort(key=lambda x: x.largest_doc_size)
-            collections.reverse()
-
-            collections_dict = dict()
-            for c in collections:
-                key = c.key
-                collections_dict[key] = c.get_data()
-            FS.write_json(collections_dict, 'current/docscan_merged_collections_dict.json')
-
-            # create the docscan_by_largest_doc_in_collection report
-            csv_lines = list()
-            for idx, dc in enumerate(collections):
-                if idx == 0:
-                    csv_lines.append(dc.as_csv_header())
-                csv_lines.append(dc.as_csv())
-            FS.write_lines(csv_lines, 'current/docscan_by_largest_doc_in_collection.csv')
+            docscan_files = list()
+            for file_obj in FS.walk('current/docscan'):
+                if file_obj['abspath'].endswith('.json'):
+                    docscan_files.append(file_obj['abspath'])
+            tr.log('docscan_file count: {}'.format(len(docscan_files)))
+            top_n = Env.int_arg('--top', 0)  # 0 is all collections
+
+            # The cluster files are parsed, serially or on a process pool, into
+            # summaries of their collections.  The collection data and csv rows are
+            # spilled to a temporary file as they arrive; only the per-cluster maxima,
+            # a small index entry per collection (sizes, sequence, and spill file
+            # offsets), and with --top the bounded heap of the largest collections'
+            # csv rows are retained in memory.
+            # The outputs are ordered as before, by descending largest_doc_size, with
+            # ties in the reversed file sequence; for a duplicate key, the dict entry
+            # is positioned by its largest occurrence and has the value of its smallest.
+            clusters_largest = dict()  # key = cluster name, value = largest doc size
+            largest_heap = list()  # (largest_doc_size, seq, csv_line or spill offset)
+            key_index = dict()     # key = collection key, value = [max_pos, min_pos, offset]
+            collection_count = 0
+
+            # the spill file is unique to this run, and is deleted when closed
+            with tempfile.NamedTemporaryFile(dir='tmp', prefix='docscan_results_spill_', suffix='.jsonl') as spill:
+                if Env.boolean_arg('--parallel'):
+                    workers = Env.int_arg('--workers', os.cpu_count())
+                    tr.log('parsing {} docscan files with {} worker processes'.format(len(docscan_files), workers))
+                    with multiprocessing.Pool(processes=workers) as pool:
+                        summaries = pool.imap(cls.read_docscan_file, docscan_files, chunksize=4)
+                        for summary in summaries:
+                            collection_count = cls.__merge_docscan_summary(
+                                tr, summary, spill, top_n, clusters_largest, largest_heap, key_index, collection_count)
+                else:
+                    for summary in map(cls.read_docscan_file, docscan_files):
+                        collection_count = cls.__merge_docscan_summary(
+                            tr, summary, spill, top_n, clusters_largest, largest_heap, key_index, collection_count)
+                tr.add_message('{} total collections'.format(collection_count))
+
+                def merged_collection_items():
+                    keys = sorted(key_index.keys(), key=lambda k: key_index[k][0], reverse=True)
+                    for key in keys:
+                        yield key, cls.__read_docscan_spill(spill, key_index[key][2])['data']
+
+                FS.write_json_dict_stream(merged_collection_items(), 'current/docscan_merged_collections_dict.json')
+
+                # create the docscan_by_largest_doc_in_collection report
+                outfile = 'current/docscan_by_largest_doc_in_collection.csv'
+                with open(outfile, 'w') as f:
+                    if collection_count > 0:
+                        f.write(DocscanContainer.csv_header() + '\n')
+                    for largest_doc_size, idx, csv_line in sorted(largest_heap, reverse=True):
+                        if top_n < 1:
+                            csv_line = cls.__read_docscan_spill(spill, csv_line)['csv']
+                        f.write(csv_line + '\n')
+                tr.log('file written: {} with {} collections'.format(outfile, len(largest_heap)))
 
             # create the docscan_by_largest_doc_in_cluster report
             csv_lines = list()
             two_mb = Bytes.megabyte() * 2.0
             csv_lines.append('cluster_name,largest_doc_size,over_2mb')
             for cluster_name in sorted(clusters_largest.keys()):
-                dc = clusters_largest[cluster_name]
-                largest_size = dc.largest_doc_size
+                largest_size = clusters_largest[cluster_name]
                 over_2mb = 'no'
                 if largest_size > two_mb:
                     over_2mb = 'yes'
@@ -743,50 +970,109 @@ class Tasks(object):
             tr.set_success(False)
         return tr
 
+    @classmethod
+    def __merge_docscan_summary(cls, tr, summary, spill, top_n, clusters_largest, largest_heap, key_index, count):
+        if summary['exception'] != None:
+            tr.log('docscan file {} parse exception: {}'.format(summary['file'], summary['exception']))
+        cluster_name = summary['cluster_name']
+        if cluster_name != None:
+            clusters_largest[cluster_name] = max(
+                clusters_largest.get(cluster_name, 0), summary['largest_doc_size'])
+        for key, largest_doc_size, data, csv_line in summary['containers']:
+            pos = (largest_doc_size, count)
+            count = count + 1
+            offset = spill.tell()
+            spill.write((json.dumps({'data': data, 'csv': csv_line}) + '\n').encode('utf-8'))
+            if top_n < 1:
+                largest_heap.append((largest_doc_size, pos[1], offset))
+            elif len(largest_heap) < top_n:
+                heapq.heappush(largest_heap, (largest_doc_size, pos[1], csv_line))
+            else:
+                heapq.heappushpop(largest_heap, (largest_doc_size, pos[1], csv_line))
+            entry = key_index.get(key)
+            if entry == None:
+                key_index[key] = [pos, pos, offset]
+            else:
+                if pos > entry[0]:
+                    entry[0] = pos
+                if pos < entry[1]:
+                    entry[1], entry[2] = pos, offset
+        return count
+
+    @classmethod
+    def __read_docscan_spill(cls, spill, offset):
+        spill.seek(offset)
+        obj = json.loads(spill.readline().decode('utf-8'))
+        spill.seek(0, os.SEEK_END)
+        return obj
+
+    @classmethod
+    def read_docscan_file(cls, infile):
+        # This method may execute in a worker process, so it returns a summary of
+        # the cluster file rather than the DocscanContainer objects.  The summary
+        # includes each collection's data and csv row, which the parent spills for
+        # the merged dict and csv reports, so it is about the size of the file.
+        dcr = DocscanClusterResult(FS.read_json_utf8(infile))
+        dcr.parse()
+        dc = DocscanCluster(dcr.cluster_name)
+        summary = dict()
+        summary['file'] = infile
+        summary['cluster_name'] = dcr.cluster_name
+        summary['exception'] = None if dcr.successful() else str(dcr.exception)
+        summary['containers'] = list()
+        for dcoll in dcr.collections:
+            dc.add_container(dcoll)
+            summary['containers'].append((dcoll.key, dcoll.largest_doc_size, dcoll.get_data(), dcoll.as_csv()))
+        summary['largest_doc_size'] = dc.largest_doc_size
+        return summary
+
     @classmethod
     def docscan_doc_capture(cls):
         tr = TaskResult('docscan_doc_capture')
         try:
             specs = FS.read_json('current/docscan_capture.json')
-            for spec in specs:
-                dbname   = spec['dbname']
-                cname    = spec['cname']
-                doc_id   = spec['doc_id']
-                conn_str = spec['conn_str']
-                capture  = spec['capture']
-                tr.log('docscan_doc_capture; dbname: {}, cname: {}, doc_id: {}, conn_str: {}'.format(
-                    dbname, cname, doc_id, conn_str))
-
-                outfile = 'tmp/captured_docs/capture-doc-{}-{}-{}.json'.format(dbname, cname, doc_id)
-                coordinates = '{}|{}|{}|{}'.format(dbname, cname, doc_id, conn_str)
-
-                if capture.lower() == 'y':
-                    opts = dict()
-                    opts['conn_string'] = conn_str
-                    opts['verbose'] = False
-                    m = Mongo(opts)
-                    m.set_db(dbname)
-                    m.set_coll(cname)
-                    try:
-                        # first try a find_by_id with doc_id as an ObjectId
-                        doc = m.find_by_id(doc_id)
-                        jstr = json_util.dumps(doc)
-                        obj = json.loads(jstr)
-                        obj['__coordinates__'] = coordinates
-                        obj['__json_size__'] = len(jstr)
-                        FS.write_json(obj, outfile)
-                        tr.log('captured {}'.format(outfile))
-                    except:
-                        # next try a find_by_id with doc_id as a string
-                        query = dict()
-                        query['_id'] = doc_id
-                        doc = m.find_one(query)
-                        jstr = json_util.dumps(doc)
-                        obj = json.loads(jstr)
-                        obj['__coordinates__'] = coordinates
-                        obj['__json_size__'] = len(jstr)
-                        FS.write_json(obj, outfile)
-                        tr.log('captured {}'.format(outfile))
+            if Env.boolean_arg('--batched'):
+                cls.docscan_doc_capture_batched(tr, specs, Env.int_arg('--workers', 8))
+            else:
+                for spec in specs:
+                    dbname   = spec['dbname']
+                    cname    = spec['cname']
+                    doc_id   = spec['doc_id']
+                    conn_str = spec['conn_str']
+                    capture  = spec['capture']
+                    tr.log('docscan_doc_capture; dbname: {}, cname: {}, doc_id: {}, conn_str: {}'.format(
+                        dbname, cname, doc_id, conn_str))
+
+                    outfile = 'tmp/captured_docs/capture-doc-{}-{}-{}.json'.format(dbname, cname, doc_id)
+                    coordinates = '{}|{}|{}|{}'.format(dbname, cname, doc_id, conn_str)
+
+                    if capture.lower() == 'y':
+                        opts = dict()
+                        opts['conn_string'] = conn_str
+                        opts['verbose'] = False
+                        m = Mongo(opts)
+                        m.set_db(dbname)
+                        m.set_coll(cname)
+                        try:
+                            # first try a find_by_id with doc_id as an ObjectId
+                            doc = m.find_by_id(doc_id)
+                            jstr = json_util.dumps(doc)
+                            obj = json.loads(jstr)
+                            obj['__coordinates__'] = coordinates
+                            obj['__json_size__'] = len(jstr)
+                            FS.write_json(obj, outfile)
+                            tr.log('captured {}'.format(outfile))
+                        except:
+                            # next try a find_by_id with doc_id as a string
+                            query = dict()
+                            query['_id'] = doc_id
+                            doc = m.find_one(query)
+                            jstr = json_util.dumps(doc)
+                            obj = json.loads(jstr)
+                            obj['__coordinates__'] = coordinates
+                            obj['__json_size__'] = len(jstr)
+                            FS.write_json(obj, outfile)
+                            tr.log('captured {}'.format(outfile))
 
             tr.set_success(True)
         except Exception as e:
@@ -795,16 +1081,157 @@ class Tasks(object):
             tr.set_success(False)
         return tr
 
+    @classmethod
+    def docscan_doc_capture_batched(cls, tr, specs, workers):
+        # Group the capture specs by (conn_str, dbname, cname) and capture each group with
+        # $in queries, in a thread pool, rather than with one or two queries per document.
+        groups = dict()
+        for spec in specs:
+            if spec['capture'].lower() == 'y':
+                group_key = (spec['conn_str'], spec['dbname'], spec['cname'])
+                if group_key not in groups.keys():
+                    groups[group_key] = list()
+                groups[group_key].append(spec)
+        tr.log('docscan_doc_capture_batched; specs: {}, groups: {}, workers: {}'.format(
+            len(specs), len(groups), workers))
+
+        captured_count, missing_count = 0, 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = list()
+            for group_key in groups.keys():
+                futures.append(pool.submit(cls.docscan_capture_group, tr, group_key, groups[group_key]))
+            for future in as_completed(futures):
+                captured, missing = future.result()
+                captured_count, missing_count = captured_count + captured, missing_count + missing
+        tr.log('docscan_doc_capture_batched; captured: {}, not found: {}'.format(captured_count, missing_count))
+
+    @classmethod
+    def docscan_capture_group(cls, tr, group_key, specs, batch_size=500):
+        # returns a tuple of the captured and not found document counts
+        conn_str, dbname, cname = group_key
+        opts = dict()
+        opts['conn_string'] = conn_str
+        opts['verbose'] = False
+        m = Mongo(opts)
+        # RawBSONDocuments; the BSON size of each document is the length of its raw bytes
+        coll = m.client()[dbname].get_collection(
+            cname, codec_options=CodecOptions(document_class=RawBSONDocument))
+
+        docs = dict()  # key is (str(_id), is_object_id), value is RawBSONDocument
+        doc_ids = [spec['doc_id'] for spec in specs]
+        for idx in range(0, len(doc_ids), batch_size):
+            query = {'_id': {'$in': cls.docscan_id_query_values(doc_ids[idx:idx + batch_size])}}
+            for doc in coll.find(query):
+                doc_id = doc['_id']
+                docs[(str(doc_id), isinstance(doc_id, ObjectId))] = doc
+
+        captured, missing = 0, 0
+        for spec in specs:
+            doc_id = spec['doc_id']
+            coordinates = '{}|{}|{}|{}'.format(dbname, cname, doc_id, conn_str)
+            # as in the unbatched capture, an ObjectId _id takes precedence over a string _id
+            doc = docs.get((str(doc_id), True), docs.get((str(doc_id), False)))
+            if doc is None:
+                tr.log('document not found: {}'.format(coordinates))
+                missing = missing + 1
+            else:
+                outfile = 'tmp/captured_docs/capture-doc-{}-{}-{}.json'.format(dbname, cname, doc_id)
+                FS.write_json(cls.docscan_capture_obj(doc, coordinates), outfile)
+                tr.log('captured {}'.format(outfile))
+                captured = captured + 1
+        return captured, missing
+
+    @classmethod
+    def docscan_id_query_values(cls, doc_ids):
+        # each doc_id may be either an ObjectId or a string _id value
+        values = list()
+        for doc_id in doc_ids:
+            if ObjectId.is_valid(doc_id):
+                values.append(ObjectId(doc_id))
+            values.append(doc_id)
+        return values
+
+    @classmethod
+    def docscan_capture_obj(cls, raw_doc, coordinates):
+        jstr = json_util.dumps(raw_doc)
+        obj = json.loads(jstr)
+        obj['__coordinates__'] = coordinates
+        obj['__json_size__'] = len(jstr)
+        obj['__bson_size__'] = len(raw_doc.raw)
+        return obj
+
 
     # private methods below
 
     @classmethod
-    def _find_file_in_list(cls, filenames, cluster_name, suffix):
-        for filename in filenames:
-            if cluster_name in filename:
-                if suffix in filename:
-                    return filename
-        return None
+    def _write_containers_info(cls, tr, agg):
+        containers_data_list = agg.containers_obj.get_data_list()
+        Datasets.write_aggregated_containers_info_file(containers_data_list)
+        tr.log('containers count: {}'.format(len(containers_data_list)))
+
+        overrides_data = agg.collect_overrides_data(containers_data_list)
+        Datasets.write_mappings_generated_config_file(overrides_data)
+
+    @classmethod
+    def _iterate_mma_json_files(cls, tr, json_file_tasks, cache):
+        # Yield the parsed MMA json file objects, in the sequence of json_file_tasks,
+        # so that serial, parallel, and cached runs produce identical outputs.
+        # Unchanged files are read from the optional cache, the others are parsed
+        # serially or with a process pool.
+        file_sizes, cached, uncached_tasks = dict(), dict(), list()
+        for json_file_task in json_file_tasks:
+            fqname = json_file_task[1]['full']
+            if cache is None:
+                uncached_tasks.append(json_file_task)
+            else:
+                stat = os.stat(fqname)
+                data = cache.lookup(fqname, stat.st_mtime, stat.st_size)
+                if data is None:
+                    file_sizes[fqname] = stat.st_size
+                    uncached_tasks.append(json_file_task)
+                else:
+                    cached[fqname] = cls.mma_json_file_object(json_file_task, stat.st_mtime, data)
+
+        if Env.boolean_arg('--parallel'):
+            workers = Env.int_arg('--workers', os.cpu_count())
+            tr.log('parsing {} json files with {} worker processes'.format(len(uncached_tasks), workers))
+            with multiprocessing.Pool(processes=workers) as pool:
+                # imap, unlike imap_unordered, returns the objects in the task sequence
+                parsed = pool.imap(cls.read_mma_json_file, uncached_tasks, chunksize=8)
+                for obj in cls.__merge_mma_json_file_objects(json_file_tasks, cached, parsed, cache, file_sizes):
+                    yield obj
+        else:
+            parsed = map(cls.read_mma_json_file, uncached_tasks)
+            for obj in cls.__merge_mma_json_file_objects(json_file_tasks, cached, parsed, cache, file_sizes):
+                yield obj
+
+    @classmethod
+    def __merge_mma_json_file_objects(cls, json_file_tasks, cached, parsed, cache, file_sizes):
+        # parsed is an iterator of the uncached objects, in task sequence
+        for json_file_task in json_file_tasks:
+            fqname = json_file_task[1]['full']
+            if fqname in cached.keys():
+                yield cached[fqname]
+            else:
+                obj = next(parsed)
+                cls.__cache_mma_json_file_object(cache, file_sizes, obj)
+                yield obj
+
+    @classmethod
+    def __cache_mma_json_file_object(cls, cache, file_sizes, obj):
+        if cache is not None:
+            fqname = obj['_file_name']
+            cache.store(fqname, obj['_file_mtime'], file_sizes[fqname], obj['data'])
+
+    @classmethod
+    def _write_aggregated_mma_objects(cls, mma_objects, output_format):
+        if output_format == 'jsonl':
+            return Datasets.write_aggregated_mma_output_jsonl_stream(mma_objects)
+        elif output_format.startswith('jsonl.'):
+            compression = output_format.split('.')[1]
+            return Datasets.write_aggregated_mma_output_jsonl_stream(mma_objects, compression)
+        else:
+            return Datasets.write_aggregated_mma_output_stream(mma_objects)
 
     @classmethod
     def __parse_assessment_name_and_id(cls, file_info):
@@ -0,0 +1,94 @@
+
+import pytest
+import datetime
+import json
+
+import re
+import zipfile
+
+from openpyxl import Workbook
+
+from pysrc.cluster_spreadsheet import ClusterSpreadsheet
+
+def create_workbook(outfile, url_column):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Sheet1'
+    ws.append(['header'] * 30)
+    for i in range(4):
+        row = [None] * 29
+        row[3], row[4], row[5] = 'bar', 'prod', 'cluster {}'.format(i)
+        row[url_column - 1] = 'mongodb+srv://host{}.example.com'.format(i)
+        row[27] = 'cosmos{}'.format(i)
+        ws.append(row)
+    wb.save(outfile)
+
+def test_rows_skip_the_header_and_last_row(tmp_path):
+    infile = str(tmp_path / 'clusters.xlsx')
+    create_workbook(infile, 12)
+    sheet = ClusterSpreadsheet(infile)
+    rows = list(sheet.rows())
+    assert(len(rows) == 3)
+    assert(sheet.row_count == 5)
+    assert(rows[0]['cname'] == 'cluster0')
+    assert(rows[2]['url'] == 'mongodb+srv://host2.example.com')
+    assert(rows[2]['cosmos'] == 'cosmos2')
+    assert(rows[2]['vcore'] == 'None')
+
+def set_dimension(infile, outfile, ref):
+    # rewrite the worksheet dimension record, as some tools leave it stale
+    with zipfile.ZipFile(infile) as zin, zipfile.ZipFile(outfile, 'w') as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename)
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                data = re.sub(rb'<dimension ref="[^"]*"', '<dimension ref="{}"'.format(ref).encode(), data)
+            zout.writestr(item, data)
+
+def test_rows_ignore_a_stale_dimension(tmp_path):
+    infile = str(tmp_path / 'clusters.xlsx')
+    stale_file = str(tmp_path / 'stale.xlsx')
+    create_workbook(infile, 12)
+    set_dimension(infile, stale_file, 'A1:A1')
+    sheet = ClusterSpreadsheet(stale_file)
+    rows = list(sheet.rows())
+    assert(len(rows) == 3)
+    assert(sheet.row_count == 5)
+    assert(rows[0]['cname'] == 'cluster0')
+    assert(rows[2]['cosmos'] == 'cosmos2')
+
+def test_rows_skip_trailing_empty_rows(tmp_path):
+    infile = str(tmp_path / 'clusters.xlsx')
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Sheet1'
+    ws.append(['header'] * 30)
+    ws.append([None, None, None, 'bar', 'prod', 'cluster0'])
+    ws.append([])
+    ws.append([None, None, None, 'bar', 'prod', 'cluster2'])
+    ws.append([None, None, None, 'bar', 'prod', 'last'])
+    ws.cell(row=9, column=2).style = 'Note'  # a formatted but empty cell
+    wb.save(infile)
+    sheet = ClusterSpreadsheet(infile)
+    rows = list(sheet.rows())
+    assert(sheet.row_count == 5)
+    assert([row['cname'] for row in rows] == ['cluster0', 'None', 'cluster2'])
+
+def test_column_map_override(tmp_path):
+    infile = str(tmp_path / 'clusters.xlsx')
+    create_workbook(infile, 13)
+    sheet = ClusterSpreadsheet(infile, column_map={'url': 'm'})
+    rows = list(sheet.rows())
+    assert(sheet.column_map['cname'] == 'F')
+    assert(rows[1]['url'] == 'mongodb+srv://host1.example.com')
+
+def test_cache(tmp_path):
+    infile = str(tmp_path / 'clusters.xlsx')
+    cache_file = str(tmp_path / 'cache.json')
+    create_workbook(infile, 12)
+    sheet = ClusterSpreadsheet(infile)
+    key = sheet.cache_key('user:pass')
+    assert(sheet.read_cache(key, cache_file) == None)
+    sheet.write_cache(key, {'org': {'source': 's', 'target': 't'}}, ['u'], cache_file)
+    assert(sheet.read_cache(key, cache_file)['clusters']['org']['target'] == 't')
+    assert(sheet.read_cache(sheet.cache_key('other:cred'), cache_file) == None)
+    assert(ClusterSpreadsheet(infile, column_map={'url': 'M'}).cache_key('user:pass') != key)
@@ -0,0 +1,59 @@
+
+import pytest
+import datetime
+import json
+
+from pysrc.aggregators import ContainersAggregator
+from pysrc.dispatcher import MmaDispatcher
+from pysrc.indices import Indices
+from pysrc.mma_files import MmaFiles
+from pysrc.shards import Shards
+
+mma_dir = '/Users/x/AppData/Local/Temp/MongoMigrationAssessment/uuid1'
+
+def mma_objects():
+    objects = list()
+    obj = dict()
+    obj['_file_name'] = '{}/Collector/collection_metadata/db1_c1.json'.format(mma_dir)
+    obj['_cluster'] = 'cluster1'
+    obj['data'] = {'db_name': 'db1', 'collection_metadata': {'name': 'c1', 'stats': {'size_in_bytes': 100}}}
+    objects.append(obj)
+    obj = dict()
+    obj['_file_name'] = '{}/shard_keys.json'.format(mma_dir)
+    obj['_cluster'] = 'cluster1'
+    obj['data'] = {'shard_keys': [
+        {'namespace': 'db1.c1', 'key': {'pk': 1}, 'is_unique': False, 'is_dropped': False}]}
+    objects.append(obj)
+    obj = dict()
+    obj['_file_name'] = '{}/index_metadata/db1_c1.json'.format(mma_dir)
+    obj['_cluster'] = 'cluster1'
+    obj['data'] = {'db_name': 'db1', 'collection_name': 'c1', 'indexes': [{'name': '_id_'}]}
+    objects.append(obj)
+    obj = dict()
+    obj['_file_name'] = '{}/instance_detail.json'.format(mma_dir)
+    obj['_cluster'] = 'cluster1'
+    obj['data'] = dict()
+    objects.append(obj)
+    return objects
+
+def test_classify():
+    types = [MmaFiles.classify(obj['_file_name']) for obj in mma_objects()]
+    assert(types == [
+        MmaFiles.COLLECTION_METADATA, MmaFiles.SHARD_KEYS, MmaFiles.INDEX_METADATA, MmaFiles.OTHER])
+    assert(MmaFiles.classify('{}/index_advisor_report.json'.format(mma_dir)) == MmaFiles.INDEX_ADVISOR_REPORT)
+    assert(MmaFiles.classify('{}/report.html'.format(mma_dir)) == MmaFiles.OTHER)
+
+def test_single_pass_matches_individual_extractors():
+    agg, shards, indices = ContainersAggregator(), Shards(), Indices()
+    dispatcher = MmaDispatcher()
+    dispatcher.register(agg)
+    dispatcher.register(shards)
+    dispatcher.register(indices)
+    assert(dispatcher.dispatch(iter(mma_objects())) == 4)
+
+    expected_agg = ContainersAggregator(mma_objects())
+    assert(agg.containers_obj.get_data_list() == expected_agg.containers_obj.get_data_list())
+    assert(agg.containers_obj.count() == 1)
+    assert('cluster1|db1|c1' in shards.aggregated_shard_keys.keys())
+    assert(shards.cluster_file_counter.get_data() == {'cluster1': 4})
+    assert(len(indices.aggregated_index_info['cluster1|db1|c1']) == 1)
@@ -0,0 +1,266 @@
+
+import pytest
+import datetime
+import json
+
+from bson import encode
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+
+from pysrc.docscan import DocscanClusterResult
+from pysrc.docscanner import DocScanner
+
+class FakeCollection(object):
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def estimated_document_count(self):
+        return len(self.docs)
+
+    def find(self, query, batch_size=None):
+        return iter(self.docs)
+
+class FakeDatabase(object):
+
+    def __init__(self, collections):
+        self.collections = collections
+
+    def list_collection_names(self, filter=None):
+        return list(self.collections.keys())
+
+    def get_collection(self, name, codec_options=None):
+        return self.collections[name]
+
+class FakeClient(object):
+
+    def __init__(self, databases):
+        self.databases = databases
+
+    def list_database_names(self):
+        return list(self.databases.keys())
+
+    def __getitem__(self, name):
+        return self.databases[name]
+
+def raw_docs(sizes):
+    return [RawBSONDocument(encode({'_id': ObjectId(), 'data': 'x' * size})) for size in sizes]
+
+def test_scan():
+    big = raw_docs([5000])[0]
+    docs = raw_docs(range(0, 300, 10)) + [big] + raw_docs([20])
+    client = FakeClient({
+        'admin': FakeDatabase({'c': FakeCollection(raw_docs([1]))}),
+        'db1': FakeDatabase({'c1': FakeCollection(docs), 'c2': FakeCollection([]), 'system.views': None})})
+    scanner = DocScanner('cluster1', 'mongodb://localhost:27017', workers=2, top_n=3)
+    scanner.client = client
+    result = scanner.scan()
+
+    assert(result['clusterName'] == 'cluster1')
+    assert(list(result['containerInfo'].keys()) == ['db1|c1', 'db1|c2'])
+    info = result['containerInfo']['db1|c1']
+    assert(info['iteratedDocumentCount'] == 32)
+    assert(info['largestSize'] == len(big.raw))
+    assert(info['largestDocJsonPrefix'] == '{"_id": {"$oid": "' + str(big['_id']) + '"}, "data": "xxxxx')
+    assert([d['size'] for d in info['largestDocuments']] == [len(big.raw), len(docs[29].raw), len(docs[28].raw)])
+    assert(result['containerInfo']['db1|c2']['largestSize'] == 0)
+
+    dcr = DocscanClusterResult(json.loads(json.dumps(result)))
+    dcr.parse()
+    assert(dcr.successful())
+    assert(dcr.collections[0].key == 'cluster1|db1|c1')
+    assert(dcr.collections[0].parse_id() == str(big['_id']))
+
+class FailingCollection(FakeCollection):
+
+    # the cursor fails after the given number of documents
+    def __init__(self, docs, fail_after):
+        FakeCollection.__init__(self, docs)
+        self.fail_after = fail_after
+
+    def find(self, query, batch_size=None):
+        from pymongo.errors import AutoReconnect
+        for idx, doc in enumerate(self.docs):
+            if idx == self.fail_after:
+                raise AutoReconnect('connection closed')
+            yield doc
+
+def test_scan_collection_prefixes_and_failures():
+    docs = raw_docs(range(0, 3000, 100))
+    scanner = DocScanner('cluster1', 'mongodb://localhost:27017', top_n=3)
+    scanner.client = FakeClient({'db1': FakeDatabase({'c1': FakeCollection(docs), 'c2': FailingCollection(docs, 10)})})
+    prefixed = list()
+    json_prefix = scanner.json_prefix
+    scanner.json_prefix = lambda doc: prefixed.append(doc) or json_prefix(doc)
+
+    # the documents grow in size, so each enters the heap; only the final top 3 are decoded
+    info = scanner.scan_collection('db1', 'c1')
+    assert(len(prefixed) == 3)
+    assert(info['complete'] == True)
+    assert(info['exceptions'] == [])
+
+    info = scanner.scan_collection('db1', 'c2')
+    assert(info['complete'] == False)
+    assert(info['exceptions'] == ['connection closed'])
+    assert(info['iteratedDocumentCount'] == 10)
+    assert(info['largestSize'] == len(docs[9].raw))
+
+    from pysrc.docscan import DocscanContainer
+    dc = DocscanContainer('cluster1', json.loads(json.dumps(info)))
+    assert(dc.as_csv().endswith(',no'))
+    assert(DocscanContainer.csv_header().endswith(',complete'))
+
+def test_json_prefix():
+    scanner = DocScanner('cluster1', 'mongodb://localhost:27017')
+    doc = RawBSONDocument(encode({'_id': 'k1', 'n': 1}))
+    assert(scanner.json_prefix(doc) == '{"_id": "k1", "n": 1}')
+    doc = RawBSONDocument(encode({'_id': 'k1', 's': '\u00e9"' * 100000}))
+    assert(scanner.json_prefix(doc) == ('{"_id": "k1", "s": "' + '\\u00e9\\"' * 10)[:DocScanner.JSON_PREFIX_LENGTH])
+
+class FakeSampledCollection(object):
+
+    # simulates $sample and $bsonSize; sizes is the list of (_id, size) in the collection
+    def __init__(self, sizes, bson_size_supported=True):
+        self.sizes = sizes
+        self.bson_size_supported = bson_size_supported
+        self.full_name = 'db1.c1'
+
+    def estimated_document_count(self):
+        return len(self.sizes) * 1000
+
+    def aggregate(self, pipeline, batchSize=None):
+        from pymongo.errors import OperationFailure
+        if '$match' in pipeline[0]:
+            return [{'_id': i, 'size': size} for i, size in self.sizes if size > DocScanner.OVERSIZE_BYTES]
+        if len(pipeline) > 1:
+            if not self.bson_size_supported:
+                raise OperationFailure('Unrecognized expression $bsonSize')
+            return [{'_id': i, 'size': size} for i, size in self.sizes]
+        return [RawBSONDocument(encode({'_id': i, 'data': 'x' * size})) for i, size in self.sizes]
+
+def test_sample_collection():
+    sizes = [(i, 1000 + i) for i in range(99)] + [(99, 3000000)]
+    scanner = DocScanner('cluster1', 'mongodb://localhost:27017', top_n=3, sample_size=100, find_oversize=True)
+    scanner.client = FakeClient({'db1': FakeDatabase({'c1': FakeSampledCollection(sizes)})})
+    info = scanner.sample_collection('db1', 'c1')
+    assert(info['iteratedDocumentCount'] == 100)
+    assert(info['sizePercentiles'] == {'p50': 1049, 'p95': 1094, 'p99': 1098, 'max': 3000000})
+    assert(info['over2mbSampleCount'] == 1)
+    assert(info['over2mbEstimatedCount'] == 1000)
+    assert(info['over2mbEstimatedCountLow'] < 1000 < info['over2mbEstimatedCountHigh'])
+    assert(info['oversizeDocumentCount'] == 1)
+    assert(info['largestSize'] == 3000000)
+    assert(info['largestDocJsonPrefix'] == '{"_id": 99}')
+    assert([d['size'] for d in info['largestDocuments']] == [3000000, 1098, 1097])
+
+    from pysrc.docscan import DocscanContainer
+    dc = DocscanContainer('cluster1', json.loads(json.dumps(info)))
+    assert(dc.doc_count == 100000)
+    assert(dc.over_2mb() == 'yes')
+
+def test_sample_collection_long_ids():
+    # the ids share their first JSON_PREFIX_LENGTH characters
+    sizes = [('k' * 100 + str(i), 1000 + i) for i in range(5)]
+    scanner = DocScanner('cluster1', 'mongodb://localhost:27017', top_n=3, sample_size=5)
+    scanner.client = FakeClient({'db1': FakeDatabase({'c1': FakeSampledCollection(sizes)})})
+    info = scanner.sample_collection('db1', 'c1')
+    assert([d['size'] for d in info['largestDocuments']] == [1004, 1003, 1002])
+    assert(info['largestDocJsonPrefix'] == scanner.id_json_prefix(sizes[4][0]))
+
+def test_sample_and_server_side_are_exclusive():
+    with pytest.raises(ValueError):
+        DocScanner('cluster1', 'mongodb://localhost:27017', sample_size=10, server_side=True)
+
+def test_sample_collection_without_bson_size():
+    sizes = [(i, 100) for i in range(10)]
+    scanner = DocScanner('cluster1', 'mongodb://localhost:27017', sample_size=10)
+    scanner.client = FakeClient({'db1': FakeDatabase({'c1': FakeSampledCollection(sizes, False)})})
+    info = scanner.sample_collection('db1', 'c1')
+    assert(info['iteratedDocumentCount'] == 10)
+    assert(info['sizePercentiles']['max'] > 100)
+    assert(info['over2mbSampleCount'] == 0)
+    assert(info['over2mbEstimatedCountLow'] == 0)
+    assert(info['exceptions'] == [])
+
+def test_wilson_interval():
+    low, high = DocScanner.wilson_interval(0, 1000, DocScanner.Z_95)
+    assert(low == 0.0)
+    assert(0.003 < high < 0.004)
+    low, high = DocScanner.wilson_interval(50, 100, DocScanner.Z_95)
+    assert(0.40 < low < 0.41 and 0.59 < high < 0.60)
+
+class FakeServerSideCollection(FakeCollection):
+
+    # simulates the $project/$facet pipeline, or a server without $bsonSize
+    def __init__(self, docs, bson_size_supported=True):
+        FakeCollection.__init__(self, docs)
+        self.bson_size_supported = bson_size_supported
+
+    def aggregate(self, pipeline):
+        from pymongo.errors import OperationFailure
+        if not self.bson_size_supported:
+            raise OperationFailure('Unrecognized expression $bsonSize')
+        sized = [{'_id': d['_id'], 's': len(d.raw)} for d in self.docs]
+        threshold = DocScanner.OVERSIZE_BYTES
+        facet = pipeline[1]['$facet']
+        result = dict()
+        result['stats'] = [{'_id': None, 'n': len(sized), 'over': len([d for d in sized if d['s'] > threshold])}]
+        result['largest'] = sorted(sized, key=lambda d: -d['s'])[:facet['largest'][1]['$limit']]
+        result['oversize'] = [d for d in sized if d['s'] > threshold]
+        return [result]
+
+def test_server_side_collection():
+    docs = raw_docs([10, 3000000, 20, 2500000])
+    for supported in [True, False]:
+        coll = FakeServerSideCollection(docs, supported)
+        scanner = DocScanner('cluster1', 'mongodb://localhost:27017', top_n=2, server_side=True)
+        scanner.client = FakeClient({'db1': FakeDatabase({'c1': coll})})
+        info = scanner.server_side_collection('db1', 'c1')
+        assert(info['detection'] == ('server' if supported else 'client'))
+        assert(info['iteratedDocumentCount'] == 4)
+        assert(info['largestSize'] == len(docs[1].raw))
+        assert(info['largestDocJsonPrefix'].startswith('{"_id": {"$oid": "' + str(docs[1]['_id'])))
+        assert([d['size'] for d in info['largestDocuments']] == [len(docs[1].raw), len(docs[3].raw)])
+        if supported:
+            assert(info['oversizeDocumentCount'] == 2)
+            assert(len(info['oversizeDocuments']) == 2)
+
+class FailingServerSideCollection(FakeServerSideCollection):
+
+    def __init__(self, docs, error):
+        FakeServerSideCollection.__init__(self, docs)
+        self.error = error
+
+    def aggregate(self, pipeline):
+        raise self.error
+
+    def find(self, query, batch_size=None):
+        raise AssertionError('unexpected client-side scan')
+
+def test_server_side_collection_errors():
+    from pymongo.errors import AutoReconnect, ExecutionTimeout, OperationFailure
+    docs = raw_docs([10, 20])
+    errors = [
+        OperationFailure('not authorized on db1 to execute command', 13),
+        OperationFailure('Exceeded memory limit for $group', 16945),
+        ExecutionTimeout('operation exceeded time limit', 50),
+        AutoReconnect('connection closed')]
+    collections = dict()
+    for idx, error in enumerate(errors):
+        collections['c{}'.format(idx)] = FailingServerSideCollection(docs, error)
+    collections['c9'] = FailingServerSideCollection(docs, OperationFailure('Invalid $project :: caused by :: x', 168))
+    collections['c9'].find = lambda query, batch_size=None: iter(docs)
+    scanner = DocScanner('cluster1', 'mongodb://localhost:27017', workers=2, server_side=True)
+    scanner.client = FakeClient({'db1': FakeDatabase(collections)})
+    result = scanner.scan()
+
+    assert(len(result['containerInfo']) == 5)
+    for idx, error in enumerate(errors):
+        info = result['containerInfo']['db1|c{}'.format(idx)]
+        assert(info['detection'] == 'server')
+        assert(info['complete'] == False)
+        assert(info['exceptions'] == [str(error)])
+    info = result['containerInfo']['db1|c9']
+    assert(info['detection'] == 'client')
+    assert(info['complete'] == True)
+    assert(info['iteratedDocumentCount'] == 2)
@@ -8,3 +8,10 @@ from pysrc.env import Env
 def test_username():
     username = Env.username()
     assert(username != None)
+
+def test_int_arg(monkeypatch):
+    monkeypatch.setattr('sys.argv', ['main.py', 'func', '--workers', '8', '--bad', 'x', '--last'])
+    assert(Env.int_arg('--workers', 1) == 8)
+    assert(Env.int_arg('--bad', 1) == 1)
+    assert(Env.int_arg('--last', 2) == 2)
+    assert(Env.int_arg('--missing', 3) == 3)
@@ -8,3 +8,51 @@ from pysrc.fs import FS
 def test_read():
     s = FS.read('templates/bicep_params_sample.jinga2')
     assert('https://schema.management.azure.com/schemas/2019-04-01/deploymentParameters.json#' in s)
+
+def test_write_json_list_stream(tmp_path):
+    outfile = str(tmp_path / 'stream.json')
+    objects = ({'idx': i} for i in range(3))
+    count = FS.write_json_list_stream(objects, outfile, verbose=False)
+    assert(count == 3)
+    assert(FS.read_json(outfile) == [{'idx': 0}, {'idx': 1}, {'idx': 2}])
+
+def test_write_json_list_stream_empty(tmp_path):
+    outfile = str(tmp_path / 'empty.json')
+    count = FS.write_json_list_stream(iter([]), outfile, verbose=False)
+    assert(count == 0)
+    assert(FS.read_json(outfile) == [])
+
+def test_jsonl_stream_round_trip(tmp_path):
+    for filename in ['records.jsonl', 'records.jsonl.gz']:
+        outfile = str(tmp_path / filename)
+        objects = [{'_file_name': 'a.json', '_cluster': 'c1', 'data': {'n': i}} for i in range(3)]
+        count = FS.write_jsonl_stream(iter(objects), outfile, verbose=False)
+        assert(count == 3)
+        assert(list(FS.read_jsonl(outfile)) == objects)
+
+def test_write_json_dict_stream(tmp_path):
+    obj = {'c1|db|a': {'largestSize': 10, 'sizes': [1, 2]}, 'c1|db|b': {}}
+    for pretty in [True, False]:
+        outfile, expected = str(tmp_path / 'stream.json'), str(tmp_path / 'expected.json')
+        count = FS.write_json_dict_stream(iter(obj.items()), outfile, pretty=pretty, verbose=False)
+        FS.write_json(obj, expected, pretty=pretty, verbose=False)
+        assert(count == 2)
+        assert(FS.read(outfile) == FS.read(expected))
+
+def test_read_json_list_stream(tmp_path):
+    objects = [{'idx': i, 's': 'x, ] [' * i, 'n': [1.5, -2, None]} for i in range(20)] + [12345, 'z']
+    for pretty in [True, False]:
+        outfile = str(tmp_path / 'stream.json')
+        FS.write_json_list_stream(iter(objects), outfile, pretty=pretty, verbose=False)
+        for chunk_size in [1, 7, 1024 * 1024]:
+            assert(list(FS.read_json_list_stream(outfile, chunk_size=chunk_size)) == objects)
+    FS.write_json_list_stream(iter([]), outfile, verbose=False)
+    assert(list(FS.read_json_list_stream(outfile)) == [])
+
+def test_read_json_list_stream_large_elements(tmp_path):
+    # elements much larger than the chunk size, with escapes and brackets in strings
+    objects = [{'s': '\\"]}[{,' * 20000, 'n': [[i], {'k': 'v'}]} for i in range(3)] + ['a"b\\', 1.5, None]
+    outfile = str(tmp_path / 'large.json')
+    FS.write_json_list_stream(iter(objects), outfile, pretty=False, verbose=False)
+    for chunk_size in [1, 3, 64, 1024 * 1024]:
+        assert(list(FS.read_json_list_stream(outfile, chunk_size=chunk_size)) == objects)
@@ -0,0 +1,43 @@
+
+import pytest
+import datetime
+import json
+
+from pysrc.index_comparison import IndexComparison
+
+def id_index():
+    return {'v': 2, 'key': [['_id', 1]]}
+
+def combined_dict():
+    combined = dict()
+    combined['source'] = {
+        'db1': {
+            'c1': {'_id_': id_index(), 'a_1': {'v': 2, 'key': [['a', 1]]},
+                   'ttl': {'v': 2, 'key': [['ts', 1]], 'expireAfterSeconds': 60}},
+            'c2': {'_id_': id_index(), 'b_1': {'v': 2, 'key': [['b', 1]]}},
+            'c3': {'_id_': id_index()}},
+        'other': {'x': {'_id_': id_index()}}}
+    combined['target'] = {
+        'db1': {
+            'c1': {'_id_': id_index(), 'a_1': {'v': 1, 'key': [['a', 1.0]], 'background': True},
+                   'ttl': {'v': 2, 'key': [['ts', 1]], 'expireAfterSeconds': 3600}},
+            'c2': {'_id_': id_index(), 'b_1_renamed': {'v': 2, 'key': [['b', 1]]}, 'z_1': {'key': [['z', 1]]}},
+            'c4': None}}
+    return combined
+
+def test_compare():
+    comparison = IndexComparison(combined_dict(), 'db@', 'all')
+    diffs = comparison.compare()
+    actual = [(d['db'], d['coll'], d['index_name'], d['status']) for d in diffs]
+    assert(actual == [
+        ('db1', 'c1', 'ttl', IndexComparison.DEFINITION_MISMATCH),
+        ('db1', 'c2', 'b_1', IndexComparison.NAME_MISMATCH),
+        ('db1', 'c2', 'z_1', IndexComparison.INDEX_NOT_IN_SOURCE),
+        ('db1', 'c3', '', IndexComparison.COLL_NOT_IN_TARGET),
+        ('db1', 'c4', '', IndexComparison.COLL_NOT_IN_SOURCE)])
+    summary = comparison.summary()
+    assert(summary['matched_indexes'] == 3)
+    assert(summary['diff_count'] == 5)
+    assert(len(comparison.csv_rows()) == 5)
+    report = comparison.diffs_report()
+    assert(len(report['definitions']) == 4)
@@ -0,0 +1,47 @@
+
+import pytest
+import datetime
+import json
+import os
+import time
+
+from pysrc.fs import FS
+from pysrc.index_fingerprint import IndexFingerprint, IndexFingerprintRegistry
+
+def test_fingerprint_ignores_version_namespace_and_name():
+    idx1 = {'v': 2, 'key': [['customer_id', 1], ['date', -1]], 'name': 'cust_date', 'ns': 'db1.orders'}
+    idx2 = {'v': 1, 'key': [['customer_id', 1.0], ['date', -1.0]], 'name': 'customer_id_1_date_-1'}
+    idx3 = {'v': 2, 'key': [['date', -1], ['customer_id', 1]], 'name': 'cust_date'}
+    idx4 = {'v': 2, 'key': [['customer_id', 1], ['date', -1]], 'name': 'cust_date', 'unique': True}
+    fp = IndexFingerprint.fingerprint(idx1)
+    assert(len(fp) == 40)
+    assert(fp == IndexFingerprint.fingerprint(idx2))
+    assert(fp != IndexFingerprint.fingerprint(idx3))
+    assert(fp != IndexFingerprint.fingerprint(idx4))
+
+def write_cluster_file(infile, host, indexes):
+    FS.write_json({'idx': 0, 'host': host, 'indexes': indexes}, infile, verbose=False)
+
+def test_registry_is_incremental(tmp_path):
+    id_index = {'v': 2, 'key': [['_id', 1]], 'name': '_id_'}
+    ttl_index = {'v': 2, 'key': [['ts', 1]], 'name': 'ts_1', 'expireAfterSeconds': 3600}
+    fp_id, fp_ttl = IndexFingerprint.fingerprint(id_index), IndexFingerprint.fingerprint(ttl_index)
+    file1, file2 = str(tmp_path / 'host1.json'), str(tmp_path / 'host2.json')
+    write_cluster_file(file1, 'host1', {'db1|c1': {'_id_': id_index, 'ts_1': ttl_index}, 'db1|c2': {'pending': True}})
+    write_cluster_file(file2, 'host2', {'db2|c1': {'_id_': id_index}})
+
+    registry = IndexFingerprintRegistry()
+    assert(registry.refresh(str(tmp_path)) == 2)
+    assert(registry.counts() == {fp_id: 2, fp_ttl: 1})
+    assert([o['host'] for o in registry.where(fp_ttl[:8])] == ['host1'])
+
+    registry_file = str(tmp_path / 'registry.dat')
+    registry.save(registry_file)
+    registry = IndexFingerprintRegistry.load(registry_file)
+    assert(registry.refresh(str(tmp_path)) == 0)
+
+    write_cluster_file(file1, 'host1', {'db1|c1': {'_id_': id_index}})
+    os.utime(file1, (time.time() + 10, time.time() + 10))
+    assert(registry.refresh(str(tmp_path)) == 1)
+    assert(registry.counts() == {fp_id: 2})
+    assert(registry.where(fp_ttl) == [])
@@ -0,0 +1,111 @@
+
+import pytest
+import datetime
+import json
+
+import asyncio
+import threading
+import time
+
+import indexes2
+
+CLUSTERS = dict()
+CLUSTERS['source'] = {
+    'admin': {'system.version': {'_id_': {'v': 2, 'key': [['_id', 1]]}}},
+    'db1': {
+        'c1': {'_id_': {'v': 2, 'key': [['_id', 1]]}, 'a_1': {'v': 2, 'key': [['a', 1]]}},
+        'c2': {'_id_': {'v': 2, 'key': [['_id', 1]]}},
+        'c3': None},  # index_information fails
+    'db2': {
+        'c4': {'_id_': {'v': 2, 'key': [['_id', 1]]}},
+        'c5': {'_id_': {'v': 2, 'key': [['_id', 1]]}, 'b_-1': {'v': 2, 'key': [['b', -1]]}},
+        'c6': {'_id_': {'v': 2, 'key': [['_id', 1]]}}}}
+CLUSTERS['target'] = {
+    'db1': {
+        'c1': {'_id_': {'v': 2, 'key': [['_id', 1]]}},
+        'c2': {'_id_': {'v': 2, 'key': [['_id', 1]]}, 'x_1': {'v': 2, 'key': [['x', 1]]}}},
+    'db2': {
+        'c4': None,
+        'c5': {'_id_': {'v': 2, 'key': [['_id', 1]]}},
+        'c7': {'_id_': {'v': 2, 'key': [['_id', 1]]}}}}
+
+class StubMongo(object):
+    """ a thread-safe stand-in for pysrc.mongo.Mongo which records its peak concurrency """
+
+    instances = dict()
+
+    def __init__(self, opts):
+        self.dbs = CLUSTERS[opts['conn_string']]
+        self.db = None
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        StubMongo.instances.setdefault(opts['conn_string'], list()).append(self)
+
+    def request(self, result):
+        with self.lock:
+            self.in_flight = self.in_flight + 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight = self.in_flight - 1
+        return result
+
+    def list_databases(self):
+        return self.request(sorted(self.dbs.keys()))
+
+    def set_db(self, dbname):
+        self.db = dbname
+
+    def list_collections(self):
+        return list(self.dbs[self.db].keys())
+
+    def get_coll_indexes(self, cname):
+        return self.dbs[self.db][cname]
+
+    def list_db_collections(self, dbname):
+        return self.request(list(self.dbs[dbname].keys()))
+
+    def get_db_coll_indexes(self, dbname, cname):
+        return self.request(self.dbs[dbname][cname])
+
+def test_collect_indexes_async(monkeypatch, tmp_path):
+    monkeypatch.setattr(indexes2, 'Mongo', StubMongo)
+    monkeypatch.setattr(indexes2.sys, 'argv', ['indexes2.py', 'compare', 'key', 'all', 'all'])
+    StubMongo.instances = dict()
+
+    expected = dict()
+    expected['source'] = indexes2.collect_indexes('key', 'source', 'source', 'all', 'all')
+    expected['target'] = indexes2.collect_indexes('key', 'target', 'target', 'all', 'all')
+    assert('admin' not in expected['source'].keys())
+    assert(expected['source']['db1']['c3'] == None)
+    assert(expected['target']['db2']['c4'] == None)
+
+    StubMongo.instances = dict()
+    outfile = str(tmp_path / 'indexes_key_all_all.jsonl')
+    combined_dict = asyncio.run(indexes2.capture_source_target_async(
+        'source', 'target', 'all', 'all', outfile, 2))
+    assert(combined_dict == expected)
+    assert(list(combined_dict['source']['db1'].keys()) == ['c1', 'c2', 'c3'])
+    assert(indexes2.read_captured_file(outfile) == expected)
+
+    for side in ['source', 'target']:
+        assert(len(StubMongo.instances[side]) == 1)
+        assert(StubMongo.instances[side][0].max_in_flight == 2)
+
+    lines = [json.loads(line) for line in open(outfile, 'rt')]
+    assert({'side': 'source', 'db': 'db1', 'coll': 'c3', 'indexes': None} in lines)
+    assert({'side': 'target', 'db': 'db2', 'coll': 'c4', 'indexes': None} in lines)
+
+def test_collect_indexes_async_filters(monkeypatch, tmp_path):
+    monkeypatch.setattr(indexes2, 'Mongo', StubMongo)
+    monkeypatch.setattr(indexes2.sys, 'argv', ['indexes2.py', 'compare', 'key', 'db2', 'c@'])
+    StubMongo.instances = dict()
+    outfile = str(tmp_path / 'indexes_key_db2.jsonl')
+    combined_dict = asyncio.run(indexes2.capture_source_target_async(
+        'source', 'target', 'db2', 'c@', outfile, 1))
+    assert(sorted(combined_dict['source'].keys()) == ['db2'])
+    assert(sorted(combined_dict['target']['db2'].keys()) == ['c4', 'c5', 'c7'])
+    assert(indexes2.read_captured_file(outfile) == combined_dict)
+    for side in ['source', 'target']:
+        assert(StubMongo.instances[side][0].max_in_flight == 1)
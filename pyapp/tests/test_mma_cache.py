@@ -0,0 +1,38 @@
+
+import pytest
+import datetime
+import json
+
+from pysrc.mma_cache import MmaRecordCache
+
+def test_lookup_store_and_prune(tmp_path):
+    cache = MmaRecordCache(str(tmp_path / 'cache.db'))
+    assert(cache.lookup('a.json', 1.5, 10) == None)
+    cache.store('a.json', 1.5, 10, {'db_name': 'db1'})
+    cache.store('b.json', 2.5, 20, [1, 2])
+    assert(cache.lookup('a.json', 1.5, 10) == {'db_name': 'db1'})
+    assert(cache.lookup('a.json', 1.6, 10) == None)  # modified
+    assert(cache.lookup('a.json', 1.5, 11) == None)  # resized
+    assert(cache.hits == 1)
+    assert(cache.misses == 3)
+    assert(cache.prune(['a.json']) == 1)
+    cache.close()
+
+    cache = MmaRecordCache(str(tmp_path / 'cache.db'))
+    assert(cache.count() == 1)
+    assert(cache.lookup('a.json', 1.5, 10) == {'db_name': 'db1'})
+    cache.close()
+
+def test_periodic_commit_and_corrupt_entry(tmp_path):
+    db_filename = str(tmp_path / 'cache.db')
+    cache = MmaRecordCache(db_filename)
+    for i in range(MmaRecordCache.COMMIT_INTERVAL):
+        cache.store('{}.json'.format(i), 1.0, i, {'n': i})
+    # not closed, as after a crash; the committed entries are visible to another connection
+    other = MmaRecordCache(db_filename)
+    assert(other.count() == MmaRecordCache.COMMIT_INTERVAL)
+    other.conn.execute("UPDATE mma_json_records SET data = '{\"n\": -1}' WHERE file_name = '1.json'")
+    other.close()
+    assert(cache.lookup('1.json', 1.0, 1) == None)
+    assert(cache.lookup('2.json', 1.0, 2) == {'n': 2})
+    cache.close()
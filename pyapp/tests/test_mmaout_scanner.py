@@ -0,0 +1,44 @@
+
+import pytest
+import datetime
+import json
+
+from pysrc.mmaout_scanner import MmaoutScanner
+from pysrc.task import Tasks
+
+def write_file(tmp_path, name, content, encoding='utf-8'):
+    with open(str(tmp_path / name), 'wb') as f:
+        f.write(content.encode(encoding))
+
+def test_scan(tmp_path):
+    write_file(tmp_path, 'c1-0-mma.txt', 'Assessment Failed\nretry\nAssessment Succeeded\n')
+    write_file(tmp_path, 'c10-1-mma.txt', 'Assessment Succeeded\nAssessment Failed\n')
+    write_file(tmp_path, 'c2-2-mma.txt', 'Assessment Succeeded\r\n', 'utf-16le')
+    write_file(tmp_path, 'c3-3-mma.txt', '')
+    write_file(tmp_path, 'c1-pymongo.txt', 'database:   db1 has 1 collections\ncollection: c1|h|db1|x\ncollection: c1|h|db1|y\n')
+    write_file(tmp_path, 'notes.txt', 'Assessment Failed\n')
+    scanner = MmaoutScanner(str(tmp_path))
+    assert(len(scanner.unindexed) == 1)
+
+    record = scanner.scan('c1')
+    assert(record['mma_present'].endswith('/c1-0-mma.txt'))
+    assert(record['mma_successful'] == 'true')
+    assert(record['pymongo_databases'] == 1)
+    assert(record['pymongo_collections'] == 2)
+
+    record = scanner.scan('c10')
+    assert(record['mma_successful'] == 'false')
+    assert(record['pymongo_present'] == None)
+    assert(record['pymongo_databases'] == None)
+
+    assert(scanner.scan('c2')['mma_successful'] == 'true')
+    assert(scanner.scan('c3')['mma_successful'] == 'unknown')
+    assert(scanner.scan('c4')['mma_present'] == None)
+
+def test_legacy_result_record():
+    results = {'c1': 'cluster', 'c1 mma_present': 'f1', 'c1 mma_successful': 'false', 'c1 pymongo_present': 'None'}
+    record = Tasks.mmaout_result_record(results, 'c1')
+    assert(record['mma_present'] == 'f1')
+    assert(record['mma_successful'] == 'false')
+    assert(record['pymongo_databases'] == None)
+    assert(Tasks.mmaout_result_record({'c1': record}, 'c1') == record)
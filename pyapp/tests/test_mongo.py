@@ -0,0 +1,75 @@
+
+import pytest
+import datetime
+import json
+
+from pysrc.mongo import Mongo, MongoClients, MongoDBInstance
+
+class FakeDatabase(object):
+
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def __getitem__(self, name):
+        return name
+
+    def list_collection_names(self, filter=None):
+        self.calls.append(('list_collection_names', self.name, filter))
+        names = ['c1', 'c2', 'c3']
+        if 'name' in filter.keys():
+            names = [n for n in names if n in filter['name']['$in']]
+        return names
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.calls = list()
+
+    def __getitem__(self, name):
+        return FakeDatabase(name, self.calls)
+
+    def list_database_names(self):
+        self.calls.append(('list_database_names',))
+        return ['admin', 'config', 'db1', 'db2', 'local']
+
+    def list_databases(self, filter=None):
+        self.calls.append(('list_databases', filter))
+        return [{'name': n} for n in ['db1', 'db2'] if n in filter['name']['$in']]
+
+def fake_instance(database_names=None, collection_names=None):
+    instance = MongoDBInstance('mongodb://localhost:27017', database_names, collection_names)
+    instance.client = FakeClient()
+    return instance
+
+def test_discovery_is_lazy_and_memoized():
+    instance = fake_instance()
+    assert(instance.client.calls == [])
+    db = instance.get_database('db1')
+    db.get_collection('c1')
+    assert(instance.client.calls == [])
+    assert(instance.databases == ['db1', 'db2'])
+    assert(db.collections == ['c1', 'c2', 'c3'])
+    assert(instance.get_database('db1').collections == ['c1', 'c2', 'c3'])
+    assert(instance.collections == {'db1': ['c1', 'c2', 'c3'], 'db2': ['c1', 'c2', 'c3']})
+    assert(len(instance.client.calls) == 3)
+
+def test_name_filters_are_pushed_down():
+    instance = fake_instance(['db2'], ['c2'])
+    assert(instance.databases == ['db2'])
+    assert(instance.get_database('db2').collections == ['c2'])
+    assert(instance.client.calls == [
+        ('list_databases', {'name': {'$in': ['db2']}}),
+        ('list_collection_names', 'db2', {'type': 'collection', 'name': {'$in': ['c2']}})])
+
+def test_clients_are_shared_by_connection_string():
+    MongoClients.close_all()
+    m1 = Mongo({'conn_string': 'mongodb://localhost:27017'})
+    m2 = Mongo({'conn_string': 'mongodb://localhost:27017'})
+    i1 = MongoDBInstance('mongodb://localhost:27017')
+    assert(m1.client() is m2.client())
+    assert(m1.client() is i1.client)
+    assert(MongoClients.get('mongodb://localhost:27018') is not m1.client())
+    assert(MongoClients.count() == 2)
+    MongoClients.close_all()
+    assert(MongoClients.count() == 0)
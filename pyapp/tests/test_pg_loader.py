@@ -0,0 +1,156 @@
+
+import pytest
+import datetime
+import json
+import os
+
+from pysrc.fs import FS
+from pysrc.pg_loader import PgLoader
+from pysrc.report_writer import ReportWriter
+from pysrc.reporter import Reporter
+
+def test_columns_match_the_csv_headers():
+    report_header = Reporter.csv_header_line(None).split(',')
+    assert([c[0] for c in PgLoader.REPORT_COLUMNS] == report_header)
+    assert([c[0] for c in PgLoader.RU_COLUMNS] == ReportWriter.RU_FIELDS)
+
+def test_create_table_sql():
+    statements = PgLoader.create_table_sql('mma_uuid_to_cluster', PgLoader.UUID_COLUMNS, [['cname']])
+    assert(len(statements) == 2)
+    assert(statements[0].startswith('CREATE TABLE IF NOT EXISTS mma_uuid_to_cluster ('))
+    assert('row_key TEXT PRIMARY KEY' in statements[0])
+    assert(statements[1] == 'CREATE INDEX IF NOT EXISTS mma_uuid_to_cluster_cname_idx ON mma_uuid_to_cluster (cname)')
+
+def test_copy_and_upsert_sql():
+    sql = PgLoader.copy_sql('mma_report_staging', PgLoader.RU_COLUMNS)
+    assert(sql.startswith('COPY mma_report_staging (cluster, mma_sibling_cluster, database,'))
+    assert(sql.endswith('FROM STDIN WITH (FORMAT csv)'))
+
+    sql = PgLoader.upsert_sql('mma_collection_ru', PgLoader.RU_COLUMNS, PgLoader.CONTAINER_KEY,
+        'mma_report_staging', "is_ru = 't'")
+    assert(sql.startswith('INSERT INTO mma_collection_ru (row_key, cluster,'))
+    assert("ROUND(NULLIF(est_migration_ru, '')::NUMERIC)::INTEGER" in sql)
+    assert("FROM mma_report_staging WHERE is_ru = 't'" in sql)
+    assert('ON CONFLICT (row_key) DO UPDATE SET cluster = EXCLUDED.cluster' in sql)
+
+    sql = PgLoader.delete_stale_sql('mma_uuid_to_cluster', 'uuid', 'mma_uuid_to_cluster_staging')
+    assert(sql == 'DELETE FROM mma_uuid_to_cluster t WHERE NOT EXISTS '
+        '(SELECT 1 FROM mma_uuid_to_cluster_staging WHERE TRUE AND uuid = t.row_key)')
+
+def test_connect_requires_a_connection_string(monkeypatch):
+    monkeypatch.delenv(PgLoader.CONN_ENV_VAR, raising=False)
+    with pytest.raises(ValueError):
+        PgLoader.connect()
+
+class FakeCopy(object):
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def write(self, data):
+        self.cursor.copied.append(data)
+
+class FakeCursor(object):
+    # a stand-in for a psycopg 3 cursor which records the executed sql and copied data
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.copied = conn.copied
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def execute(self, sql):
+        self.conn.statements.append(sql)
+        self.rowcount = 2
+
+    def copy(self, sql):
+        self.conn.statements.append(sql)
+        return FakeCopy(self)
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.statements, self.copied, self.commits = list(), list(), 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits = self.commits + 1
+
+def report_lines():
+    header = Reporter.csv_header_line(None)
+    width = len(header.split(','))
+    total = ['c1', 'c1', 'db1', 'Database Total'] + ['0'] * (width - 4)
+    coll = ['c1', 'c1', 'db1', 'coll1'] + ['1'] * (width - 4)
+    excel = ['c2'] + [''] * (width - 3) + ['host2', 'acct2']
+    excel[header.split(',').index('notes')] = 'c2 is in the Customer Excel file but has no MMA output'
+    return header, [','.join(total), ','.join(coll), '', ','.join(excel)]
+
+def test_load_report_streams_the_report_lines(tmp_path):
+    header, lines = report_lines()
+    report, pg, ru = [str(tmp_path / name) for name in ['r.csv', 'pg.csv', 'ru.csv']]
+    writer = ReportWriter(header, report, pg, ru)
+    conn = FakeConnection()
+    counts = PgLoader(conn).load_report(header, writer.classified_lines(iter(lines)))
+    writer.close()
+    assert(counts == {'mma_report': 2, 'mma_collection_ru': 2})
+    assert(conn.commits == 1)
+    copied = ''.join(conn.copied).splitlines()
+    assert(copied == ['t,f,' + lines[0], 't,t,' + lines[1], 'f,t,' + lines[3]])
+    assert(len(FS.read_lines(report)) == 5)
+
+    statements = conn.statements
+    copy_idx = [idx for idx, sql in enumerate(statements) if sql.startswith('COPY mma_report_staging (is_pg, is_ru, cluster,')]
+    assert(len(copy_idx) == 1)
+    assert(statements[copy_idx[0] - 1].startswith('CREATE TEMP TABLE mma_report_staging (is_pg TEXT, is_ru TEXT, cluster TEXT'))
+    after = statements[copy_idx[0] + 1:]
+    assert([sql.split(' ')[0] + ' ' + sql.split(' ')[2] for sql in after] == [
+        'DELETE mma_report', 'INSERT mma_report', 'DELETE mma_collection_ru', 'INSERT mma_collection_ru'])
+    assert("WHERE is_pg = 't'" in after[1])
+    assert("WHERE is_ru = 't'" in after[3])
+
+def test_load_report_rejects_an_unexpected_header():
+    with pytest.raises(ValueError):
+        PgLoader(FakeConnection()).load_report('cluster,database', iter([]))
+
+def test_load_postgresql():
+    # runs only against a local PostgreSQL, such as one for development
+    conn_str = os.environ.get(PgLoader.CONN_ENV_VAR)
+    if conn_str == None:
+        pytest.skip('environment variable {} is not set'.format(PgLoader.CONN_ENV_VAR))
+    header, lines = report_lines()
+    loader = PgLoader.connect(conn_str)
+    try:
+        with loader.conn.cursor() as cur:
+            for table in ['mma_report', 'mma_collection_ru', 'mma_uuid_to_cluster']:
+                cur.execute('DROP TABLE IF EXISTS {}'.format(table))
+        loader.conn.commit()
+        flags = [(True, False), (True, True), (False, False), (False, True)]
+        classified = [(line, f[0], f[1]) for line, f in zip(lines, flags)]
+        assert(loader.load_report(header, iter(classified)) == {'mma_report': 2, 'mma_collection_ru': 2})
+        assert(loader.load_uuid_to_cluster(iter(['u1,c1,c1', 'u2,c2,c2'])) == {'mma_uuid_to_cluster': 2})
+
+        # reload without coll1 and u2; their rows are deleted
+        assert(loader.load_report(header, iter([classified[0], classified[3]])) == {'mma_report': 1, 'mma_collection_ru': 1})
+        assert(loader.load_uuid_to_cluster(iter(['u1,c1,c1'])) == {'mma_uuid_to_cluster': 1})
+        with loader.conn.cursor() as cur:
+            cur.execute('SELECT row_key, size_in_bytes, avg_doc_size FROM mma_report ORDER BY row_key')
+            assert([tuple(row) for row in cur.fetchall()] == [('c1|db1|Database Total', 0, 0)])
+            cur.execute('SELECT row_key FROM mma_collection_ru ORDER BY row_key')
+            assert([row[0] for row in cur.fetchall()] == ['c2||'])
+            cur.execute('SELECT row_key, tname FROM mma_uuid_to_cluster')
+            assert([tuple(row) for row in cur.fetchall()] == [('u1', 'c1')])
+    finally:
+        loader.close()
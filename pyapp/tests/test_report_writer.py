@@ -0,0 +1,66 @@
+
+import pytest
+import datetime
+import json
+import os
+
+from pysrc.fs import FS
+from pysrc.report_writer import ReportWriter
+
+header = 'cluster,mma_sibling_cluster,database,container,est_migration_ru,est_post_migration_ru,notes,source_host,cosmos_acct'
+
+def test_streamed_files(tmp_path):
+    report, pg, ru, xlsx = [str(tmp_path / name) for name in ['r.csv', 'pg.csv', 'ru.csv', 'r.xlsx']]
+    writer = ReportWriter(header, report, pg, ru, xlsx)
+    writer.write_lines([
+        '',
+        'c1,c1,db1,Database Total,0,0,use container-level scaling,host1,acct1',
+        'c1,c1,db1,coll1,10000,1000,auto scale,host1,acct1',
+        '',
+        'c2,,,,0,0,c2 is in the Customer Excel file but has no MMA output,host2,acct2'])
+    writer.close()
+    assert(writer.line_count == 6)
+    assert(len(FS.read_lines(report)) == 6)
+    assert([line.strip() for line in FS.read_lines(pg)] == [
+        header,
+        'c1,c1,db1,Database Total,0,0,use container-level scaling,host1,acct1',
+        'c1,c1,db1,coll1,10000,1000,auto scale,host1,acct1'])
+    assert([line.strip() for line in FS.read_lines(ru)] == [
+        'cluster,mma_sibling_cluster,database,container,est_migration_ru,est_post_migration_ru,source_host,cosmos_acct',
+        'c1,c1,db1,coll1,10000,1000,host1,acct1',
+        'c2,,,,0,0,host2,acct2'])
+
+    from openpyxl import load_workbook
+    rows = list(load_workbook(xlsx, read_only=True).active.iter_rows(values_only=True))
+    assert(rows[3][:6] == ('c1', 'c1', 'db1', 'coll1', 10000, 1000))
+
+def test_cell_value(tmp_path):
+    report, pg, ru = [str(tmp_path / name) for name in ['r.csv', 'pg.csv', 'ru.csv']]
+    writer = ReportWriter(header, report, pg, ru)
+    writer.close()
+    assert(writer.cell_value('10000') == 10000)
+    assert(writer.cell_value('-3') == -3)
+    assert(writer.cell_value('0.125000') == 0.125)
+    assert(writer.cell_value('1e3') == 1000.0)
+    for token in ['nan', 'NaN', 'inf', '-Infinity', '1_000', '1e999', '', 'c1', '1.2.3']:
+        assert(writer.cell_value(token) == token)
+
+def test_incomplete_report(tmp_path):
+    report, pg, ru, xlsx = [str(tmp_path / name) for name in ['r.csv', 'pg.csv', 'ru.csv', 'r.xlsx']]
+
+    def lines():
+        yield 'c1,c1,db1,coll1,10000,1000,auto scale,host1,acct1'
+        raise RuntimeError('report failed')
+
+    writer = ReportWriter(header, report, pg, ru, xlsx)
+    completed = False
+    with pytest.raises(RuntimeError):
+        try:
+            writer.write_lines(lines())
+            completed = True
+        finally:
+            writer.close(completed)
+    assert(writer.report_file.closed and writer.pg_file.closed and writer.ru_file.closed)
+    assert(len(FS.read_lines(report)) == 2)
+    assert(FS.read_lines(report)[0].strip() == header)
+    assert(os.path.exists(xlsx) == False)
@@ -0,0 +1,33 @@
+
+import pytest
+import datetime
+import json
+
+from pysrc.container import Container
+from pysrc.reporter import Reporter
+
+def containers():
+    clist = list()
+    for idx, size in enumerate([0, 1024, 15000000000, 40000000000, 123456789012]):
+        dbname = 'db{}'.format(idx % 2)
+        c = Container('cluster1', dbname, 'c{}'.format(idx))
+        c.set_stats({'size_in_bytes': size, 'document_count': idx * 10, 'avg_object_size_in_bytes': 512})
+        c.calculate()
+        clist.append(c)
+    clist.append(Container('cluster2', 'db0', 'nostats'))
+    clist[-1].calculate()
+    return clist
+
+def test_calculate_db_totals():
+    clist = containers()
+    totals = Reporter.calculate_db_totals(None, clist)
+    assert(sorted(totals.keys()) == ['cluster1|db0', 'cluster1|db1', 'cluster2|db0'])
+    db0 = [c for c in clist if c.cluster_db_key() == 'cluster1|db0']
+    assert(totals['cluster1|db0']['container_count'] == 3)
+    assert(totals['cluster1|db0']['bytes'] == sum([c.size_in_bytes() for c in db0]))
+    assert(totals['cluster1|db0']['gb'] == sum([c.size_in_gb() for c in db0]))
+    assert(totals['cluster1|db0']['pp'] == sum([c.get_pp() for c in db0]))
+    assert(totals['cluster1|db0']['db_level_migration_ru'] == 0)
+    assert(totals['cluster2|db0']['bytes'] == -1)
+    assert(totals['cluster2|db0']['pp'] == 1)
+    assert(totals['cluster2|db0']['use_db_level_throughput'] == False)
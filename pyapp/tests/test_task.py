@@ -0,0 +1,197 @@
+
+import pytest
+import datetime
+import json
+
+from pysrc.task import Tasks
+
+class FakeDatabase(object):
+
+    def list_collection_names(self, filter=None):
+        return ['c1', 'c2']
+
+class FakeClient(object):
+
+    def __getitem__(self, name):
+        return FakeDatabase()
+
+    def list_database_names(self):
+        return ['local', 'db2', 'db1', 'admin']
+
+class UnreachableClient(object):
+
+    def list_database_names(self):
+        raise Exception('connection refused')
+
+class PartialClient(FakeClient):
+
+    def __getitem__(self, name):
+        if name == 'db2':
+            raise Exception('connection reset')
+        return FakeDatabase()
+
+    def close(self):
+        pass
+
+def test_pymongo_connect_lines():
+    inventory = dict()
+    lines = Tasks.pymongo_connect_lines('c', 'h1.net', 'mmaout/c-pymongo.txt', FakeClient(), inventory)
+    assert(lines[0] == 'pymongo_connect, cluster: c host: h1.net')
+    assert(lines[2] == "cluster:    c has 4 databases: ['admin', 'db1', 'db2', 'local']")
+    assert(lines[3] == "database:   db1 has 2 collections: ['c1', 'c2']")
+    assert(lines[4] == 'collection: c|h1.net|db1|c1')
+    assert(len(lines) == 9)
+    assert(inventory == {'databases': {'db1': ['c1', 'c2'], 'db2': ['c1', 'c2']}})
+
+def test_pymongo_connect_lines_unreachable():
+    inventory = dict()
+    lines = Tasks.pymongo_connect_lines('c', 'h1.net', 'mmaout/c-pymongo.txt', UnreachableClient(), inventory)
+    assert(lines[-1] == 'cluster:    c has no databases')
+    assert(inventory['error'] == 'connection refused')
+
+def test_pymongo_connect_lines_partial():
+    inventory = dict()
+    lines = Tasks.pymongo_connect_lines('c', 'h1.net', 'mmaout/c-pymongo.txt', PartialClient(), inventory)
+    assert(lines[4] == 'collection: c|h1.net|db1|c1')
+    assert(lines[-1] == 'error:      database db2 - connection reset')
+    assert(inventory == {'databases': {'db1': ['c1', 'c2']}, 'error': 'connection reset'})
+
+def test_probe_cluster_partial(tmp_path, monkeypatch):
+    import pysrc.task
+
+    monkeypatch.setattr(pysrc.task.MongoClients, 'new_client', lambda conn_str, **kwargs: PartialClient())
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'mmaout').mkdir()
+    result = Tasks.probe_cluster('c', 'mongodb://u:p@h1.net', 1)
+    assert(result['status'] == 'error')
+    assert(result['error'] == 'connection reset')
+    assert(result['databases'] == {'db1': ['c1', 'c2']})
+    lines = [line.strip() for line in open('mmaout/c-pymongo.txt', 'rt')]
+    assert('collection: c|h1.net|db1|c2' in lines)
+    assert(lines[-1] == 'error:      database db2 - connection reset')
+
+def test_read_docscan_file(tmp_path):
+    infile = str(tmp_path / 'DocScanResults_c1.json')
+    data = {'clusterName': 'c1', 'containerInfo': {
+        'db|a': {'dbName': 'db', 'cName': 'a', 'iteratedDocumentCount': 5, 'largestSize': 300,
+                 'largestDocJsonPrefix': '{"_id": {"$oid": "abc"}}'},
+        'db|b': {'dbName': 'db', 'cName': 'b', 'iteratedDocumentCount': 7, 'largestSize': 900,
+                 'largestDocJsonPrefix': '{"_id": 42, "x": 1}'}}}
+    with open(infile, 'w') as f:
+        f.write(json.dumps(data))
+    summary = Tasks.read_docscan_file(infile)
+    assert(summary['cluster_name'] == 'c1')
+    assert(summary['exception'] == None)
+    assert(summary['largest_doc_size'] == 900)
+    assert([c[0] for c in summary['containers']] == ['c1|db|a', 'c1|db|b'])
+    assert(summary['containers'][0][3] == 'c1,db,a,5,300,no,abc,yes')
+
+class FakeCaptureCollection(object):
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = list()
+
+    def find(self, query):
+        self.queries.append(query)
+        return [d for d in self.docs if d['_id'] in query['_id']['$in']]
+
+class FakeCaptureMongo(object):
+
+    collection = None
+
+    def __init__(self, opts):
+        pass
+
+    def client(self):
+        return self
+
+    def __getitem__(self, name):
+        return self
+
+    def get_collection(self, name, codec_options=None):
+        return self.collection
+
+def test_docscan_capture_group(tmp_path, monkeypatch):
+    from bson import encode
+    from bson.objectid import ObjectId
+    from bson.raw_bson import RawBSONDocument
+    import pysrc.task
+
+    oid = ObjectId()
+    docs = [RawBSONDocument(encode({'_id': oid, 'a': 1})), RawBSONDocument(encode({'_id': 'k1', 'b': 'x' * 100}))]
+    FakeCaptureMongo.collection = FakeCaptureCollection(docs)
+    monkeypatch.setattr(pysrc.task, 'Mongo', FakeCaptureMongo)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'tmp' / 'captured_docs').mkdir(parents=True)
+
+    specs = [{'doc_id': str(oid)}, {'doc_id': 'k1'}, {'doc_id': 'missing'}]
+    tr = pysrc.task.TaskResult('test')
+    captured, missing = Tasks.docscan_capture_group(tr, ('conn', 'db', 'c'), specs)
+    assert((captured, missing) == (2, 1))
+    assert(len(FakeCaptureMongo.collection.queries) == 1)
+    obj = json.loads((tmp_path / 'tmp' / 'captured_docs' / 'capture-doc-db-c-k1.json').read_text())
+    assert(obj['__coordinates__'] == 'db|c|k1|conn')
+    assert(obj['__bson_size__'] == len(docs[1].raw))
+
+def test_docscan_id_query_values():
+    from bson.objectid import ObjectId
+    values = Tasks.docscan_id_query_values(['6ad4a77f3abd2c15506cde67', 'k1'])
+    assert(values == [ObjectId('6ad4a77f3abd2c15506cde67'), '6ad4a77f3abd2c15506cde67', 'k1'])
+
+def test_iterate_mma_json_files_sequence(tmp_path, monkeypatch):
+    from pysrc.fs import FS
+    from pysrc.task import TaskResult
+    for i in range(24):
+        with open(str(tmp_path / 'f{:02d}.json'.format(i)), 'w') as f:
+            f.write(json.dumps({'i': i}))
+    json_file_tasks = [(idx, file_info, 'c1') for idx, file_info in enumerate(sorted(FS.walk(str(tmp_path)), key=lambda f: f['base']))]
+    tr = TaskResult('test')
+    monkeypatch.setattr('sys.argv', ['main.py', 'aggregate_mma_execution_output'])
+    serial = [obj['data']['i'] for obj in Tasks._iterate_mma_json_files(tr, json_file_tasks, None)]
+    monkeypatch.setattr('sys.argv', ['main.py', 'aggregate_mma_execution_output', '--parallel', '--workers', '4'])
+    parallel = [obj['data']['i'] for obj in Tasks._iterate_mma_json_files(tr, json_file_tasks, None)]
+    assert(serial == list(range(24)))
+    assert(parallel == serial)
+
+def test_docscan_results_report_order(tmp_path, monkeypatch):
+    import os
+    from pysrc.docscan import DocscanContainer
+    from pysrc.fs import FS
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('current/docscan')
+    os.makedirs('tmp')
+    sizes = [[300, 900, 300], [900, 50, 1200], [300, 700, 10]]
+    for file_idx, file_sizes in enumerate(sizes):
+        info = dict()
+        for idx, size in enumerate(file_sizes):
+            # the same collection keys in every file, with different sizes and counts
+            info['db|c{}'.format(idx)] = {'dbName': 'db', 'cName': 'c{}'.format(idx),
+                'iteratedDocumentCount': file_idx, 'largestSize': size, 'largestDocJsonPrefix': '{"_id": 1}'}
+        info['db|f{}'.format(file_idx)] = {'dbName': 'db', 'cName': 'f{}'.format(file_idx),
+            'iteratedDocumentCount': 1, 'largestSize': 300, 'largestDocJsonPrefix': '{"_id": 1}'}
+        with open('current/docscan/DocScanResults_{}.json'.format(file_idx), 'w') as f:
+            f.write(json.dumps({'clusterName': 'c1', 'containerInfo': info}))
+
+    # the expected outputs, as produced by the original sort, reverse, and dict assignment
+    collections = list()
+    for file_obj in FS.walk('current/docscan'):
+        collections.extend(Tasks.read_docscan_file(file_obj['abspath'])['containers'])
+    collections.sort(key=lambda c: c[1])
+    collections.reverse()
+    expected_dict = dict()
+    for key, size, data, csv_line in collections:
+        expected_dict[key] = data
+    expected_csv = [DocscanContainer.csv_header()] + [c[3] for c in collections]
+
+    for args in [[], ['--parallel', '--workers', '2'], ['--top', '3']]:
+        monkeypatch.setattr('sys.argv', ['main.py', 'docscan_results_report'] + args)
+        assert(Tasks.docscan_results_report().data['successful'] == True)
+        merged = FS.read_json('current/docscan_merged_collections_dict.json')
+        assert(list(merged.items()) == list(expected_dict.items()))
+        csv_lines = [line.strip() for line in FS.read_lines('current/docscan_by_largest_doc_in_collection.csv')]
+        if '--top' in args:
+            assert(csv_lines == expected_csv[:4])
+        else:
+            assert(csv_lines == expected_csv)
+        assert(os.listdir('tmp') == [])
@@ -0,0 +1,69 @@
+
+import pytest
+import datetime
+import json
+
+from pymongo.errors import OperationFailure
+
+import throughput
+
+class FakeDb(object):
+
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.commands = list()
+
+    def command(self, command):
+        self.commands.append(command)
+        if len(self.failures) > 0:
+            raise self.failures.pop(0)
+        return {'ok': 1.0}
+
+def sleeps(monkeypatch):
+    delays = list()
+    monkeypatch.setattr(throughput.time, 'sleep', lambda delay: delays.append(delay))
+    monkeypatch.setattr(throughput.random, 'uniform', lambda a, b: 0.0)
+    return delays
+
+def test_is_throttled():
+    assert(throughput.is_throttled(OperationFailure('throttled', 16500)) == True)
+    assert(throughput.is_throttled(OperationFailure('throttled', 429)) == True)
+    assert(throughput.is_throttled(OperationFailure('Error=16500, TooManyRequests', 2)) == True)
+    assert(throughput.is_throttled(OperationFailure('Unauthorized', 13)) == False)
+
+def test_run_command_retries_with_backoff(monkeypatch):
+    delays = sleeps(monkeypatch)
+    db = FakeDb([
+        OperationFailure('TooManyRequests', 16500),
+        OperationFailure('TooManyRequests', 16500),
+        OperationFailure('Error=16500, RetryAfterMs=2500, TooManyRequests', 16500)])
+    assert(throughput.run_command(db, {'collStats': 'c1'}) == {'ok': 1.0})
+    assert(len(db.commands) == 4)
+    assert(delays == [0.1, 0.2, 2.5])
+
+def test_run_command_raises(monkeypatch):
+    delays = sleeps(monkeypatch)
+    db = FakeDb([OperationFailure('Unauthorized', 13)])
+    with pytest.raises(OperationFailure):
+        throughput.run_command(db, {'collStats': 'c1'})
+    assert(delays == [])
+
+    db = FakeDb([OperationFailure('TooManyRequests', 429) for i in range(3)])
+    with pytest.raises(OperationFailure):
+        throughput.run_command(db, {'collStats': 'c1'}, max_retries=2)
+    assert(len(db.commands) == 3)
+    assert(delays == [0.1, 0.2])
+
+def test_calculate_new_ru():
+    one_gb = 1024 * 1024 * 1024
+    coll_throughput = {'__summary__': 'container_autoscale:60000'}
+    plan = throughput.calculate_new_ru(coll_throughput, {'count': 100 * one_gb})
+    assert(plan['provisioning_type'] == 'container_autoscale')
+    assert(plan['pp'] == 8)
+    assert(plan['curr_ru'] == 60000)
+    assert(plan['new_ru'] == 8000)
+    assert(plan['gb'] == '100.0000')
+
+    plan = throughput.calculate_new_ru(coll_throughput, {'count': 0})
+    assert(plan['pp'] == 1)
+    assert(plan['new_ru'] == 6000)  # no lower than 1/10th of the current value
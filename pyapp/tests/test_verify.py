@@ -0,0 +1,102 @@
+
+import pytest
+import datetime
+import json
+
+import verify
+
+class FakeCollection(object):
+
+    def __init__(self, name, count, indexes):
+        self.name = name
+        self.count = count
+        self.indexes = indexes
+
+    def count_documents(self, query):
+        return self.value(self.count)
+
+    def estimated_document_count(self):
+        return self.value(self.count)
+
+    def index_information(self):
+        return self.value(self.indexes)
+
+    def value(self, v):
+        if isinstance(v, Exception):
+            raise v
+        return v
+
+class FakeDatabase(object):
+
+    def __init__(self, collections):
+        self.collections = collections
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+    def command(self, command):
+        return {'RequestCharge': 2.5}
+
+class FakeInstance(object):
+
+    def __init__(self, dbs):
+        self.client = dict()
+        for dbname, collections in dbs.items():
+            self.client[dbname] = FakeDatabase(
+                {c.name: c for c in collections})
+
+def test_collection_info():
+    instance = FakeInstance({'db1': [
+        FakeCollection('c1', 10, {'_id_': {}, 'a_1': {}}),
+        FakeCollection('c2', ValueError('count failed'), {'_id_': {}})]})
+    info = verify.collection_info(instance, 'db1', 'c1', 'each', True, True)
+    assert(info == {'count': 10, 'last_request_charge': 2.5, 'indexes': ['_id_', 'a_1']})
+    info = verify.collection_info(instance, 'db1', 'c1', 'estimate', False, False)
+    assert(info == {'count': 10})
+    info = verify.collection_info(instance, 'db1', 'c2', 'estimate', True, False)
+    assert(info == {'error': 'count failed'})
+
+def test_compare_collection_infos():
+    source_info = {'count': 10, 'indexes': ['_id_', 'a_1']}
+    target_info = {'count': 7, 'indexes': ['_id_', 'b_1'], 'last_request_charge': 2.5}
+    result = verify.compare_collection_infos(source_info, target_info, True)
+    assert(result['source_count'] == 10)
+    assert(result['target_count'] == 7)
+    assert(result['diff'] == 3)
+    assert(result['last_request_charge'] == 2.5)
+    assert(result['indexes_not_in_source'] == ['b_1'])
+    assert(result['indexes_not_in_target'] == ['a_1'])
+    assert(result['errors'] == [])
+
+    # the indexes are compared only for collections in both instances
+    result = verify.compare_collection_infos(source_info, {'count': 10}, False)
+    assert(result['diff'] == 0)
+    assert(result['indexes_not_in_source'] == [])
+    assert(result['indexes_not_in_target'] == [])
+
+    result = verify.compare_collection_infos(source_info, {'error': 'timeout'}, True)
+    assert(result['target_count'] == None)
+    assert(result['diff'] == None)
+    assert(result['errors'] == ['target: timeout'])
+
+def test_summarize_report():
+    collections = dict()
+    collections['same'] = verify.compare_collection_infos({'count': 5}, {'count': 5}, True)
+    collections['diff'] = verify.compare_collection_infos({'count': 5}, {'count': 4}, True)
+    collections['indexes'] = verify.compare_collection_infos(
+        {'count': 1, 'indexes': ['_id_']}, {'count': 1, 'indexes': ['_id_', 'a_1']}, True)
+    collections['error'] = verify.compare_collection_infos({'error': 'x'}, {'count': 4}, True)
+    report = {'databases': {'db1': {'collections': collections}, 'db2': {'collections': dict()}}}
+    summary = verify.summarize_report(report)
+    assert(summary['databases'] == 2)
+    assert(summary['collections'] == 4)
+    assert(summary['count_mismatches'] == 1)  # an errored count is not also a mismatch
+    assert(summary['index_mismatches'] == 1)
+    assert(summary['errors'] == 1)
+
+def test_get_concurrency(monkeypatch):
+    monkeypatch.setattr(verify.sys, 'argv', ['verify.py', 'brown'])
+    assert(verify.get_concurrency({}) == 0)
+    assert(verify.get_concurrency({'concurrency': '4'}) == 4)
+    monkeypatch.setattr(verify.sys, 'argv', ['verify.py', 'brown', '--concurrency', '16'])
+    assert(verify.get_concurrency({'concurrency': 4}) == 16)
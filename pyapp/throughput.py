@@ -11,6 +11,12 @@ Usage:
     python throughput.py xxx scale_down -preview_only      <-- preview the changes only
     python throughput.py xxx scale_down -preview_only -v   <-- preview the changes, verbose
     python throughput.py xxx scale_down                    <-- actually scale down
+    python throughput.py xxx get_current_state --concurrency 16
+    python throughput.py xxx scale_down --concurrency 16   <-- plan, then apply with 16 worker threads
+  Notes:
+    --concurrency <n> executes the custom commands with a pool of n worker threads,
+    retrying with backoff on throttling (16500/429) responses.  scale_down then first
+    computes and writes the plan of new RU values to tmp/, then applies it in parallel.
 """
 
 # Developer Notes:
@@ -21,13 +27,19 @@ Usage:
 import json
 import math
 import os.path
+import random
+import re
 import sys
+import time
 import traceback
 
-from pymongo import MongoClient
-import certifi
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo.errors import OperationFailure
 
 from pysrc.env import Env
+from pysrc.fs import FS
+from pysrc.mongo import MongoClients
 
 def read_json_file(infile):
     with open(infile, 'rt') as f:
@@ -75,7 +87,7 @@ def get_current_state(client, migration_obj):
             for cname in sorted(collections):
                 if array_match(migration_obj['collections'], cname):
                     coll_throughput = get_collection_throughput(db, cname)
-                    stats = db.command("collStats", cname)
+                    stats = run_command(db, {'collStats': cname})
                     doc_count, size_bytes = stats['count'], stats['count']
                     gb = float(size_bytes) / one_gb
                     gbstr = "%.4f" % gb
@@ -100,7 +112,6 @@ def scale_down(client, migration_obj):
         return
 
     dbnames = client.list_database_names()
-    one_gb = 1024.0 * 1024.0 * 1024.0
 
     for exclude_dbname in 'admin,local,config'.split(','):
         if exclude_dbname in dbnames:
@@ -122,28 +133,15 @@ def scale_down(client, migration_obj):
                     print("")
                     print("---processing collection {} in database: {}".format(cname, dbname))
                     coll_throughput = get_collection_throughput(db, cname)
-                    summary_tokens = coll_throughput['__summary__'].split(':')  # "container_autoscale:10000"
-                    provisioning_type = summary_tokens[0]
-                    curr_ru_value = int(summary_tokens[1])
-                    min_scale_down_ru_value = int(str(curr_ru_value)[:-1])  # 60000 -> 6000 or 1/10th
-
-                    stats = db.command("collStats", cname)
-                    doc_count, size_bytes = stats['count'], stats['count']
-                    gb = float(size_bytes) / one_gb
-                    gb_str = "%.4f" % gb
-
-                    gb_uncompressed = gb * 4.0
-                    physical_partitions = int(math.ceil(gb_uncompressed / 50.0))
-                    if physical_partitions < 1:
-                        physical_partitions = 1
-                    new_ru_value = int(physical_partitions * 1000)
-
-                    if new_ru_value < min_scale_down_ru_value:
-                        new_ru_value = min_scale_down_ru_value
+                    stats = run_command(db, {'collStats': cname})
+                    plan = calculate_new_ru(coll_throughput, stats)
+                    provisioning_type = plan['provisioning_type']
+                    curr_ru_value = plan['curr_ru']
+                    new_ru_value = plan['new_ru']
 
                     print("---coll: {} in db: {} docs: {} gb: {} prov: {} pp: {} curr_ru: {} new_ru: {}".format(
-                        cname, dbname, doc_count, gb_str, provisioning_type,
-                        physical_partitions, curr_ru_value, new_ru_value))
+                        cname, dbname, plan['doc_count'], plan['gb'], provisioning_type,
+                        plan['pp'], curr_ru_value, new_ru_value))
 
                     if Env.verbose():
                         print(json.dumps(coll_throughput, sort_keys=False, indent=2))
@@ -161,21 +159,228 @@ def scale_down(client, migration_obj):
                                 print('not updating throughput because container because RU value is correct')
                             else:
                                 try:
-                                    command, autoscaleObj = dict(), dict()
-                                    autoscaleObj['maxThroughput'] = new_ru_value
-                                    command['customAction'] = 'UpdateCollection'
-                                    command['collection'] = cname
-                                    command['autoScaleSettings'] = autoscaleObj
-                                    result = db.command(command)
+                                    result = update_collection_throughput(db, cname, new_ru_value)
                                     print(result)
                                 except Exception as e:
                                     print(traceback.format_exc())
 
+def calculate_new_ru(coll_throughput, stats):
+    """
+    Return a dict with the current and the new (scaled-down) autoscale RU values
+    for a container, given its GetCollection and collStats command responses.
+    """
+    one_gb = 1024.0 * 1024.0 * 1024.0
+    summary_tokens = coll_throughput['__summary__'].split(':')  # "container_autoscale:10000"
+    provisioning_type = summary_tokens[0]
+    curr_ru_value = int(summary_tokens[1])
+    min_scale_down_ru_value = int(str(curr_ru_value)[:-1])  # 60000 -> 6000 or 1/10th
+
+    doc_count, size_bytes = stats['count'], stats['count']
+    gb = float(size_bytes) / one_gb
+
+    gb_uncompressed = gb * 4.0
+    physical_partitions = int(math.ceil(gb_uncompressed / 50.0))
+    if physical_partitions < 1:
+        physical_partitions = 1
+    new_ru_value = int(physical_partitions * 1000)
+
+    if new_ru_value < min_scale_down_ru_value:
+        new_ru_value = min_scale_down_ru_value
+
+    plan = dict()
+    plan['doc_count'] = doc_count
+    plan['gb'] = "%.4f" % gb
+    plan['provisioning_type'] = provisioning_type
+    plan['pp'] = physical_partitions
+    plan['curr_ru'] = curr_ru_value
+    plan['new_ru'] = new_ru_value
+    return plan
+
+def update_collection_throughput(db, cname, new_ru_value):
+    # https://learn.microsoft.com/en-us/azure/cosmos-db/mongodb/custom-commands#update-collection
+    command, autoscaleObj = dict(), dict()
+    autoscaleObj['maxThroughput'] = new_ru_value
+    command['customAction'] = 'UpdateCollection'
+    command['collection'] = cname
+    command['autoScaleSettings'] = autoscaleObj
+    return run_command(db, command)
+
+def run_command(db, command, max_retries=8):
+    """
+    Execute the given database command, retrying with exponential backoff and
+    jitter when Cosmos DB throttles the request (error code 16500 or 429).
+    The RetryAfterMs value in the error message is used when present.
+    """
+    attempt = 0
+    while True:
+        try:
+            return db.command(command)
+        except OperationFailure as e:
+            if attempt >= max_retries or not is_throttled(e):
+                raise
+            delay = 0.1 * pow(2, attempt)
+            match = re.search(r'RetryAfterMs=(\d+)', str(e))
+            if match:
+                delay = max(delay, float(match.group(1)) / 1000.0)
+            delay = min(delay, 30.0) + random.uniform(0, 0.1)
+            attempt = attempt + 1
+            if Env.verbose():
+                print('throttled, retry {} in {:.2f}s: {}'.format(attempt, delay, str(e)))
+            time.sleep(delay)
+
+def is_throttled(e):
+    if e.code in (16500, 429):
+        return True
+    return 'TooManyRequests' in str(e)
+
+def collect_containers(client, migration_obj, concurrency):
+    """
+    Concurrently collect the GetDatabase, GetCollection and collStats responses
+    for the databases and collections specified in the verify.json entry.
+    Returns a list of database dicts, each with a sorted list of collection dicts.
+    """
+    dbnames = client.list_database_names()
+    for exclude_dbname in 'admin,local,config'.split(','):
+        if exclude_dbname in dbnames:
+            dbnames.remove(exclude_dbname)
+    dbnames = [dbname for dbname in sorted(dbnames) if array_match(migration_obj['databases'], dbname)]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        databases = list()
+        db_futures = [(dbname, pool.submit(get_database_throughput, client[dbname]),
+                       pool.submit(list_collections, client[dbname])) for dbname in dbnames]
+        coll_futures = list()
+        for dbname, throughput_future, collections_future in db_futures:
+            database = dict()
+            database['dbname'] = dbname
+            database['db_throughput'] = throughput_future.result()
+            database['collections'] = list()
+            databases.append(database)
+            for cname in sorted(collections_future.result()):
+                if array_match(migration_obj['collections'], cname):
+                    coll = dict()
+                    coll['dbname'] = dbname
+                    coll['cname'] = cname
+                    database['collections'].append(coll)
+                    coll_futures.append((coll, pool.submit(collect_container, client[dbname], cname)))
+
+        for coll, future in coll_futures:
+            coll.update(future.result())
+    return databases
+
+def list_collections(db):
+    return db.list_collection_names(filter={'type': 'collection'})
+
+def collect_container(db, cname):
+    result = dict()
+    result['coll_throughput'] = get_collection_throughput(db, cname)
+    try:
+        result['stats'] = run_command(db, {'collStats': cname})
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+def get_current_state_concurrently(client, migration_obj, concurrency):
+    one_gb = 1024.0 * 1024.0 * 1024.0
+    for database in collect_containers(client, migration_obj, concurrency):
+        print('')
+        print("=== database: {}".format(database['dbname']))
+        print_throughput(database['db_throughput'])
+        for coll in database['collections']:
+            if 'error' in coll.keys():
+                print("---collection {} in database: {} error: {}".format(
+                    coll['cname'], coll['dbname'], coll['error']))
+                continue
+            stats = coll['stats']
+            doc_count, size_bytes = stats['count'], stats['count']
+            gbstr = "%.4f" % (float(size_bytes) / one_gb)
+            print("---collection {} in database: {} docs: {} bytes: {} gb: {}".format(
+                coll['cname'], coll['dbname'], doc_count, size_bytes, gbstr))
+            if Env.verbose():
+                print(json.dumps(coll['coll_throughput'], sort_keys=False, indent=2))
+                print(json.dumps(stats, sort_keys=False, indent=2))
+            else:
+                print(coll['coll_throughput'].get('__summary__'))
+
+def plan_scale_down(client, migration_obj, concurrency):
+    """
+    Compute the new RU value for each specified container, without changing
+    anything.  Each plan entry has an 'action' of either 'update' or 'skip'.
+    """
+    plans = list()
+    for database in collect_containers(client, migration_obj, concurrency):
+        print("=== database: {}".format(database['dbname']))
+        print_throughput(database['db_throughput'])
+        for coll in database['collections']:
+            plan = dict()
+            plan['dbname'] = coll['dbname']
+            plan['cname'] = coll['cname']
+            plan['action'] = 'skip'
+            plans.append(plan)
+            try:
+                if 'error' in coll.keys():
+                    raise Exception(coll['error'])
+                plan.update(calculate_new_ru(coll['coll_throughput'], coll['stats']))
+            except Exception as e:
+                plan['reason'] = 'unable to calculate RU: {}'.format(str(e))
+                print("---coll: {} in db: {} {}".format(plan['cname'], plan['dbname'], plan['reason']))
+                continue
+            print("---coll: {} in db: {} docs: {} gb: {} prov: {} pp: {} curr_ru: {} new_ru: {}".format(
+                plan['cname'], plan['dbname'], plan['doc_count'], plan['gb'], plan['provisioning_type'],
+                plan['pp'], plan['curr_ru'], plan['new_ru']))
+            if plan['provisioning_type'] != 'container_autoscale':
+                plan['reason'] = 'container is not container_autoscale'
+            elif plan['curr_ru'] == plan['new_ru']:
+                plan['reason'] = 'RU value is correct'
+            else:
+                plan['action'] = 'update'
+    return plans
+
+def apply_scale_down(client, plans, concurrency):
+    updates = [plan for plan in plans if plan['action'] == 'update']
+    print('applying {} of {} planned throughput updates'.format(len(updates), len(plans)))
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(apply_plan, client, plan) for plan in updates]
+        for future in futures:
+            plan = future.result()
+            print('updated: {} coll: {} in db: {} {} -> {} {}'.format(
+                plan['applied'], plan['cname'], plan['dbname'],
+                plan['curr_ru'], plan['new_ru'], plan['result']))
+    return updates
+
+def apply_plan(client, plan):
+    try:
+        plan['result'] = str(update_collection_throughput(client[plan['dbname']], plan['cname'], plan['new_ru']))
+        plan['applied'] = True
+    except Exception as e:
+        plan['result'] = str(e)
+        plan['applied'] = False
+    return plan
+
+def scale_down_concurrently(client, migration_obj, config_key, concurrency):
+    if len(migration_obj['databases']) < 1:
+        print('the array of databases in verify.json must not be empty for RU scaling.')
+        print('run this program with the "list_databases" option to discover the database names.')
+        return
+
+    plans = plan_scale_down(client, migration_obj, concurrency)
+    outfile = 'tmp/throughput_plan_{}_{}.json'.format(config_key, int(time.time()))
+    FS.write_json(plans, outfile)
+    if not preview_only():
+        apply_scale_down(client, plans, concurrency)
+        FS.write_json(plans, outfile)
+
+def print_throughput(throughput):
+    if Env.verbose():
+        print(json.dumps(throughput, sort_keys=False, indent=2))
+    else:
+        print(throughput.get('__summary__'))
+
 def get_database_throughput(db):
     try:
         command = dict()
         command['customAction'] = 'GetDatabase'
-        data = db.command(command)
+        data = run_command(db, command)
         if 'autoScaleSettings' in data.keys():
             max = data['autoScaleSettings']['maxThroughput']
             data['__summary__'] = 'db_shared:{}'.format(max)
@@ -207,7 +412,7 @@ def get_collection_throughput(db, cname):
         command = dict()
         command['customAction'] = 'GetCollection'
         command['collection'] = cname
-        data = db.command(command)
+        data = run_command(db, command)
         if 'provisionedThroughput' in data.keys():
             if 'autoScaleSettings' in data.keys():
                 max = data['autoScaleSettings']['maxThroughput']
@@ -298,16 +503,23 @@ if __name__ == "__main__":
                 print(migration_obj)
                 cosmos_conn_str = migration_obj['target']
                 print('  cosmos_conn_str: {}'.format(cosmos_conn_str))
-                client = MongoClient(cosmos_conn_str, tlsCAFile=certifi.where())
+                client = MongoClients.get(cosmos_conn_str)
+                concurrency = Env.int_arg('--concurrency', 0)
 
                 if action == 'list_databases':
                     list_databases(client)
                 elif action == 'list_databases_and_collections':
                     list_databases_and_collections(client)
                 elif action == 'get_current_state':
-                    get_current_state(client, migration_obj)
+                    if concurrency > 0:
+                        get_current_state_concurrently(client, migration_obj, concurrency)
+                    else:
+                        get_current_state(client, migration_obj)
                 elif action == 'scale_down':
-                    scale_down(client, migration_obj)
+                    if concurrency > 0:
+                        scale_down_concurrently(client, migration_obj, config_key, concurrency)
+                    else:
+                        scale_down(client, migration_obj)
                 else:
                     print_options('error: undefined action specified on the command line - {}'.format(action))
             else:
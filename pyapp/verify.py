@@ -5,6 +5,7 @@ Usage:
   Examples:
     python verify.py brown
     python verify.py brown --last-request-charge   <-- displays Cosmos document count RU charges
+    python verify.py brown --concurrency 16        <-- compare with 16 worker threads per side
 Notes:
   1) First, edit your file verify.json (see verify-example.json)
      Then execute the following commands in PowerShell:
@@ -13,7 +14,10 @@ Notes:
   2) file verify.json is intentionally git-ignored (see file .gitignore)
   3) be sure to execute script 'create_venv_setup.ps1' to create the
      Python Virtual Environment with the necessary libraries in requirements.in
-  4) Python 3 is required
+  4) --concurrency <n> compares the collections with a pool of n worker threads
+     for each of the source and target, and writes a structured report json file
+     to the tmp/ directory.  A "concurrency" value may also be set in verify.json.
+  5) Python 3 is required
      > python --version
        Python 3.11.1
 """
@@ -21,8 +25,13 @@ Notes:
 import json
 import os.path
 import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
 from pysrc.constants import Colors
+from pysrc.env import Env
+from pysrc.fs import FS
 from pysrc.mongo import Mongo, MongoDBInstance, MongoDBDatabase, MongoDBCollection
 
 def compare_instances(
@@ -87,6 +96,174 @@ def compare_instances(
 
     print('Done')
 
+def compare_instances_concurrently(
+        source_instance: MongoDBInstance,
+        target_instance: MongoDBInstance,
+        specified_databases,
+        specified_collections,
+        doc_count_method,
+        concurrency):
+    """
+    Compare the source and target instances with a bounded pool of worker
+    threads for each side, and return the results as a structured report.
+    The collection lists are discovered, and memoized, by the MongoDBInstance
+    objects; the count and index queries are executed concurrently.
+    """
+    report = dict()
+    report['doc_count_method'] = doc_count_method
+    report['concurrency'] = concurrency
+    report['databases_not_in_source'] = list()
+    report['databases_not_in_target'] = list()
+    report['databases'] = dict()
+
+    source_dbs = set(source_instance.databases)
+    target_dbs = set(target_instance.databases)
+    filtered_source_dbs = filter_specified_databases(specified_databases, source_dbs)
+
+    if len(specified_databases) == 0:
+        # report these diffs only if there are no specified databases
+        report['databases_not_in_source'] = sorted(target_dbs.difference(filtered_source_dbs))
+        report['databases_not_in_target'] = sorted(filtered_source_dbs.difference(target_dbs))
+
+    plan = list()  # tuples of (database_name, collection_name, in_both)
+    for database_name in sorted(filtered_source_dbs):
+        source_collections = set(source_instance.get_database(database_name).collections)
+        target_collections = set(target_instance.get_database(database_name).collections)
+        db_report = dict()
+        db_report['collections_not_in_source'] = list()
+        db_report['collections_not_in_target'] = list()
+        db_report['collections'] = dict()
+        report['databases'][database_name] = db_report
+
+        if len(specified_collections) == 0:
+            # report these diffs only if there are no specified collections
+            db_report['collections_not_in_source'] = sorted(
+                target_collections.difference(source_collections).difference(['system.views']))
+            db_report['collections_not_in_target'] = sorted(
+                source_collections.difference(target_collections).difference(['system.views']))
+
+        collections_in_any = filter_specified_collections(
+            specified_collections, source_collections.union(target_collections))
+        collections_in_any.discard('system.views')
+        for collection_name in sorted(collections_in_any):
+            in_both = collection_name in source_collections and collection_name in target_collections
+            plan.append((database_name, collection_name, in_both))
+
+    last_charge = '--last-request-charge' in sys.argv
+    print('comparing {} collections with concurrency {}'.format(len(plan), concurrency))
+    with ThreadPoolExecutor(max_workers=concurrency) as source_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as target_pool:
+        futures = list()
+        for database_name, collection_name, in_both in plan:
+            source_future = source_pool.submit(
+                collection_info, source_instance, database_name, collection_name,
+                doc_count_method, in_both, False)
+            target_future = target_pool.submit(
+                collection_info, target_instance, database_name, collection_name,
+                doc_count_method, in_both, last_charge)
+            futures.append((database_name, collection_name, in_both, source_future, target_future))
+
+        for database_name, collection_name, in_both, source_future, target_future in futures:
+            report['databases'][database_name]['collections'][collection_name] = \
+                compare_collection_infos(source_future.result(), target_future.result(), in_both)
+
+    report['summary'] = summarize_report(report)
+    return report
+
+def collection_info(instance, database_name, collection_name, doc_count_method, with_indexes, with_charge):
+    """ executed in a worker thread; pymongo clients are thread-safe. """
+    info = dict()
+    try:
+        collection = MongoDBCollection(instance.client[database_name], collection_name)
+        info['count'] = collection.get_num_documents(doc_count_method)
+        if with_charge:
+            info['last_request_charge'] = collection.get_last_request_charge()
+        if with_indexes:
+            info['indexes'] = sorted(collection.get_indexes().keys())
+    except Exception as e:
+        info['error'] = str(e)
+    return info
+
+def compare_collection_infos(source_info, target_info, in_both):
+    result = dict()
+    result['source_count'] = source_info.get('count')
+    result['target_count'] = target_info.get('count')
+    result['diff'] = None
+    if result['source_count'] != None and result['target_count'] != None:
+        result['diff'] = result['source_count'] - result['target_count']
+    if 'last_request_charge' in target_info.keys():
+        result['last_request_charge'] = target_info['last_request_charge']
+    result['indexes_not_in_source'] = list()
+    result['indexes_not_in_target'] = list()
+    if in_both and 'indexes' in source_info.keys() and 'indexes' in target_info.keys():
+        source_indexes = set(source_info['indexes'])
+        target_indexes = set(target_info['indexes'])
+        result['indexes_not_in_source'] = sorted(target_indexes.difference(source_indexes))
+        result['indexes_not_in_target'] = sorted(source_indexes.difference(target_indexes))
+    result['errors'] = list()
+    if 'error' in source_info.keys():
+        result['errors'].append('source: {}'.format(source_info['error']))
+    if 'error' in target_info.keys():
+        result['errors'].append('target: {}'.format(target_info['error']))
+    return result
+
+def summarize_report(report):
+    summary = dict()
+    summary['databases'] = len(report['databases'])
+    summary['collections'] = 0
+    summary['count_mismatches'] = 0
+    summary['index_mismatches'] = 0
+    summary['errors'] = 0
+    for db_report in report['databases'].values():
+        for coll_report in db_report['collections'].values():
+            summary['collections'] = summary['collections'] + 1
+            if coll_report['diff'] != None and coll_report['diff'] != 0:
+                summary['count_mismatches'] = summary['count_mismatches'] + 1
+            if coll_report['indexes_not_in_source'] or coll_report['indexes_not_in_target']:
+                summary['index_mismatches'] = summary['index_mismatches'] + 1
+            if coll_report['errors']:
+                summary['errors'] = summary['errors'] + 1
+    return summary
+
+def print_report(report):
+    if report['databases_not_in_source']:
+        print('Databases not in source:',
+              Colors.WARNING, set(report['databases_not_in_source']), Colors.ENDC)
+    if report['databases_not_in_target']:
+        print('Databases not in target:',
+              Colors.WARNING, set(report['databases_not_in_target']), Colors.ENDC)
+
+    for database_name in sorted(report['databases'].keys()):
+        db_report = report['databases'][database_name]
+        print(f'   Comparing database: {database_name}')
+        if db_report['collections_not_in_source']:
+            print('           * Collections not in source:',
+                  Colors.WARNING, set(db_report['collections_not_in_source']), Colors.ENDC)
+        if db_report['collections_not_in_target']:
+            print('           * Collections not in target:',
+                  Colors.WARNING, set(db_report['collections_not_in_target']), Colors.ENDC)
+
+        for collection_name in sorted(db_report['collections'].keys()):
+            coll_report = db_report['collections'][collection_name]
+            if 'last_request_charge' in coll_report.keys():
+                print('           ! last RU request charge: {}'.format(coll_report['last_request_charge']))
+            num_documents_source = coll_report['source_count']
+            num_documents_target = coll_report['target_count']
+            diff_docs = coll_report['diff']
+            print(f'         - {collection_name}: {Colors.WARNING if diff_docs != 0 else Colors.OKGREEN}\
+{num_documents_source} / {num_documents_target} [{diff_docs}]{Colors.ENDC}')
+            if coll_report['indexes_not_in_source']:
+                print('           * Indexes not in source:',
+                      Colors.WARNING, set(coll_report['indexes_not_in_source']), Colors.ENDC)
+            if coll_report['indexes_not_in_target']:
+                print('           * Indexes not in target:',
+                      Colors.WARNING, set(coll_report['indexes_not_in_target']), Colors.ENDC)
+            for error in coll_report['errors']:
+                print('           * Error:', Colors.FAIL, error, Colors.ENDC)
+
+    print('summary: {}'.format(json.dumps(report['summary'])))
+    print('Done')
+
 def filter_specified_databases(specified_databases, actual_dbs):
     if len(specified_databases) == 0:
         return set(actual_dbs)
@@ -162,6 +339,13 @@ def get_doc_count_method(config):
             return 'estimate'
     return 'estimate'
 
+def get_concurrency(migration_obj):
+    """ --concurrency <n> on the command-line overrides the config value; 0 is serial. """
+    concurrency = 0
+    if 'concurrency' in migration_obj:
+        concurrency = int(migration_obj['concurrency'])
+    return Env.int_arg('--concurrency', concurrency)
+
 def example_config():
     example = dict()
     migration1 = dict()
@@ -198,20 +382,37 @@ if __name__ == '__main__':
                 print(json.dumps(migration_obj, sort_keys=False, indent=2))
                 source_connection_string = migration_obj['source']
                 target_connection_string = migration_obj['target']
-                source_instance = MongoDBInstance(source_connection_string)
-                target_instance = MongoDBInstance(target_connection_string)
                 specified_databases = migration_obj['databases']
                 specified_collections = migration_obj['collections']
+                source_instance = MongoDBInstance(
+                    source_connection_string, specified_databases, specified_collections)
+                target_instance = MongoDBInstance(
+                    target_connection_string, specified_databases, specified_collections)
                 doc_count_method = get_doc_count_method(config)
                 print('specified_databases:   {}'.format(specified_databases))
                 print('specified_collections: {}'.format(specified_collections))
+                concurrency = get_concurrency(migration_obj)
                 print('doc_count_method:      {}'.format(doc_count_method))
-                compare_instances(
-                    source_instance,
-                    target_instance,
-                    specified_databases,
-                    specified_collections,
-                    doc_count_method)
+                print('concurrency:           {}'.format(concurrency))
+                if concurrency > 0:
+                    report = compare_instances_concurrently(
+                        source_instance,
+                        target_instance,
+                        specified_databases,
+                        specified_collections,
+                        doc_count_method,
+                        concurrency)
+                    report['config_key'] = config_key
+                    print_report(report)
+                    outfile = 'tmp/verify_{}_{}.json'.format(config_key, int(time.time()))
+                    FS.write_json(report, outfile)
+                else:
+                    compare_instances(
+                        source_instance,
+                        target_instance,
+                        specified_databases,
+                        specified_collections,
+                        doc_count_method)
             else:
                 print('error, file {} does not contain key: {}'.format(config_file, config_key))
         else: